@@ -0,0 +1,103 @@
+"""
+Compare database row factories on a 100k-row feed query.
+
+Measures fetchall() throughput and the memory held by the fetched rows for
+the original dict_factory, insta485.model.row_factory and sqlite3.Row, with
+plain tuples as the baseline.
+
+$ python benchmarks/row_factory.py
+"""
+import gc
+import pathlib
+import sqlite3
+import time
+import tracemalloc
+import insta485
+
+NUM_USERS = 100
+NUM_POSTS = 100_000
+REPEAT = 5
+
+FEED_QUERY = (
+    "SELECT posts.postid, posts.owner, users.filename AS owner_img_url, "
+    "posts.filename AS img_url, posts.created AS timestamp, "
+    "post_stats.like_count AS likes "
+    "FROM posts JOIN users on posts.owner==users.username "
+    "JOIN post_stats on posts.postid==post_stats.postid "
+    "ORDER BY posts.postid DESC "
+)
+
+
+def dict_factory(cursor, row):
+    """Convert database row objects to a dictionary keyed on column name.
+
+    This is the original insta485.model.dict_factory.
+    """
+    return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
+
+
+def create_database():
+    """Return an in-memory database with NUM_POSTS posts."""
+    connection = sqlite3.connect(":memory:")
+    schema = pathlib.Path("sql/schema.sql").read_text(encoding='utf-8')
+    connection.executescript(schema)
+    connection.executemany(
+        "INSERT INTO users(username, fullname, email, filename, password) "
+        "VALUES (?, ?, ?, ?, ?)",
+        ((f"user{i}", f"User {i}", f"user{i}@umich.edu", f"{i:040x}.jpg",
+          "sha512$salt$hash") for i in range(NUM_USERS)),
+    )
+    connection.executemany(
+        "INSERT INTO posts(filename, owner) VALUES (?, ?)",
+        ((f"{i:040x}.jpg", f"user{i % NUM_USERS}") for i in range(NUM_POSTS)),
+    )
+    connection.execute(
+        "INSERT INTO post_stats(postid, like_count) "
+        "SELECT postid, postid % 7 FROM posts"
+    )
+    connection.commit()
+    return connection
+
+
+def measure(connection, factory):
+    """Return (best rows/second, bytes held by one fetchall() result)."""
+    connection.row_factory = factory
+    best = 0.0
+    for _ in range(REPEAT):
+        # Keep collections triggered by earlier runs out of the timing
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        rows = connection.execute(FEED_QUERY).fetchall()
+        best = max(best, len(rows) / (time.perf_counter() - start))
+        gc.enable()
+        del rows
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    rows = connection.execute(FEED_QUERY).fetchall()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(rows) == NUM_POSTS
+    return best, held - baseline
+
+
+def main():
+    """Run the benchmark and print a table."""
+    connection = create_database()
+    factories = [
+        ("plain tuples (baseline)", None),
+        ("dict_factory (original)", dict_factory),
+        ("model.row_factory", insta485.model.row_factory),
+        ("sqlite3.Row", sqlite3.Row),
+    ]
+    print(f"{NUM_POSTS} rows, best of {REPEAT}")
+    print(f"{'factory':<26}{'rows/s':>12}{'MiB held':>12}{'B/row':>8}")
+    for name, factory in factories:
+        rate, held = measure(connection, factory)
+        print(f"{name:<26}{rate:>12,.0f}{held / 2**20:>12.1f}"
+              f"{held / NUM_POSTS:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
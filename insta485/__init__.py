@@ -21,3 +21,14 @@ app.config.from_envvar('INSTA485_SETTINGS', silent=True)
 # going to tell pylint and pycodestyle to ignore this coding style violation.
 import insta485.views  # noqa: E402  pylint: disable=wrong-import-position
 import insta485.model  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.feed  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.counters  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.timeline  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.uploads  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.worker  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.deletions  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.orphans  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.cache  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.entities  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.suggestions  # noqa: E402  pylint: disable=wrong-import-position
+import insta485.followgraph  # noqa: E402  pylint: disable=wrong-import-position
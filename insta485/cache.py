@@ -0,0 +1,458 @@
+"""Insta485 result cache.
+
+Pages are assembled from cached entities, such as a user's profile or a post
+with its likes and comments, stored under keys like "post:3" (see
+entities.py).  Write handlers call invalidate() with the keys their change
+affects, and the keys are dropped once the transaction commits.
+
+Every entry carries the cache epoch, a counter bumped by each invalidation.
+A request notes the epoch before its read transaction starts, and a value it
+loads is only stored if no newer entry or invalidation exists for the key.
+So a request that read the database just before a commit can't put the old
+value back after the commit invalidated it.
+"""
+import collections
+import pickle
+import threading
+import time
+import flask
+import insta485
+
+# Counter bumped by every invalidation
+EPOCH_KEY = "epoch"
+
+
+class MemoryStore:
+    """In-process LRU store holding at most max_entries entries."""
+
+    def __init__(self, max_entries):
+        """Create an empty store."""
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.counters = {}
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the entry for key, or None."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def set(self, key, entry, ttl):
+        """Store entry under key, evicting the least recently used."""
+        del ttl  # Entries are never served past their own expiry time
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def counter(self, key):
+        """Return the value of counter key."""
+        return self.counters.get(key, 0)
+
+    def incr(self, key):
+        """Increment counter key and return the new value."""
+        self.counters[key] = self.counter(key) + 1
+        return self.counters[key]
+
+    def clear(self):
+        """Drop every entry."""
+        self.entries.clear()
+
+    def __len__(self):
+        """Return the number of entries."""
+        return len(self.entries)
+
+
+class LocalClient:
+    """In-process stand-in for a shared cache server such as memcached.
+
+    It has the small subset of a memcached client's interface SharedStore
+    uses: bytes values with a time to live, add() that only stores missing
+    keys, and incr(), which like memcached's leaves a missing key missing.
+    """
+
+    def __init__(self):
+        """Create an empty server."""
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def get(self, key):
+        """Return the bytes stored under key, or None."""
+        with self.lock:
+            value, expires = self.values.get(key, (None, 0))
+            if expires is not None and expires < time.time():
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store bytes under key for ttl seconds, or forever if ttl is None."""
+        with self.lock:
+            expires = None if ttl is None else time.time() + ttl
+            self.values[key] = (value, expires)
+
+    def add(self, key, value, ttl=None):
+        """Store bytes under key if it's missing.  Return True if stored."""
+        with self.lock:
+            if key in self.values:
+                return False
+            expires = None if ttl is None else time.time() + ttl
+            self.values[key] = (value, expires)
+            return True
+
+    def incr(self, key, value):
+        """Add value to the counter under key and return the new value.
+
+        Return None if there is no counter under key.
+        """
+        with self.lock:
+            if key not in self.values:
+                return None
+            count, expires = self.values[key]
+            count = int(count) + value
+            self.values[key] = (str(count).encode(), expires)
+            return count
+
+
+class SharedStore:
+    """Store entries on a cache server that every server process can reach.
+
+    Entries are pickled, so cached values must be plain data.  The server
+    may evict a counter like any other key.  A missing counter starts again
+    from the current time in microseconds, which is above any value it
+    reached before unless it was bumped more than a million times a second.
+    """
+
+    def __init__(self, client):
+        """Wrap client, e.g. a memcached client or LocalClient."""
+        self.client = client
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the entry for key, or None."""
+        value = self.client.get(key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, entry, ttl):
+        """Store entry under key.  The server evicts it after ttl seconds."""
+        self.client.set(key, pickle.dumps(entry), ttl)
+
+    def counter(self, key):
+        """Return the value of counter key."""
+        value = self.client.get(key)
+        if value is None:
+            self.restart(key)
+            value = self.client.get(key)
+        return int(value)
+
+    def incr(self, key):
+        """Increment counter key and return the new value."""
+        value = self.client.incr(key, 1)
+        if value is None:
+            self.restart(key)
+            value = self.client.incr(key, 1)
+        return int(value)
+
+    def restart(self, key):
+        """Create counter key if it's missing, e.g. after an eviction.
+
+        add() leaves a counter another process created first in place.
+        """
+        self.client.add(key, str(time.time_ns() // 1000).encode())
+
+    def clear(self):
+        """Leave entries in place.  Other processes may still use them."""
+
+    def __len__(self):
+        """Return the number of entries, which is unknown for a server."""
+        return 0
+
+
+class Cache:
+    """Cache of database results, keyed by entity.
+
+    The store is chosen by CACHE_BACKEND the first time the cache is used.
+    Entries are (epoch, expires, value) tuples.  An invalidated key holds a
+    tombstone, an entry with no value and expires None, with the epoch of the
+    invalidation.
+
+    Concurrent misses for the same key are coalesced: the first request
+    loads the value and the rest wait for it.  An entry that expired less
+    than CACHE_STALE_TTL seconds ago is refreshed the same way, except that
+    other requests are served the expired value instead of waiting.
+    Tombstones are never served, so a request never sees data older than a
+    write that committed before it started.
+    """
+
+    def __init__(self):
+        """Create a cache with no store yet."""
+        self.lock = threading.Lock()
+        self.store = None
+        # Database file the cached entries were read from
+        self.identity = None
+        # Flights of the keys being loaded, by prefixed key
+        self.flights = {}
+        self.counts = collections.defaultdict(
+            lambda: dict.fromkeys(
+                ("hits", "stale_hits", "coalesced", "misses"), 0
+            )
+        )
+        self.totals = {"fills": 0, "skipped_fills": 0, "invalidations": 0}
+
+    def get_store(self):
+        """Return the store, creating it from the config on first use.
+
+        Caller holds the lock.  Returns None if caching is disabled.
+        """
+        config = insta485.app.config
+        if config['CACHE_BACKEND'] is None:
+            return None
+        if self.store is None:
+            if config['CACHE_BACKEND'] == 'shared':
+                client = config['CACHE_SHARED_CLIENT'] or LocalClient()
+                self.store = SharedStore(client)
+            else:
+                self.store = MemoryStore(config['CACHE_MAX_ENTRIES'])
+        return self.store
+
+    def epoch(self):
+        """Return the current epoch."""
+        with self.lock:
+            store = self.get_store()
+            return 0 if store is None else store.counter(EPOCH_KEY)
+
+    def begin(self, identity, keys, epoch):
+        """Look up keys and claim the misses this request should load.
+
+        identity is the (st_dev, st_ino) of the database file the request
+        reads.  If the file was replaced, e.g. by insta485db reset, entries
+        read from the old file are dropped.  epoch is the epoch the request
+        noted before it started reading.
+
+        Return (found, lead, follow).  found maps keys to cached values,
+        including expired ones another request is already refreshing.  lead
+        maps the keys this request must load to their Flight, or to None if
+        a flight for an older snapshot is under way.  follow maps keys
+        another request is loading to its Flight.
+        """
+        found, lead, follow = {}, {}, {}
+        now = time.time()
+        stale_ttl = insta485.app.config['CACHE_STALE_TTL']
+        with self.lock:
+            store = self.get_store()
+            if store is None:
+                return found, dict.fromkeys(keys), follow
+            if identity != self.identity:
+                store.clear()
+                self.identity = identity
+            for key in keys:
+                counts = self.counts[key.split(":", 1)[0]]
+                name = prefixed(identity, key)
+                entry = store.get(name)
+                if entry is not None and entry[1] is not None:
+                    if entry[1] > now:
+                        counts["hits"] += 1
+                        found[key] = entry[2]
+                        continue
+                    if entry[1] + stale_ttl < now:
+                        entry = None
+                flight = self.flights.get(name)
+                if flight is not None and flight.epoch >= epoch:
+                    if entry is not None and entry[1] is not None:
+                        counts["stale_hits"] += 1
+                        found[key] = entry[2]
+                    else:
+                        counts["coalesced"] += 1
+                        follow[key] = flight
+                    continue
+                counts["misses"] += 1
+                lead[key] = None
+                if flight is None:
+                    lead[key] = self.flights[name] = Flight(epoch)
+        return found, lead, follow
+
+    def finish(self, identity, lead, loaded, epoch):
+        """Store the values this request loaded and hand them to waiters.
+
+        loaded is None if loading failed, and waiters load keys themselves.
+        """
+        with self.lock:
+            for key, flight in lead.items():
+                name = prefixed(identity, key)
+                if loaded is not None and identity == self.identity:
+                    self.fill(name, loaded.get(key), epoch)
+                if flight is None:
+                    continue
+                if self.flights.get(name) is flight:
+                    del self.flights[name]
+                flight.land(None if loaded is None else loaded.get(key),
+                            loaded is not None)
+
+    def fill(self, name, value, epoch):
+        """Store value under name unless a newer entry or tombstone exists.
+
+        Caller holds the lock.  epoch is the epoch the request noted before
+        it read value.
+        """
+        config = insta485.app.config
+        ttl = config['CACHE_TTL']
+        store = self.get_store()
+        if store is None:
+            return
+        entry = store.get(name)
+        if entry is not None and entry[0] > epoch:
+            self.totals["skipped_fills"] += 1
+            return
+        store.set(
+            name, (epoch, time.time() + ttl, value),
+            ttl + config['CACHE_STALE_TTL']
+        )
+        self.totals["fills"] += 1
+
+    def invalidate(self, identity, keys):
+        """Replace the entries for keys with tombstones."""
+        ttl = insta485.app.config['CACHE_TTL']
+        with self.lock:
+            store = self.get_store()
+            if store is None:
+                return
+            epoch = store.incr(EPOCH_KEY)
+            for key in keys:
+                store.set(prefixed(identity, key), (epoch, None, None), ttl)
+                self.totals["invalidations"] += 1
+
+    def reset(self):
+        """Drop the store and metrics, e.g. after the config changed."""
+        with self.lock:
+            self.store = None
+            self.flights.clear()
+            self.identity = None
+            self.counts.clear()
+            for name in self.totals:
+                self.totals[name] = 0
+
+    def stats(self):
+        """Return hit and miss counts, overall and per kind of entity."""
+        with self.lock:
+            kinds = {
+                kind: dict(counts) for kind, counts in self.counts.items()
+            }
+            totals = {
+                name: sum(counts[name] for counts in kinds.values())
+                for name in ("hits", "stale_hits", "coalesced", "misses")
+            }
+            served = totals["hits"] + totals["stale_hits"]
+            lookups = served + totals["coalesced"] + totals["misses"]
+            return {
+                "backend": insta485.app.config['CACHE_BACKEND'],
+                "entries": 0 if self.store is None else len(self.store),
+                "evictions": 0 if self.store is None else self.store.evictions,
+                "in_flight": len(self.flights),
+                **totals,
+                "hit_rate": served / lookups if lookups else 0.0,
+                **self.totals,
+                "kinds": kinds,
+            }
+
+
+class Flight:
+    """A value one request is loading for others waiting on the same key."""
+
+    def __init__(self, epoch):
+        """Start a flight for a request that noted epoch."""
+        self.epoch = epoch
+        self.event = threading.Event()
+        self.value = None
+        # False if loading failed, so waiters have to load the key themselves
+        self.done = False
+
+    def land(self, value, done):
+        """Hand value to the waiters, or tell them to load it if not done."""
+        self.value = value
+        self.done = done
+        self.event.set()
+
+    def wait(self, timeout):
+        """Wait for the value.  Return True if it was loaded."""
+        return self.event.wait(timeout) and self.done
+
+
+def prefixed(identity, key):
+    """Return key namespaced by the database file it was read from."""
+    if identity is None:
+        return key
+    return f"{identity[0]}.{identity[1]}/{key}"
+
+
+CACHE = Cache()
+
+
+def cache_stats():
+    """Return cache statistics."""
+    return CACHE.stats()
+
+
+def request_epoch():
+    """Return the epoch noted when the request's read transaction began."""
+    if "cache_epoch" not in flask.g:
+        flask.g.cache_epoch = CACHE.epoch()
+    return flask.g.cache_epoch
+
+
+def cached_many(connection, keys, load):
+    """Return {key: value} for keys, loading misses with load(missing).
+
+    load returns {key: value} for a list of keys, so misses are read with one
+    set-based query.  Keys another request is already loading are waited
+    for instead, up to CACHE_FLIGHT_TIMEOUT seconds.  Cached values are
+    shared between requests and must not be modified.
+    """
+    identity = insta485.model.POOL.identity(connection)
+    epoch = request_epoch()
+    found, lead, follow = CACHE.begin(identity, keys, epoch)
+    if lead:
+        # Load before waiting, so two requests that lead each other's keys
+        # can't wait on each other
+        loaded = None
+        try:
+            loaded = load(list(lead))
+        finally:
+            CACHE.finish(identity, lead, loaded, epoch)
+        for key in lead:
+            found[key] = loaded.get(key)
+
+    timeout = insta485.app.config['CACHE_FLIGHT_TIMEOUT']
+    missing = []
+    for key, flight in follow.items():
+        if flight.wait(timeout):
+            found[key] = flight.value
+        else:
+            missing.append(key)
+    if missing:
+        loaded = load(missing)
+        CACHE.finish(identity, dict.fromkeys(missing), loaded, epoch)
+        for key in missing:
+            found[key] = loaded.get(key)
+    return found
+
+
+def cached(connection, key, load):
+    """Return the value cached under key, calling load() on a miss."""
+    return cached_many(connection, [key], lambda keys: {key: load()})[key]
+
+
+def invalidate(*keys):
+    """Drop keys from the cache once the current transaction commits."""
+    if "cache_invalidations" not in flask.g:
+        flask.g.cache_invalidations = set()
+    flask.g.cache_invalidations.update(keys)
+
+
+def flush_invalidations(connection):
+    """Drop the keys queued by invalidate().  Called after commit."""
+    keys = flask.g.pop("cache_invalidations", None)
+    if keys:
+        identity = insta485.model.POOL.identity(connection)
+        CACHE.invalidate(identity, sorted(keys))
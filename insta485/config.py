@@ -16,5 +16,97 @@ UPLOAD_FOLDER = INSTA485_ROOT/'var'/'uploads'
 ALLOWED_EXTENSIONS = set(['png', 'jpg', 'jpeg', 'gif'])
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024
 
+# Uploads are sharded into UPLOAD_SHARD_DEPTH levels of two-character
+# directories, e.g., var/uploads/ab/cd/abcdef0123.jpg.  Files in the flat
+# layout are still found, and insta485db shard moves them over.
+UPLOAD_SHARD_DEPTH = 2
+
+# Templates link to uploads with signed URLs that stay valid, and cacheable,
+# for between one and two UPLOAD_URL_TTL seconds
+UPLOAD_URL_TTL = 7 * 24 * 60 * 60
+
+# Hand upload transfers to a fronting web server instead of sending the bytes
+# from Python.  None serves them from Python.  'X-Sendfile' (Apache
+# mod_xsendfile, lighttpd) sends the file's absolute path.
+# 'X-Accel-Redirect' (nginx) sends the path relative to UPLOAD_OFFLOAD_ROOT
+# under UPLOAD_OFFLOAD_PREFIX, for an internal location such as
+#   location /internal/ { internal; alias /path/to/insta485/var/; }
+UPLOAD_OFFLOAD = None
+UPLOAD_OFFLOAD_ROOT = INSTA485_ROOT/'var'
+UPLOAD_OFFLOAD_PREFIX = '/internal/'
+
+# Resized copies of uploads for srcset, one per width in pixels.  They are
+# generated on first request and cached in UPLOAD_DERIVATIVE_FOLDER/<width>/.
+UPLOAD_DERIVATIVE_FOLDER = INSTA485_ROOT/'var'/'derivatives'
+UPLOAD_DERIVATIVE_WIDTHS = [160, 640, 1280]
+
 # Database file is var/insta485.sqlite3
 DATABASE_FILENAME = INSTA485_ROOT/'var'/'insta485.sqlite3'
+
+# Connections are kept open and reused across requests.  A request waits up
+# to DATABASE_POOL_TIMEOUT seconds for a connection when all are in use.
+DATABASE_POOL_SIZE = 8
+DATABASE_POOL_TIMEOUT = 5
+
+# PRAGMAs applied to every new database connection.  WAL lets readers run
+# alongside a writer, and synchronous = NORMAL is durable enough in WAL mode.
+# Negative cache_size is in KiB.  busy_timeout is in milliseconds.
+DATABASE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
+# Home feed pagination, ?size=N is clamped to FEED_MAX_PAGE_SIZE
+FEED_PAGE_SIZE = 10
+FEED_MAX_PAGE_SIZE = 100
+
+# Posts by accounts with more than FEED_FANOUT_THRESHOLD followers are merged
+# into feeds at read time instead of being copied to every follower's
+# timeline.  Accounts switch back once they drop to half the threshold.
+FEED_FANOUT_THRESHOLD = 10000
+
+# Profile, post and feed data is cached by entity and invalidated by the
+# requests that change it.  CACHE_BACKEND is 'memory' for an LRU cache in each
+# server process, 'shared' for a cache server reached through
+# CACHE_SHARED_CLIENT, or None to disable caching.  The client needs
+# memcached's get, set, add and incr, e.g. pymemcache.client.base.Client;
+# None uses an in-process stand-in.  Entries expire after CACHE_TTL
+# seconds, which also bounds how long a new post by an account that doesn't
+# fan out on write takes to show up in cached feeds.
+CACHE_BACKEND = 'memory'
+CACHE_SHARED_CLIENT = None
+CACHE_MAX_ENTRIES = 10000
+CACHE_TTL = 60
+
+# Entries that expired less than CACHE_STALE_TTL seconds ago are still served
+# while one request refreshes them.  Requests that miss on a key another
+# request is loading wait up to CACHE_FLIGHT_TIMEOUT seconds for its value.
+CACHE_STALE_TTL = 300
+CACHE_FLIGHT_TIMEOUT = 5
+
+# Comments shown with each post on / and /posts/<postid>/.  The rest are on
+# /posts/<postid>/comments/, where ?size=N is clamped to
+# COMMENTS_MAX_PAGE_SIZE.
+COMMENTS_PAGE_SIZE = 20
+COMMENTS_MAX_PAGE_SIZE = 100
+
+# Explore page pagination, ?size=N is clamped to EXPLORE_MAX_PAGE_SIZE
+EXPLORE_PAGE_SIZE = 20
+EXPLORE_MAX_PAGE_SIZE = 100
+
+# Friends-of-friends suggestions kept per user by insta485db suggest, all of
+# which are shown on the first page of /explore/
+SUGGESTIONS_PER_USER = 20
+
+# Followers and following pagination, ?size=N is clamped to
+# FOLLOW_MAX_PAGE_SIZE
+FOLLOW_PAGE_SIZE = 50
+FOLLOW_MAX_PAGE_SIZE = 100
+
+# Changes kept in follow_changes.  A server process whose follow graph falls
+# further behind than this reloads it.
+FOLLOW_CHANGES_KEPT = 10000
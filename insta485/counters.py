@@ -0,0 +1,117 @@
+"""Insta485 denormalized counters.
+
+Counts live in the user_stats and post_stats tables so that pages never
+count rows.  Every function here must be called on the same connection as
+the write it accounts for, so the counter change commits or rolls back in the
+same transaction.  'insta485db recount' repairs any drift.
+"""
+
+
+def add_user(connection, username):
+    """Create the zeroed counter row for a new user."""
+    connection.execute(
+        "INSERT INTO user_stats(username) "
+        "VALUES (?)",
+        (username, )
+    )
+
+
+def remove_user(connection, username):
+    """Adjust other users' and posts' counters before username is deleted.
+
+    Deleting a user cascades to their follows, likes and comments, which are
+    counted on rows that survive the delete.  The user's own counter rows go
+    away with the cascade.
+    """
+    connection.execute(
+        "UPDATE user_stats "
+        "SET follower_count = follower_count - 1 "
+        "WHERE username IN "
+        "(SELECT username2 FROM following WHERE username1 == ?)",
+        (username, )
+    )
+    connection.execute(
+        "UPDATE user_stats "
+        "SET following_count = following_count - 1 "
+        "WHERE username IN "
+        "(SELECT username1 FROM following WHERE username2 == ?)",
+        (username, )
+    )
+    connection.execute(
+        "UPDATE post_stats "
+        "SET like_count = like_count - "
+        "(SELECT COUNT(*) FROM likes "
+        "WHERE likes.postid == post_stats.postid and likes.owner == ?) "
+        "WHERE postid IN (SELECT postid FROM likes WHERE owner == ?)",
+        (username, username, )
+    )
+    connection.execute(
+        "UPDATE post_stats "
+        "SET comment_count = comment_count - "
+        "(SELECT COUNT(*) FROM comments "
+        "WHERE comments.postid == post_stats.postid "
+        "and comments.owner == ?) "
+        "WHERE postid IN (SELECT postid FROM comments WHERE owner == ?)",
+        (username, username, )
+    )
+
+
+def add_post(connection, owner, postid):
+    """Create the zeroed counter row for a new post and count it."""
+    connection.execute(
+        "INSERT INTO post_stats(postid) "
+        "VALUES (?)",
+        (postid, )
+    )
+    connection.execute(
+        "UPDATE user_stats "
+        "SET post_count = post_count + 1 "
+        "WHERE username == ?",
+        (owner, )
+    )
+
+
+def remove_post(connection, owner):
+    """Uncount a deleted post.  Its post_stats row goes with the cascade."""
+    connection.execute(
+        "UPDATE user_stats "
+        "SET post_count = post_count - 1 "
+        "WHERE username == ?",
+        (owner, )
+    )
+
+
+def change_likes(connection, postid, delta):
+    """Add delta to a post's like count."""
+    connection.execute(
+        "UPDATE post_stats "
+        "SET like_count = like_count + ? "
+        "WHERE postid == ?",
+        (delta, postid, )
+    )
+
+
+def change_comments(connection, postid, delta):
+    """Add delta to a post's comment count."""
+    connection.execute(
+        "UPDATE post_stats "
+        "SET comment_count = comment_count + ? "
+        "WHERE postid == ?",
+        (delta, postid, )
+    )
+
+
+def change_following(connection, username1, username2, delta):
+    """Add delta to username1's following and username2's followers."""
+    connection.execute(
+        "UPDATE user_stats "
+        "SET following_count = following_count + ? "
+        "WHERE username == ?",
+        (delta, username1, )
+    )
+    connection.execute(
+        "UPDATE user_stats "
+        "SET follower_count = follower_count + ? "
+        "WHERE username == ?",
+        (delta, username2, )
+    )
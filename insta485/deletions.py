@@ -0,0 +1,108 @@
+"""Insta485 deferred file deletion.
+
+release_upload() queues a file in the file_deletions table in the same
+transaction that drops its last reference.  After that transaction commits,
+a background thread unlinks queued files, so a request never waits on
+unlink() and a rolled back request never loses a file.  Files still queued
+when a process stops are drained after the next process's first request.
+"""
+import logging
+import sqlite3
+import flask
+import werkzeug.exceptions
+import insta485
+
+LOGGER = logging.getLogger(__name__)
+
+# Queued files unlinked per write transaction
+BATCH_SIZE = 100
+
+
+def queue_deletion(connection, filename):
+    """Queue filename to be unlinked once the current transaction commits."""
+    connection.execute(
+        "INSERT INTO file_deletions(filename) "
+        "VALUES (?)",
+        (filename, )
+    )
+    if flask.has_app_context():
+        # close_db() wakes the worker after commit
+        flask.g.file_deletions_queued = True
+
+
+def drain(connection, after=0, limit=BATCH_SIZE):
+    """Unlink up to limit files queued after deletionid after.
+
+    Return the last deletionid read, or None if none were left.  A file that
+    can't be unlinked stays queued for the next run.  Passing the result
+    back as after moves past it, so failures never hold up newer entries.
+
+    Runs under BEGIN IMMEDIATE, which holds the write lock save_upload()
+    needs to add a reference.  A file that was uploaded again after it was
+    queued has a reference by then and is left in place.
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        cur = connection.execute(
+            "SELECT deletionid, filename "
+            "FROM file_deletions "
+            "WHERE deletionid > ? "
+            "ORDER BY deletionid "
+            "LIMIT ?",
+            (after, limit)
+        )
+        last = None
+        for row in cur.fetchall():
+            last = row["deletionid"]
+            cur = connection.execute(
+                "SELECT 1 FROM upload_refs WHERE filename == ?",
+                (row["filename"], )
+            )
+            if cur.fetchone() is None:
+                try:
+                    insta485.uploads.delete_upload(row["filename"])
+                except OSError:
+                    # Leave it queued for the next run
+                    LOGGER.exception("Can't delete %s", row["filename"])
+                    continue
+            connection.execute(
+                "DELETE FROM file_deletions WHERE deletionid == ?",
+                (row["deletionid"], )
+            )
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    return last
+
+
+class DeletionWorker(insta485.worker.Worker):
+    """Background thread that drains the file_deletions queue."""
+
+    name = "insta485-deletions"
+
+    def work(self):
+        """Drain the queue in batches, reading each entry once."""
+        try:
+            connection = insta485.model.POOL.acquire()
+        except werkzeug.exceptions.ServiceUnavailable:
+            LOGGER.warning("No database connection to drain deletions")
+            return
+        try:
+            after = 0
+            while after is not None:
+                after = drain(connection, after)
+        except sqlite3.Error:
+            LOGGER.exception("Draining file deletions failed")
+        finally:
+            insta485.model.POOL.release(connection)
+
+
+WORKER = DeletionWorker()
+
+
+@insta485.app.before_request
+def recover_deletions():
+    """Drain files left queued by a previous process on the first request."""
+    if WORKER.thread is None:
+        WORKER.wake()
@@ -0,0 +1,317 @@
+"""Insta485 cached entities.
+
+Pages are built from these entities, each cached under its own key:
+
+  user:<username>       fullname, counts and posts of a profile
+  followers:<username>  first page of username's followers, with avatars
+  following:<username>  first page of accounts username follows
+  post:<postid>         a post with its owner, like count and first comments
+  feed:<username>       postids on the first page of username's feed
+
+Values are plain, read-only data shared between requests, so pages copy
+whatever they need to change.  Each write handler calls the matching
+function at the bottom of this module with the keys its change affects.
+"""
+import insta485
+
+# Cursor for the first page of a follow list, ahead of any created timestamp
+FIRST_FOLLOW = ("9999-12-31 23:59:59", "")
+
+
+def get_user(connection, username):
+    """Return the profile of username, or None if there is no such user."""
+    def load():
+        cur = connection.execute(
+            "SELECT users.fullname, user_stats.post_count, "
+            "user_stats.follower_count, user_stats.following_count "
+            "FROM users JOIN user_stats "
+            "on users.username==user_stats.username "
+            "WHERE users.username == ?",
+            (username, )
+        )
+        user = cur.fetchone()
+        if user is None:
+            return None
+        cur = connection.execute(
+            "SELECT postid, filename AS img_url "
+            "FROM posts "
+            "WHERE owner == ? "
+            "ORDER BY postid ASC ",
+            (username, )
+        )
+        return {
+            "fullname": user["fullname"],
+            "following": user["following_count"],
+            "followers": user["follower_count"],
+            "total_posts": user["post_count"],
+            "posts": tuple(dict(post) for post in cur.fetchall()),
+        }
+    return insta485.cache.cached(connection, f"user:{username}", load)
+
+
+def get_followers(connection, username, before, size):
+    """Return (followers, next_before) for one page of username's followers.
+
+    Followers are listed with their avatars, most recent follow first.
+    Pages are keyed on (created, follower) rather than an OFFSET, see
+    follow_page().  Only the first page at the default size is cached.
+    """
+    def load():
+        cur = connection.execute(
+            "SELECT following.username1 AS username, following.created, "
+            "users.filename AS user_img_url "
+            "FROM following JOIN users on following.username1"
+            "==users.username "
+            "WHERE following.username2 == ? "
+            "and (following.created, following.username1) < (?, ?) "
+            "ORDER BY following.created DESC, following.username1 DESC "
+            "LIMIT ? ",
+            (username, *(before or FIRST_FOLLOW), size + 1, )
+        )
+        return follow_page(cur.fetchall(), size)
+
+    if before is None and size == insta485.app.config["FOLLOW_PAGE_SIZE"]:
+        return insta485.cache.cached(
+            connection, f"followers:{username}", load
+        )
+    return load()
+
+
+def get_following(connection, username, before, size):
+    """Return (followees, next_before) for one page of username's followees.
+
+    Like get_followers(), most recent follow first.
+    """
+    def load():
+        cur = connection.execute(
+            "SELECT following.username2 AS username, following.created, "
+            "users.filename AS user_img_url "
+            "FROM following JOIN users on following.username2==users.username "
+            "WHERE following.username1 == ? "
+            "and (following.created, following.username2) < (?, ?) "
+            "ORDER BY following.created DESC, following.username2 DESC "
+            "LIMIT ? ",
+            (username, *(before or FIRST_FOLLOW), size + 1, )
+        )
+        return follow_page(cur.fetchall(), size)
+
+    if before is None and size == insta485.app.config["FOLLOW_PAGE_SIZE"]:
+        return insta485.cache.cached(
+            connection, f"following:{username}", load
+        )
+    return load()
+
+
+def follow_page(rows, size):
+    """Return (users, next_before) from up to size + 1 rows of a follow list.
+
+    next_before is the (created, username) of the last user on the page, or
+    None on the last page.
+    """
+    users = tuple(
+        {"username": row["username"], "user_img_url": row["user_img_url"]}
+        for row in rows[:size]
+    )
+    if len(rows) > size:
+        return users, (rows[size - 1]["created"], rows[size - 1]["username"])
+    return users, None
+
+
+def get_posts(connection, postids):
+    """Return {postid: post} for postids.  Missing posts map to None.
+
+    Posts that aren't cached are read together, with one set-based query
+    each for the posts and their first comments.
+    """
+    def load(keys):
+        posts = {}
+        missing = [int(key.split(":")[1]) for key in keys]
+        for chunk in insta485.feed.chunks(missing):
+            load_posts(connection, chunk, posts)
+        return {f"post:{postid}": post for postid, post in posts.items()}
+
+    found = insta485.cache.cached_many(
+        connection, [f"post:{postid}" for postid in postids], load
+    )
+    return {postid: found[f"post:{postid}"] for postid in postids}
+
+
+def load_posts(connection, postids, posts):
+    """Read the posts in postids from the database into posts.
+
+    Only the first COMMENTS_PAGE_SIZE comments of each post are read.  A
+    cutoff found in comments_postid_idx bounds each post's range scan, so a
+    post with many comments costs no more than one with a page of them.
+    """
+    size = insta485.app.config["COMMENTS_PAGE_SIZE"]
+    placeholders = ", ".join("?" * len(postids))
+    cur = connection.execute(
+        "SELECT posts.postid, posts.owner, users.filename AS owner_img_url, "
+        "posts.filename AS img_url, posts.created AS timestamp, "
+        "post_stats.like_count AS likes "
+        "FROM posts JOIN users on posts.owner==users.username "
+        "JOIN post_stats on posts.postid==post_stats.postid "
+        f"WHERE posts.postid IN ({placeholders}) ",
+        postids
+    )
+    comments = {}
+    for post in cur.fetchall():
+        posts[post["postid"]] = dict(post)
+        comments[post["postid"]] = []
+
+    # Fetch one extra comment per post to find out whether there are more.
+    # Posts with fewer comments get the largest possible commentid as their
+    # cutoff.
+    cur = connection.execute(
+        "WITH cutoffs AS ("
+        "SELECT posts.postid, COALESCE(("
+        "SELECT commentid FROM comments "
+        "WHERE comments.postid == posts.postid "
+        "ORDER BY commentid LIMIT 1 OFFSET ?), ?) AS cutoff "
+        f"FROM posts WHERE posts.postid IN ({placeholders})) "
+        "SELECT comments.commentid, comments.postid, comments.owner, "
+        "comments.text "
+        "FROM cutoffs JOIN comments on comments.postid == cutoffs.postid "
+        "and comments.commentid <= cutoffs.cutoff "
+        "ORDER BY comments.commentid ASC ",
+        (size, insta485.feed.MAX_POSTID, *postids, )
+    )
+    for comment in cur.fetchall():
+        comments[comment["postid"]].append({
+            "commentid": comment["commentid"],
+            "owner": comment["owner"],
+            "text": comment["text"],
+        })
+
+    for postid, post in posts.items():
+        post["comments"] = tuple(comments[postid][:size])
+        # Cursor for the rest of the comments, see show_comments()
+        post["more_comments"] = None
+        if len(comments[postid]) > size:
+            post["more_comments"] = comments[postid][size - 1]["commentid"]
+
+
+def get_feed_page(connection, logname, before, size):
+    """Return (postids, next_before) for one page of logname's feed.
+
+    Only the first page at the default size is cached.  It's the page
+    almost every visit to / loads.
+    """
+    def load():
+        posts, next_before = insta485.feed.fetch_feed_page(
+            connection, logname, before, size
+        )
+        return tuple(post["postid"] for post in posts), next_before
+
+    if before is None and size == insta485.app.config["FEED_PAGE_SIZE"]:
+        return insta485.cache.cached(connection, f"feed:{logname}", load)
+    return load()
+
+
+def feed_keys(connection, owner):
+    """Return the keys of the feeds that show owner's posts.
+
+    Feeds of followers of an account that doesn't fan out on write (see
+    timeline.py) are left to expire, rather than visiting every follower.
+    """
+    cur = connection.execute(
+        "SELECT username1 FROM following "
+        "WHERE username2 == ? and "
+        "(SELECT fanout FROM user_stats WHERE username == ?)",
+        (owner, owner, )
+    )
+    return [f"feed:{owner}"] + [
+        f"feed:{row['username1']}" for row in cur.fetchall()
+    ]
+
+
+def post_changed(postid):
+    """Invalidate a post after a like or comment was added or removed."""
+    insta485.cache.invalidate(f"post:{postid}")
+
+
+def post_added(connection, owner, postid):
+    """Invalidate the profile and feeds a new post appears on."""
+    insta485.cache.invalidate(
+        f"user:{owner}", f"post:{postid}", *feed_keys(connection, owner)
+    )
+
+
+def post_removed(connection, owner, postid):
+    """Invalidate a deleted post and the profile and feeds it was on."""
+    post_added(connection, owner, postid)
+
+
+def follow_changed(username1, username2):
+    """Invalidate after username1 followed or unfollowed username2."""
+    insta485.cache.invalidate(
+        f"user:{username1}", f"user:{username2}", f"following:{username1}",
+        f"followers:{username2}", f"feed:{username1}",
+    )
+
+
+def account_added(username):
+    """Invalidate a username that was looked up before it existed."""
+    insta485.cache.invalidate(f"user:{username}")
+
+
+def account_changed(connection, username, avatar_changed):
+    """Invalidate a user's profile, and their avatar everywhere it appears.
+
+    The avatar is shown on their posts and in the follower and following
+    lists they are on.
+    """
+    insta485.cache.invalidate(f"user:{username}")
+    if avatar_changed:
+        postids, followers, followees = neighbors(connection, username)
+        insta485.cache.invalidate(
+            *(f"post:{postid}" for postid in postids),
+            *(f"following:{follower}" for follower in followers),
+            *(f"followers:{followee}" for followee in followees),
+        )
+
+
+def account_removed(connection, username):
+    """Invalidate everything a user's deletion changes.
+
+    Call before the user is deleted.  The delete cascades to their posts,
+    follows, likes and comments, which changes the feeds, lists and counts of
+    the users and posts they touched.
+    """
+    postids, followers, followees = neighbors(connection, username)
+    cur = connection.execute(
+        "SELECT postid FROM likes WHERE owner == ? "
+        "UNION "
+        "SELECT postid FROM comments WHERE owner == ?",
+        (username, username, )
+    )
+    postids += [row["postid"] for row in cur.fetchall()]
+    insta485.cache.invalidate(
+        f"user:{username}", f"followers:{username}",
+        f"following:{username}", f"feed:{username}",
+        *(f"post:{postid}" for postid in postids),
+        *(f"{kind}:{follower}" for follower in followers
+          for kind in ("user", "following", "feed")),
+        *(f"{kind}:{followee}" for followee in followees
+          for kind in ("user", "followers")),
+    )
+
+
+def neighbors(connection, username):
+    """Return username's postids, followers and followees as lists."""
+    cur = connection.execute(
+        "SELECT postid FROM posts WHERE owner == ?",
+        (username, )
+    )
+    postids = [row["postid"] for row in cur.fetchall()]
+    cur = connection.execute(
+        "SELECT username1 FROM following WHERE username2 == ?",
+        (username, )
+    )
+    followers = [row["username1"] for row in cur.fetchall()]
+    cur = connection.execute(
+        "SELECT username2 FROM following WHERE username1 == ?",
+        (username, )
+    )
+    followees = [row["username2"] for row in cur.fetchall()]
+    return postids, followers, followees
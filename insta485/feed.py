@@ -0,0 +1,90 @@
+"""Insta485 feed helpers."""
+import heapq
+
+# SQLite caps the number of bound parameters per statement, so IN (...)
+# lookups are issued in chunks of at most this many postids.
+CHUNK_SIZE = 500
+
+# Largest value SQLite can store in an INTEGER PRIMARY KEY, used as the
+# cursor for the first page of a feed
+MAX_POSTID = 2**63 - 1
+
+
+def chunks(items, size=CHUNK_SIZE):
+    """Yield successive slices of items no longer than size."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def fetch_feed_page(connection, logname, before=None, size=10):
+    """Return one page of logname's feed and the cursor for the next page.
+
+    Most of the feed is read from the materialized timeline table.  Posts by
+    followed accounts that don't fan out on write (see timeline.py) are read
+    from posts, one sorted stream per account, and combined with the timeline
+    by a heap-based k-way merge.  Either way the order is postid DESC.
+
+    Pages are keyed on postid rather than an OFFSET, so each stream is a
+    bounded range scan down from the cursor no matter how many users logname
+    follows or how deep into the history it is.  The returned cursor is None
+    on the last page.
+    """
+    if before is None:
+        before = MAX_POSTID
+    # Fetch one extra row to find out whether there is another page
+    cur = connection.execute(
+        "SELECT posts.postid, posts.owner, users.filename AS owner_img_url, "
+        "posts.filename AS img_url, posts.created AS timestamp, "
+        "post_stats.like_count AS likes "
+        "FROM timeline JOIN posts on timeline.postid==posts.postid "
+        "JOIN users on posts.owner==users.username "
+        "JOIN post_stats on posts.postid==post_stats.postid "
+        "WHERE timeline.username == ? and timeline.postid < ? "
+        "ORDER BY timeline.postid DESC LIMIT ? ",
+        (logname, before, size + 1, )
+    )
+    streams = [cur.fetchall()]
+
+    # Start from the few accounts that don't fan out, found in a partial
+    # index, and probe the following primary key for each.  Walking
+    # logname's followees instead would cost a lookup per followee.
+    cur = connection.execute(
+        "SELECT user_stats.username "
+        "FROM user_stats "
+        "WHERE user_stats.fanout == 0 "
+        "and EXISTS (SELECT 1 FROM following "
+        "WHERE following.username1 == ? "
+        "and following.username2 == user_stats.username)",
+        (logname, )
+    )
+    for followee in cur.fetchall():
+        cur = connection.execute(
+            "SELECT posts.postid, posts.owner, "
+            "users.filename AS owner_img_url, "
+            "posts.filename AS img_url, posts.created AS timestamp, "
+            "post_stats.like_count AS likes "
+            "FROM posts JOIN users on posts.owner==users.username "
+            "JOIN post_stats on posts.postid==post_stats.postid "
+            "WHERE posts.owner == ? and posts.postid < ? "
+            "ORDER BY posts.postid DESC LIMIT ? ",
+            (followee["username"], before, size + 1, )
+        )
+        streams.append(cur.fetchall())
+
+    posts = []
+    merged = heapq.merge(
+        *streams, key=lambda post: post["postid"], reverse=True
+    )
+    for post in merged:
+        # The timeline may still hold rows copied before an account stopped
+        # fanning out
+        if posts and posts[-1]["postid"] == post["postid"]:
+            continue
+        posts.append(post)
+        if len(posts) > size:
+            break
+
+    if len(posts) > size:
+        posts = posts[:size]
+        return posts, posts[-1]["postid"]
+    return posts, None
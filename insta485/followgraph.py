@@ -0,0 +1,338 @@
+"""Insta485 in-memory follow graph.
+
+Every user gets an integer id, and each id has sorted array('I') lists of
+the ids it follows and of its followers.  Is-following is a binary search,
+and follower and following counts are array lengths.  At four bytes per id
+per direction, a million follows take about 8 MB.
+
+update_following and the account handlers record each change in the
+follow_changes table, in the same transaction as the change itself.  Before
+answering, a request applies the changes its snapshot holds that the graph
+hasn't seen, with one range search of follow_changes, so follows made
+through other server processes show up as soon as they commit.
+
+The graph is loaded by a background thread with a connection of its own,
+when it's first needed, when the database file is replaced, and when
+changes were pruned from follow_changes before the graph saw them.  Until
+the load finishes, requests answer from the following table instead.
+"""
+import array
+import bisect
+import logging
+import sqlite3
+import insta485
+
+LOGGER = logging.getLogger(__name__)
+
+# Graph methods a follow_changes row can name
+CHANGES = {"add_user", "remove_user", "follow", "unfollow"}
+
+
+class Graph:
+    """Follow edges between integer user ids."""
+
+    def __init__(self):
+        """Create an empty graph."""
+        self.ids = {}
+        self.names = []
+        self.following = []
+        self.followers = []
+        # Last follow_changes row reflected in the graph
+        self.changeid = 0
+
+    @classmethod
+    def load(cls, connection):
+        """Read every user and follow from the database.
+
+        Call inside a transaction, so the graph and its changeid come from
+        one snapshot.  Ids are assigned in username order, so the following
+        table's primary key yields each user's followees already sorted by
+        id.
+        """
+        graph = cls()
+        cur = connection.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name == 'follow_changes'"
+        )
+        row = cur.fetchone()
+        graph.changeid = row["seq"] if row is not None else 0
+        cur = connection.execute(
+            "SELECT username FROM users ORDER BY username"
+        )
+        for user in cur.fetchall():
+            graph.add_user(user["username"])
+        cur = connection.execute(
+            "SELECT username1, username2 FROM following "
+            "ORDER BY username1, username2"
+        )
+        for follow in cur:
+            follower = graph.ids[follow["username1"]]
+            followee = graph.ids[follow["username2"]]
+            graph.following[follower].append(followee)
+            graph.followers[followee].append(follower)
+        graph.followers = [
+            array.array('I', sorted(ids)) for ids in graph.followers
+        ]
+        return graph
+
+    def add_user(self, username):
+        """Give username an id if it doesn't have one."""
+        if username not in self.ids:
+            self.ids[username] = len(self.names)
+            self.names.append(username)
+            self.following.append(array.array('I'))
+            self.followers.append(array.array('I'))
+
+    def remove_user(self, username):
+        """Remove username and their follows.  Their id is not reused."""
+        user = self.ids.pop(username, None)
+        if user is None:
+            return
+        for followee in self.following[user]:
+            remove(self.followers[followee], user)
+        for follower in self.followers[user]:
+            remove(self.following[follower], user)
+        self.names[user] = None
+        self.following[user] = array.array('I')
+        self.followers[user] = array.array('I')
+
+    def follow(self, username1, username2):
+        """Record that username1 follows username2."""
+        self.add_user(username1)
+        self.add_user(username2)
+        follower, followee = self.ids[username1], self.ids[username2]
+        if not contains(self.following[follower], followee):
+            bisect.insort(self.following[follower], followee)
+            bisect.insort(self.followers[followee], follower)
+
+    def unfollow(self, username1, username2):
+        """Record that username1 no longer follows username2."""
+        follower = self.ids.get(username1)
+        followee = self.ids.get(username2)
+        if follower is not None and followee is not None:
+            remove(self.following[follower], followee)
+            remove(self.followers[followee], follower)
+
+    def is_following(self, username1, username2):
+        """Return True if username1 follows username2."""
+        follower = self.ids.get(username1)
+        followee = self.ids.get(username2)
+        if follower is None or followee is None:
+            return False
+        return contains(self.following[follower], followee)
+
+    def follower_count(self, username):
+        """Return how many accounts follow username."""
+        user = self.ids.get(username)
+        return 0 if user is None else len(self.followers[user])
+
+    def following_count(self, username):
+        """Return how many accounts username follows."""
+        user = self.ids.get(username)
+        return 0 if user is None else len(self.following[user])
+
+    def mutuals(self, username1, username2):
+        """Return how many accounts username1 follows that follow username2.
+
+        Each id in the shorter list is looked up in the longer one.
+        """
+        user1 = self.ids.get(username1)
+        user2 = self.ids.get(username2)
+        if user1 is None or user2 is None:
+            return 0
+        short = self.following[user1]
+        long = self.followers[user2]
+        if len(short) > len(long):
+            short, long = long, short
+        return sum(1 for user in short if contains(long, user))
+
+
+def contains(ids, user):
+    """Return True if user is in the sorted array ids."""
+    index = bisect.bisect_left(ids, user)
+    return index < len(ids) and ids[index] == user
+
+
+def remove(ids, user):
+    """Remove user from the sorted array ids if it is there."""
+    index = bisect.bisect_left(ids, user)
+    if index < len(ids) and ids[index] == user:
+        del ids[index]
+
+
+class FollowGraph(insta485.worker.Worker):
+    """The process's graph and the thread that loads it.
+
+    Only the loader thread reads the whole graph, so concurrent requests
+    never load it twice or tie up pooled connections doing so.  The loader
+    keeps its connection open while the graph is in use, which also keeps
+    the database file's inode from being reused by a replacement.
+    """
+
+    name = "insta485-followgraph"
+
+    def __init__(self):
+        """Create an empty graph.  The loader starts on the first wake()."""
+        super().__init__()
+        self.graph = None
+        # Database file the graph was read from, and the connection to it
+        self.identity = None
+        self.connection = None
+
+    def get(self, connection):
+        """Return the graph caught up with connection's snapshot, or None.
+
+        None means the graph is missing, was read from a replaced database,
+        or missed pruned changes.  The loader is woken to replace it.
+        """
+        identity = insta485.model.POOL.identity(connection)
+        with self.lock:
+            graph = self.graph
+            if graph is None or identity != self.identity:
+                self.wake()
+                return None
+            changeid = graph.changeid
+        cur = connection.execute(
+            "SELECT changeid, operation, username1, username2 "
+            "FROM follow_changes "
+            "WHERE changeid > ? "
+            "ORDER BY changeid ",
+            (changeid, )
+        )
+        changes = cur.fetchall()
+        with self.lock:
+            if graph is not self.graph:
+                return None
+            for change in changes:
+                if change["changeid"] <= graph.changeid:
+                    continue
+                if change["changeid"] != graph.changeid + 1:
+                    # Pruned before this process saw it
+                    self.graph = None
+                    self.wake()
+                    return None
+                usernames = [change["username1"]]
+                if change["username2"] is not None:
+                    usernames.append(change["username2"])
+                getattr(graph, change["operation"])(*usernames)
+                graph.changeid = change["changeid"]
+        return graph
+
+    def query(self, connection, method, *args):
+        """Call a Graph query method, or return None if there's no graph."""
+        graph = self.get(connection)
+        if graph is None:
+            return None
+        with self.lock:
+            return getattr(graph, method)(*args)
+
+    def wake(self):
+        """Ask the loader to reload the graph.
+
+        Requests that find the graph missing while a load is already under
+        way leave it to that load rather than asking for another.
+        """
+        with self.lock:
+            if not self.pending and not self.busy:
+                super().wake()
+
+    def work(self):
+        """Reload the graph, logging rather than raising database errors."""
+        try:
+            self.reload()
+        except sqlite3.Error:
+            LOGGER.exception("Loading the follow graph failed")
+
+    def reload(self):
+        """Read the graph with a new connection outside the pool."""
+        db_filename = str(insta485.app.config['DATABASE_FILENAME'])
+        connection = insta485.model.ConnectionPool.connect(db_filename)
+        identity = insta485.model.database_identity(db_filename)
+        try:
+            connection.execute("PRAGMA query_only = ON")
+            connection.execute("BEGIN DEFERRED")
+            graph = Graph.load(connection)
+            connection.rollback()
+        except BaseException:
+            connection.close()
+            raise
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+            self.graph = graph
+            self.identity = identity
+            self.connection = connection
+
+
+GRAPH = FollowGraph()
+
+
+def is_following(connection, username1, username2):
+    """Return True if username1 follows username2."""
+    found = GRAPH.query(connection, "is_following", username1, username2)
+    if found is not None:
+        return found
+    cur = connection.execute(
+        "SELECT EXISTS (SELECT 1 FROM following "
+        "WHERE username1 == ? and username2 == ?) AS found",
+        (username1, username2, )
+    )
+    return bool(cur.fetchone()["found"])
+
+
+def follower_count(connection, username):
+    """Return how many accounts follow username."""
+    count = GRAPH.query(connection, "follower_count", username)
+    if count is not None:
+        return count
+    cur = connection.execute(
+        "SELECT follower_count FROM user_stats WHERE username == ?",
+        (username, )
+    )
+    row = cur.fetchone()
+    return 0 if row is None else row["follower_count"]
+
+
+def following_count(connection, username):
+    """Return how many accounts username follows."""
+    count = GRAPH.query(connection, "following_count", username)
+    if count is not None:
+        return count
+    cur = connection.execute(
+        "SELECT following_count FROM user_stats WHERE username == ?",
+        (username, )
+    )
+    row = cur.fetchone()
+    return 0 if row is None else row["following_count"]
+
+
+def mutuals(connection, username1, username2):
+    """Return how many accounts username1 follows that follow username2."""
+    count = GRAPH.query(connection, "mutuals", username1, username2)
+    if count is not None:
+        return count
+    cur = connection.execute(
+        "SELECT COUNT(*) AS count "
+        "FROM following AS mine JOIN following AS theirs "
+        "on theirs.username1 == mine.username2 "
+        "WHERE mine.username1 == ? and theirs.username2 == ?",
+        (username1, username2, )
+    )
+    return cur.fetchone()["count"]
+
+
+def record(connection, operation, *usernames):
+    """Log a follow graph change in the current transaction.
+
+    operation is one of CHANGES, with the usernames that method takes.
+    Only the newest FOLLOW_CHANGES_KEPT changes are kept.
+    """
+    assert operation in CHANGES
+    cur = connection.execute(
+        "INSERT INTO follow_changes(operation, username1, username2) "
+        "VALUES (?, ?, ?)",
+        (operation, *usernames, *[None] * (2 - len(usernames)), )
+    )
+    connection.execute(
+        "DELETE FROM follow_changes WHERE changeid <= ?",
+        (cur.lastrowid - insta485.app.config['FOLLOW_CHANGES_KEPT'], )
+    )
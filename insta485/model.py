@@ -1,45 +1,356 @@
 """Insta485 model (database) API."""
+import os
 import sqlite3
+import threading
+import time
 import flask
 import insta485
 
 
-def dict_factory(cursor, row):
-    """Convert database row objects to a dictionary keyed on column name.
+class Row:
+    """Database row that can be used like a dictionary keyed on column name.
 
-    This is useful for building dictionaries which are then used to render a
-    template.  Note that this would be inefficient for large queries.
+    A row holds the tuple sqlite3 returned plus a column -> index mapping
+    shared by every row of the same query, so it costs one small object
+    instead of a full dictionary.  Views may still assign row["key"] = value
+    to add or override a field; those go in a per-row dictionary that is only
+    created on the first assignment.
     """
-    return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
+
+    __slots__ = ("columns", "values", "extra")
+
+    def __init__(self, columns, values):
+        """Wrap values, a tuple from sqlite3, in a row."""
+        self.columns = columns
+        self.values = values
+        self.extra = None
+
+    def __getitem__(self, key):
+        """Return the value of field key."""
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        return self.values[self.columns[key]]
+
+    def __setitem__(self, key, value):
+        """Add or override field key."""
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def __contains__(self, key):
+        """Return True if the row has field key."""
+        return key in self.columns or (
+            self.extra is not None and key in self.extra
+        )
+
+    def __iter__(self):
+        """Iterate over field names, like a dictionary."""
+        return iter(self.keys())
+
+    def __len__(self):
+        """Return the number of fields."""
+        return len(self.keys())
+
+    def __eq__(self, other):
+        """Compare equal to a row or dictionary with the same fields."""
+        if isinstance(other, (Row, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        """Show the row as a dictionary."""
+        return f"Row({dict(self.items())!r})"
+
+    def get(self, key, default=None):
+        """Return the value of field key, or default if it doesn't exist."""
+        return self[key] if key in self else default
+
+    def keys(self):
+        """Return a list of field names."""
+        if self.extra is None:
+            return list(self.columns)
+        return list(self.columns) + [
+            key for key in self.extra if key not in self.columns
+        ]
+
+    def items(self):
+        """Return a list of (field name, value) pairs."""
+        return [(key, self.get(key)) for key in self.keys()]
+
+
+# Column mappings of recently seen cursor.description tuples, per thread.
+# Every row of a query shares one description object, and each entry holds
+# on to its description, so the id() it's keyed on can't be reused while the
+# entry is cached.  A few entries cover cursors read in an interleaved way.
+COLUMNS = threading.local()
+COLUMNS_CACHE_SIZE = 16
+
+
+def row_factory(cursor, row):
+    """Convert database row objects to a Row keyed on column name.
+
+    The column name -> index mapping is built once per query rather than once
+    per row.
+    """
+    description = cursor.description
+    cache = getattr(COLUMNS, "cache", None)
+    if cache is None:
+        cache = COLUMNS.cache = {}
+    entry = cache.get(id(description))
+    if entry is None or entry[0] is not description:
+        if len(cache) >= COLUMNS_CACHE_SIZE:
+            # Drop the oldest entry
+            del cache[next(iter(cache))]
+        entry = (
+            description,
+            {col[0]: idx for idx, col in enumerate(description)},
+        )
+        cache[id(description)] = entry
+    return Row(entry[1], row)
+
+
+def apply_pragmas(connection, pragmas):
+    """Run PRAGMA name = value for each item in pragmas.
+
+    PRAGMA arguments can't be bound as parameters, so values are restricted
+    to integers and bare keywords.
+    """
+    for name, value in pragmas.items():
+        if not name.isidentifier():
+            raise ValueError(f"Invalid PRAGMA name: {name!r}")
+        if not (isinstance(value, int) or str(value).isidentifier()):
+            raise ValueError(f"Invalid PRAGMA {name} value: {value!r}")
+        connection.execute(f"PRAGMA {name} = {value}")
+
+
+def database_identity(db_filename):
+    """Return (st_dev, st_ino) of the database file, or None if missing.
+
+    An open connection keeps its file's inode allocated, so a database that
+    was deleted and recreated (e.g., insta485db reset) always gets a new
+    identity while pooled connections to the old file are still open.
+    """
+    try:
+        stat = os.stat(db_filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino)
+
+
+class ConnectionPool:
+    """Keep SQLite connections open and reuse them across requests.
+
+    At most DATABASE_POOL_SIZE connections are open at once.  A request that
+    finds them all checked out waits up to DATABASE_POOL_TIMEOUT seconds for
+    one to be released.
+    """
+
+    def __init__(self):
+        """Create an empty pool."""
+        self.lock = threading.Condition()
+        self.idle = []
+        self.num_open = 0
+        # (st_dev, st_ino) of the database file each connection opened
+        self.identities = {}
+        # Whether each connection currently has PRAGMA query_only set
+        self.read_only = {}
+        self.counts = {
+            "acquired": 0,
+            "opened": 0,
+            "discarded": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+        self.wait_seconds = {"total": 0.0, "max": 0.0}
+
+    def acquire(self, read_only=False):
+        """Check out a connection in read-only or read-write mode.
+
+        Read-only connections have PRAGMA query_only set, so they can never
+        take the database write lock.
+        """
+        connection = self.checkout()
+        if self.read_only.get(connection, False) != read_only:
+            if read_only:
+                connection.execute("PRAGMA query_only = ON")
+            else:
+                connection.execute("PRAGMA query_only = OFF")
+            self.read_only[connection] = read_only
+        return connection
+
+    def checkout(self):
+        """Take an idle connection, opening one if the pool is not full."""
+        config = insta485.app.config
+        db_filename = str(config['DATABASE_FILENAME'])
+        identity = database_identity(db_filename)
+
+        with self.lock:
+            self.counts["acquired"] += 1
+            self.discard_stale(identity)
+            if not self.idle and self.num_open >= config['DATABASE_POOL_SIZE']:
+                self.wait_for_idle(config['DATABASE_POOL_TIMEOUT'])
+            if self.idle:
+                return self.idle.pop()
+            self.num_open += 1
+            self.counts["opened"] += 1
+
+        try:
+            connection = self.connect(db_filename)
+        except sqlite3.Error:
+            with self.lock:
+                self.num_open -= 1
+                self.lock.notify()
+            raise
+        with self.lock:
+            self.identities[connection] = database_identity(db_filename)
+        return connection
+
+    def wait_for_idle(self, timeout):
+        """Block until a connection is released.  Caller holds the lock."""
+        self.counts["waits"] += 1
+        start = time.monotonic()
+        available = self.lock.wait_for(
+            lambda: self.idle or
+            self.num_open < insta485.app.config['DATABASE_POOL_SIZE'],
+            timeout=timeout,
+        )
+        waited = time.monotonic() - start
+        self.wait_seconds["total"] += waited
+        self.wait_seconds["max"] = max(self.wait_seconds["max"], waited)
+        if not available:
+            self.counts["timeouts"] += 1
+            flask.abort(503)
+
+    def discard_stale(self, identity):
+        """Close idle connections to a database file that was replaced."""
+        stale = [conn for conn in self.idle
+                 if self.identities[conn] != identity]
+        for connection in stale:
+            self.idle.remove(connection)
+            self.close(connection)
+
+    def close(self, connection):
+        """Close a connection and free its slot.  Caller holds the lock."""
+        connection.close()
+        self.identities.pop(connection, None)
+        self.read_only.pop(connection, None)
+        self.num_open -= 1
+        self.counts["discarded"] += 1
+        self.lock.notify()
+
+    @staticmethod
+    def connect(db_filename):
+        """Open and configure a new connection."""
+        connection = sqlite3.connect(
+            db_filename,
+            # Connections are handed between the server's worker threads,
+            # but only ever used by one request at a time
+            check_same_thread=False,
+        )
+        connection.row_factory = row_factory
+
+        # Foreign keys have to be enabled per-connection.  This is an sqlite3
+        # backwards compatibility thing.
+        connection.execute("PRAGMA foreign_keys = ON")
+        apply_pragmas(connection, insta485.app.config['DATABASE_PRAGMAS'])
+        return connection
+
+    def release(self, connection):
+        """Reset a connection's per-request state and return it to the pool."""
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            connection.row_factory = row_factory
+            connection.set_trace_callback(None)
+        except sqlite3.Error:
+            with self.lock:
+                self.close(connection)
+            return
+        with self.lock:
+            self.idle.append(connection)
+            self.lock.notify()
+
+    def identity(self, connection):
+        """Return (st_dev, st_ino) of the database file connection opened."""
+        with self.lock:
+            return self.identities.get(connection)
+
+    def stats(self):
+        """Return a snapshot of pool size, usage and wait times."""
+        with self.lock:
+            return {
+                "size": insta485.app.config['DATABASE_POOL_SIZE'],
+                "open": self.num_open,
+                "idle": len(self.idle),
+                "in_use": self.num_open - len(self.idle),
+                **self.counts,
+                "wait_seconds_total": self.wait_seconds["total"],
+                "wait_seconds_max": self.wait_seconds["max"],
+            }
+
+
+POOL = ConnectionPool()
+
+
+def pool_stats():
+    """Return connection pool statistics."""
+    return POOL.stats()
 
 
 def get_db():
-    """Open a new database connection.
+    """Check out a database connection for the current request.
+
+    GET and HEAD requests get a read-only connection inside BEGIN DEFERRED,
+    so every query on the page reads the same snapshot and never takes the
+    write lock.  The cache epoch is noted before the snapshot starts (see
+    cache.py).  Other requests take the write lock up front with BEGIN
+    IMMEDIATE, so the rows they check can't change before they write.
 
     Flask docs:
     https://flask.palletsprojects.com/en/1.0.x/appcontext/#storing-data
     """
     if 'sqlite_db' not in flask.g:
-        db_filename = insta485.app.config['DATABASE_FILENAME']
-        flask.g.sqlite_db = sqlite3.connect(str(db_filename))
-        flask.g.sqlite_db.row_factory = dict_factory
-
-        # Foreign keys have to be enabled per-connection.  This is an sqlite3
-        # backwards compatibility thing.
-        flask.g.sqlite_db.execute("PRAGMA foreign_keys = ON")
+        read_only = (flask.has_request_context() and
+                     flask.request.method in ("GET", "HEAD"))
+        connection = POOL.acquire(read_only)
+        if read_only:
+            flask.g.cache_epoch = insta485.cache.CACHE.epoch()
+            connection.execute("BEGIN DEFERRED")
+        elif flask.has_request_context():
+            connection.execute("BEGIN IMMEDIATE")
+        # close_db() only commits if this count changes
+        flask.g.sqlite_db_changes = connection.total_changes
+        flask.g.sqlite_db = connection
 
     return flask.g.sqlite_db
 
 
 @insta485.app.teardown_appcontext
 def close_db(error):
-    """Close the database at the end of a request.
+    """Return the connection to the pool at the end of a request.
+
+    The transaction is committed only if the request changed any rows and
+    didn't fail with an exception.  Otherwise the pool rolls back whatever
+    is open, which for read-only requests just ends the read transaction.
+    Once the commit succeeds, cache entries the request invalidated are
+    dropped and files it queued for deletion are unlinked in the background.
+    A failed request does neither, since its changes never happened.
 
     Flask docs:
     https://flask.palletsprojects.com/en/1.0.x/appcontext/#storing-data
     """
-    assert error or not error  # Needed to avoid superfluous style error
     sqlite_db = flask.g.pop('sqlite_db', None)
-    if sqlite_db is not None:
-        sqlite_db.commit()
-        sqlite_db.close()
+    if sqlite_db is None:
+        return
+    if error is not None:
+        # Released connections are rolled back
+        POOL.release(sqlite_db)
+        return
+    try:
+        if sqlite_db.total_changes != flask.g.pop('sqlite_db_changes'):
+            sqlite_db.commit()
+        insta485.cache.flush_invalidations(sqlite_db)
+    finally:
+        POOL.release(sqlite_db)
+    if flask.g.pop('file_deletions_queued', False):
+        insta485.deletions.WORKER.wake()
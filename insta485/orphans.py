@@ -0,0 +1,209 @@
+"""Insta485 orphaned upload collector.
+
+insta485db gc walks the upload folders and the filenames in users and posts,
+both in sorted order, and merges the two.  Neither side is loaded into memory
+all at once, so memory use doesn't grow with the number of files.
+"""
+import heapq
+import operator
+import os
+import re
+import sqlite3
+import time
+import click
+import insta485
+
+# Filenames fetched per query while walking users and posts
+CHUNK_SIZE = 1000
+
+# Referenced filenames in sorted order, CHUNK_SIZE at a time
+REFERENCED_QUERIES = [
+    "SELECT filename FROM users "
+    "WHERE filename > ? "
+    "ORDER BY filename "
+    "LIMIT ?",
+    "SELECT filename FROM posts "
+    "WHERE filename > ? "
+    "ORDER BY filename "
+    "LIMIT ?",
+]
+
+
+def referenced(connection, query):
+    """Yield the filenames returned by query in sorted order.
+
+    Each chunk is its own short read, so a long walk never holds a read
+    transaction open.
+    """
+    after = ""
+    while True:
+        cur = connection.execute(query, (after, CHUNK_SIZE))
+        rows = cur.fetchall()
+        for row in rows:
+            yield row["filename"]
+        if len(rows) < CHUNK_SIZE:
+            return
+        after = rows[-1]["filename"]
+
+
+def walk(folder):
+    """Yield (filename, path) for every file under folder, sorted by name.
+
+    Shards are listed one directory at a time, and files left in the flat
+    layout are sorted on disk by walk_flat().
+    """
+    depth = insta485.app.config['UPLOAD_SHARD_DEPTH']
+    return heapq.merge(
+        walk_flat(folder), walk_shards(folder, depth),
+        key=operator.itemgetter(0)
+    )
+
+
+def walk_flat(folder):
+    """Yield (filename, path) for the files directly in folder, sorted.
+
+    An unsharded install keeps every upload here, so the names are streamed
+    into a temporary on-disk SQLite database and read back in primary key
+    order rather than sorted in memory.
+    """
+    spool = sqlite3.connect("")
+    try:
+        spool.execute(
+            "CREATE TABLE names(name TEXT PRIMARY KEY) WITHOUT ROWID"
+        )
+        with os.scandir(folder) as entries:
+            spool.executemany(
+                "INSERT INTO names(name) VALUES (?)",
+                ((entry.name, ) for entry in entries if entry.is_file())
+            )
+        for (name, ) in spool.execute("SELECT name FROM names ORDER BY name"):
+            yield name, folder/name
+    finally:
+        spool.close()
+
+
+def walk_shards(folder, depth, prefix=""):
+    """Yield (filename, path) for files in the shards under folder."""
+    with os.scandir(folder) as entries:
+        if depth == 0:
+            names = sorted(entry.name for entry in entries if entry.is_file())
+        else:
+            names = sorted(
+                entry.name for entry in entries if entry.is_dir() and
+                re.fullmatch("[0-9a-f]{2}", entry.name)
+            )
+    for name in names:
+        if depth > 0:
+            yield from walk_shards(folder/name, depth - 1, prefix + name)
+        elif name.startswith(prefix):
+            # Files in the wrong shard would break the sort order
+            yield name, folder/name
+
+
+def find_orphans(connection, folder, rate=0):
+    """Yield the path of every file under folder that nothing references.
+
+    At most rate files are examined per second.
+    """
+    refs = heapq.merge(
+        *(referenced(connection, query) for query in REFERENCED_QUERIES)
+    )
+    ref = next(refs, None)
+    for name, path in throttle(walk(folder), rate):
+        while ref is not None and ref < name:
+            ref = next(refs, None)
+        if ref != name:
+            yield path
+
+
+def throttle(iterable, rate):
+    """Yield from iterable at most rate items per second.  0 is unlimited."""
+    start = time.monotonic()
+    for count, item in enumerate(iterable):
+        if rate:
+            delay = start + count / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield item
+
+
+def stat_if_old(path, min_age):
+    """Return os.stat() of path if it is at least min_age seconds old."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    if time.time() - stat.st_mtime < min_age:
+        return None
+    return stat
+
+
+def remove_orphan(connection, path, min_age):
+    """Unlink path if it is old enough and still unreferenced.
+
+    Return the number of bytes freed, or None if the file was kept.  The
+    check runs under BEGIN IMMEDIATE, which holds the write lock that an
+    upload holds until the row referencing its file commits.
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        stat = stat_if_old(path, min_age)
+        if stat is None:
+            return None
+        cur = connection.execute(
+            "SELECT 1 FROM users WHERE filename == ? "
+            "UNION ALL "
+            "SELECT 1 FROM posts WHERE filename == ?",
+            (path.name, path.name)
+        )
+        if cur.fetchone() is not None:
+            return None
+        path.unlink(missing_ok=True)
+        return stat.st_size
+    finally:
+        connection.rollback()
+
+
+@insta485.app.cli.command("gc-uploads")
+@click.option("--dry-run", is_flag=True,
+              help="Report orphans without removing them.")
+@click.option("--rate", default=500.0, show_default=True,
+              help="Files examined per second, 0 for no limit.")
+@click.option("--min-age", default=3600, show_default=True,
+              help="Keep files modified less than this many seconds ago.")
+def collect_orphans(dry_run, rate, min_age):
+    """Report or remove uploads and derivatives that nothing references.
+
+    Recent files are kept, since an upload's file is written before the row
+    that references it commits.
+    """
+    config = insta485.app.config
+    folders = [config['UPLOAD_FOLDER']] + [
+        config['UPLOAD_DERIVATIVE_FOLDER']/str(width)
+        for width in config['UPLOAD_DERIVATIVE_WIDTHS']
+    ]
+    connection = insta485.model.POOL.acquire()
+    totals = {"orphans": 0, "bytes": 0}
+    try:
+        for folder in folders:
+            if not folder.is_dir():
+                continue
+            for path in find_orphans(connection, folder, rate):
+                if dry_run:
+                    stat = stat_if_old(path, min_age)
+                    size = None if stat is None else stat.st_size
+                else:
+                    size = remove_orphan(connection, path, min_age)
+                if size is None:
+                    continue
+                totals["orphans"] += 1
+                totals["bytes"] += size
+                click.echo(f"{'orphan' if dry_run else 'removed'} {path}")
+    except sqlite3.Error as error:
+        raise click.ClickException(str(error)) from error
+    finally:
+        insta485.model.POOL.release(connection)
+    click.echo(
+        f"{totals['orphans']} orphans, {totals['bytes']} bytes"
+        f"{' (dry run)' if dry_run else ' removed'}"
+    )
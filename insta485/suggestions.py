@@ -0,0 +1,148 @@
+"""Insta485 friends-of-friends suggestions.
+
+insta485db suggest ranks, for every user, the accounts followed by the
+accounts they follow.  Scores are entries of A·A, where A is the adjacency
+matrix of the following table indexed by users.rowid: the score of candidate
+c for user u counts the accounts u follows that follow c.  Accounts u
+already follows, and u themself, are left out.  The top SUGGESTIONS_PER_USER
+candidates per user are written to the suggestions table, which /explore/
+reads with one indexed query.
+
+A·A is computed one block of BLOCK_SIZE rows at a time, so memory stays
+bounded for accounts that follow, or are followed by, many others.  Each
+block's suggestions are replaced in a short write transaction of its own.
+
+NumPy and SciPy are optional dependencies, only needed to run the job:
+$ pip install insta485[suggestions]
+"""
+import sqlite3
+import click
+import insta485
+
+try:
+    import numpy
+    import scipy.sparse
+except ImportError:
+    numpy = None
+
+# Users whose suggestions are computed and written together
+BLOCK_SIZE = 10000
+
+# Edges read from the database per fetchmany()
+FETCH_SIZE = 100000
+
+
+def read_graph(connection):
+    """Return (usernames, adjacency matrix) of the following table.
+
+    usernames maps users.rowid to username.  The matrix is n by n in CSR
+    form, with a 1 at [u, c] if u follows c.
+    """
+    connection.row_factory = None
+    cur = connection.execute("SELECT MAX(rowid) FROM users")
+    size = (cur.fetchone()[0] or 0) + 1
+    usernames = numpy.empty(size, dtype=object)
+    cur = connection.execute("SELECT rowid, username FROM users")
+    for rowid, username in cur:
+        usernames[rowid] = username
+
+    cur = connection.execute(
+        "SELECT follower.rowid, followee.rowid "
+        "FROM following "
+        "JOIN users AS follower on follower.username == following.username1 "
+        "JOIN users AS followee on followee.username == following.username2"
+    )
+    chunks = [numpy.empty((0, 2), dtype=numpy.int64)]
+    while rows := cur.fetchmany(FETCH_SIZE):
+        chunks.append(numpy.array(rows, dtype=numpy.int64))
+    edges = numpy.concatenate(chunks)
+    ones = numpy.ones(len(edges), dtype=numpy.int32)
+    adjacency = scipy.sparse.csr_matrix(
+        (ones, (edges[:, 0], edges[:, 1])), shape=(size, size)
+    )
+    return usernames, adjacency
+
+
+def score_block(adjacency, start, stop, limit):
+    """Return the top limit suggestions for users start through stop - 1.
+
+    Returns (users, candidates, scores) arrays, sorted by user, then score
+    descending, then candidate.
+    """
+    rows = adjacency[start:stop]
+    scores = (rows @ adjacency).tocsr()
+    # Drop accounts already followed, and each user themself
+    scores = scores - scores.multiply(rows > 0)
+    scores.eliminate_zeros()
+    scores = scores.tocoo()
+    others = scores.row + start != scores.col
+    users, candidates, scores = (
+        scores.row[others], scores.col[others], scores.data[others]
+    )
+
+    order = numpy.lexsort((candidates, -scores, users))
+    users = users[order]
+    # Position of each suggestion within its user's run
+    firsts = numpy.searchsorted(users, users)
+    keep = numpy.arange(len(users)) - firsts < limit
+    return (
+        users[keep] + start, candidates[order][keep], scores[order][keep]
+    )
+
+
+def write_block(connection, usernames, start, stop, block):
+    """Replace the suggestions of users start through stop - 1.
+
+    The caller's connection pool rolls back if this raises.
+    """
+    users, candidates, scores = block
+    connection.execute("BEGIN IMMEDIATE")
+    connection.execute(
+        "DELETE FROM suggestions WHERE username IN "
+        "(SELECT username FROM users WHERE rowid >= ? and rowid < ?)",
+        (start, stop, )
+    )
+    # Users deleted since the graph was read are skipped
+    connection.executemany(
+        "INSERT INTO suggestions(username, candidate, score) "
+        "SELECT ?, ?, ? "
+        "WHERE EXISTS (SELECT 1 FROM users WHERE username == ?) "
+        "and EXISTS (SELECT 1 FROM users WHERE username == ?)",
+        (
+            (usernames[user], usernames[candidate], score,
+             usernames[user], usernames[candidate])
+            for user, candidate, score in zip(
+                users.tolist(), candidates.tolist(), scores.tolist()
+            )
+        ),
+    )
+    connection.commit()
+    return len(users)
+
+
+@insta485.app.cli.command("refresh-suggestions")
+def refresh_suggestions():
+    """Recompute friends-of-friends suggestions for every user."""
+    if numpy is None:
+        raise click.ClickException(
+            "Suggestions need NumPy and SciPy: "
+            "pip install insta485[suggestions]"
+        )
+    limit = insta485.app.config['SUGGESTIONS_PER_USER']
+    connection = insta485.model.POOL.acquire()
+    try:
+        # Read the whole graph from one snapshot
+        connection.execute("BEGIN")
+        usernames, adjacency = read_graph(connection)
+        connection.rollback()
+
+        total = 0
+        for start in range(0, adjacency.shape[0], BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, adjacency.shape[0])
+            block = score_block(adjacency, start, stop, limit)
+            total += write_block(connection, usernames, start, stop, block)
+    except sqlite3.Error as error:
+        raise click.ClickException(str(error)) from error
+    finally:
+        insta485.model.POOL.release(connection)
+    click.echo(f"{total} suggestions from {adjacency.nnz} follows")
@@ -0,0 +1,84 @@
+"""Insta485 materialized home feeds.
+
+The timeline table holds one (username, postid) row for every post on a
+user's home feed, so the feed is a range scan of its primary key.  Accounts
+with more followers than FEED_FANOUT_THRESHOLD are the exception.  Copying
+each of their posts to every follower would make posting slow, so their
+posts are merged into feeds at read time by feed.fetch_feed_page().
+
+Every function here must be called on the same connection as the write it
+mirrors, so both commit or roll back together.  Deleted posts and users leave
+the timeline through ON DELETE CASCADE.  'insta485db check' finds drift and
+'insta485db backfill' repairs it.
+"""
+import insta485
+
+
+def add_post(connection, owner, postid):
+    """Add a new post to its owner's and their followers' timelines."""
+    connection.execute(
+        "INSERT OR IGNORE INTO timeline(username, postid) "
+        "SELECT username1, ? FROM following "
+        "WHERE username2 == ? and "
+        "(SELECT fanout FROM user_stats WHERE username == ?) "
+        "UNION ALL "
+        "SELECT ?, ?",
+        (postid, owner, owner, owner, postid, )
+    )
+
+
+def follow(connection, username1, username2):
+    """Add username2's posts to username1's timeline."""
+    connection.execute(
+        "INSERT OR IGNORE INTO timeline(username, postid) "
+        "SELECT ?, postid FROM posts "
+        "WHERE owner == ? and "
+        "(SELECT fanout FROM user_stats WHERE username == ?)",
+        (username1, username2, username2, )
+    )
+
+
+def unfollow(connection, username1, username2):
+    """Remove username2's posts from username1's timeline."""
+    if username1 == username2:
+        # A user's own posts stay on their timeline
+        return
+    connection.execute(
+        "DELETE FROM timeline "
+        "WHERE username == ? and postid IN "
+        "(SELECT postid FROM posts WHERE owner == ?)",
+        (username1, username2, )
+    )
+
+
+def update_fanout(connection, username):
+    """Switch username between fan-out on write and merge on read.
+
+    Call after username's follower count changes.  An account stops fanning
+    out when it has more than FEED_FANOUT_THRESHOLD followers.  It switches
+    back, copying its posts to every follower's timeline, only once it drops
+    to half the threshold, so an account near the threshold doesn't flip on
+    every follow.  Rows copied before an account stopped are left in place.
+    """
+    threshold = insta485.app.config['FEED_FANOUT_THRESHOLD']
+    cur = connection.execute(
+        "UPDATE user_stats SET fanout = 0 "
+        "WHERE username == ? and fanout == 1 and follower_count > ?",
+        (username, threshold, )
+    )
+    if cur.rowcount:
+        return
+    cur = connection.execute(
+        "UPDATE user_stats SET fanout = 1 "
+        "WHERE username == ? and fanout == 0 and follower_count <= ?",
+        (username, threshold // 2, )
+    )
+    if cur.rowcount:
+        connection.execute(
+            "INSERT OR IGNORE INTO timeline(username, postid) "
+            "SELECT following.username1, posts.postid "
+            "FROM following JOIN posts "
+            "on posts.owner == following.username2 "
+            "WHERE following.username2 == ?",
+            (username, )
+        )
@@ -0,0 +1,423 @@
+"""Insta485 upload helpers."""
+import functools
+import hashlib
+import hmac
+import os
+import pathlib
+import re
+import shutil
+import time
+import uuid
+import click
+import flask
+import PIL.ExifTags
+import PIL.Image
+import PIL.ImageOps
+import werkzeug.exceptions
+import werkzeug.security
+import werkzeug.utils
+import insta485
+
+
+def upload_signature(filename, expires):
+    """Return the HMAC-SHA256 signature for an upload URL."""
+    key = insta485.app.config['SECRET_KEY']
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    message = f"uploads:{filename}:{expires}".encode('utf-8')
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+@insta485.app.template_global()
+def upload_url(filename, width=None):
+    """Return a signed, expiring URL for an uploaded file.
+
+    Expiry times are rounded to UPLOAD_URL_TTL boundaries, so a file keeps the
+    same URL, and stays in browser and proxy caches, for at least one TTL.
+    With width, the URL is for the derivative resized to that width.
+    """
+    ttl = insta485.app.config['UPLOAD_URL_TTL']
+    expires = (int(time.time()) // ttl + 2) * ttl
+    return flask.url_for(
+        "download_file",
+        filename=filename,
+        width=width,
+        expires=expires,
+        signature=upload_signature(filename, expires),
+    )
+
+
+@insta485.app.template_global()
+def upload_srcset(filename):
+    """Return a srcset attribute value listing the derivatives of a file.
+
+    Derivatives are never scaled up, so only widths below the original's are
+    listed, followed by the original at its own width.  A file Pillow can't
+    read gets an empty srcset and is shown from src.
+    """
+    original_width = upload_width(filename)
+    if original_width is None:
+        return ""
+    candidates = [
+        f"{upload_url(filename, width)} {width}w"
+        for width in insta485.app.config['UPLOAD_DERIVATIVE_WIDTHS']
+        if width < original_width
+    ]
+    candidates.append(f"{upload_url(filename)} {original_width}w")
+    return ", ".join(candidates)
+
+
+@functools.lru_cache(maxsize=4096)
+def upload_width(filename):
+    """Return the displayed width of an upload, or None if it can't be read.
+
+    Only the image header is read.  The content under a filename never
+    changes, so widths are remembered for the life of the process.
+    """
+    path = upload_folder(filename)/filename
+    try:
+        with PIL.Image.open(path) as image:
+            orientation = image.getexif().get(PIL.ExifTags.Base.Orientation)
+            # Orientations 5 through 8 are rotated a quarter turn
+            if orientation in (5, 6, 7, 8):
+                return image.height
+            return image.width
+    except (OSError, ValueError, PIL.Image.DecompressionBombError):
+        return None
+
+
+def verify_upload_url(filename, expires, signature):
+    """Return seconds until a signed upload URL expires, or None if invalid.
+
+    Checking a signature needs neither the session nor the database.
+    """
+    if expires is None or not signature:
+        return None
+    remaining = expires - int(time.time())
+    if remaining <= 0:
+        return None
+    if not hmac.compare_digest(upload_signature(filename, expires),
+                               signature):
+        return None
+    return remaining
+
+
+def shard(filename):
+    """Return the path of filename relative to an upload folder.
+
+    Hex filenames are sharded two characters per directory level,
+    UPLOAD_SHARD_DEPTH levels deep, e.g., ab/cd/abcdef0123.jpg.  Other
+    filenames stay at the top level.
+    """
+    length = 2 * insta485.app.config['UPLOAD_SHARD_DEPTH']
+    prefix = filename[:length]
+    if len(filename) <= length or not re.fullmatch("[0-9a-f]*", prefix):
+        return pathlib.PurePath(filename)
+    return pathlib.PurePath(
+        *(prefix[i:i + 2] for i in range(0, length, 2)), filename
+    )
+
+
+def upload_folder(filename):
+    """Return the folder holding an uploaded file.
+
+    Files are looked up in their shard, then in the flat layout used before
+    sharding.  Checking the shard a second time covers a file that
+    insta485db shard moved between the first two lookups.
+    """
+    root = insta485.app.config['UPLOAD_FOLDER']
+    sharded = (root/shard(filename)).parent
+    for folder in (sharded, root, sharded):
+        if (folder/filename).is_file():
+            return folder
+    return sharded
+
+
+def derivative_folder(filename, width):
+    """Return the folder holding filename resized to width.
+
+    The derivative is created on first request and cached on disk.  Images
+    are never scaled up, and a file Pillow can't read is served as-is from
+    UPLOAD_FOLDER.
+    """
+    config = insta485.app.config
+    if width not in config['UPLOAD_DERIVATIVE_WIDTHS']:
+        flask.abort(404)
+    folder = (config['UPLOAD_DERIVATIVE_FOLDER']/str(width) /
+              shard(filename)).parent
+    path = werkzeug.security.safe_join(str(folder), filename)
+    original = werkzeug.security.safe_join(
+        str(upload_folder(filename)), filename
+    )
+    if path is None or original is None or not os.path.isfile(original):
+        flask.abort(404)
+    if os.path.exists(path):
+        return folder
+
+    # Write to a temporary file first, so a concurrent request never serves
+    # a partial derivative
+    tmp = folder/f".{uuid.uuid4().hex}.tmp"
+    try:
+        with PIL.Image.open(original) as image:
+            image_format = image.format
+            # Apply the EXIF orientation, which is dropped on save
+            image = PIL.ImageOps.exif_transpose(image)
+            image.thumbnail((width, image.height))
+            folder.mkdir(parents=True, exist_ok=True)
+            if image_format == "JPEG":
+                image.save(tmp, image_format, quality=85, optimize=True)
+            else:
+                image.save(tmp, image_format)
+    except (OSError, ValueError, PIL.Image.DecompressionBombError):
+        tmp.unlink(missing_ok=True)
+        return upload_folder(filename)
+    os.replace(tmp, path)
+    return folder
+
+
+def send_upload(folder, filename, max_age=None, etag=True):
+    """Send a file from folder, or hand it to the fronting web server.
+
+    From Python, send_from_directory() answers Range with 206 and
+    If-None-Match or If-Modified-Since with 304.  The open file goes to the
+    WSGI server's wsgi.file_wrapper, which servers such as gunicorn send with
+    os.sendfile().  With UPLOAD_OFFLOAD set, the response carries an
+    X-Sendfile or X-Accel-Redirect header instead of the bytes, and the web
+    server handles ranges.
+    """
+    config = insta485.app.config
+    if config['UPLOAD_OFFLOAD'] is None:
+        return flask.send_from_directory(
+            folder, filename, max_age=max_age, etag=etag
+        )
+    response = werkzeug.utils.send_from_directory(
+        folder,
+        filename,
+        flask.request.environ,
+        use_x_sendfile=True,
+        conditional=False,
+        max_age=max_age,
+        etag=etag,
+        response_class=insta485.app.response_class,
+    )
+    if config['UPLOAD_OFFLOAD'] == "X-Accel-Redirect":
+        path = pathlib.Path(response.headers.pop("X-Sendfile"))
+        response.headers["X-Accel-Redirect"] = (
+            config['UPLOAD_OFFLOAD_PREFIX'] +
+            path.relative_to(config['UPLOAD_OFFLOAD_ROOT']).as_posix()
+        )
+    response = response.make_conditional(flask.request)
+    if response.status_code == 304:
+        # Some web servers send the file anyway if the header is present
+        response.headers.pop("X-Sendfile", None)
+        response.headers.pop("X-Accel-Redirect", None)
+    return response
+
+
+# Bytes read per write when copying an upload that wasn't streamed
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of each allowed image type
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "jpeg",
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"GIF87a": "gif",
+    b"GIF89a": "gif",
+}
+HEAD_SIZE = max(len(signature) for signature in IMAGE_SIGNATURES)
+
+# Image type each extension in ALLOWED_EXTENSIONS must contain
+EXTENSION_TYPES = {"jpg": "jpeg", "jpeg": "jpeg", "png": "png", "gif": "gif"}
+
+
+class UploadFile:
+    """A file upload streamed to a temporary file in UPLOAD_FOLDER.
+
+    The multipart parser writes each chunk here as it arrives.  Hashing, the
+    size limit and sniffing the image type all happen in that one pass, so
+    memory use per upload is one chunk however large the file is.
+    """
+
+    def __init__(self):
+        """Open a new temporary file."""
+        self.path = (insta485.app.config['UPLOAD_FOLDER'] /
+                     f".{uuid.uuid4().hex}.tmp")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = self.path.open("w+b")
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+
+    def __getattr__(self, name):
+        """Delegate reading and seeking to the temporary file."""
+        return getattr(self.file, name)
+
+    def write(self, data):
+        """Hash, size check and write one chunk."""
+        self.size += len(data)
+        if self.size > insta485.app.config['MAX_CONTENT_LENGTH']:
+            self.close()
+            raise werkzeug.exceptions.RequestEntityTooLarge()
+        if len(self.head) < HEAD_SIZE:
+            self.head += data[:HEAD_SIZE - len(self.head)]
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def image_type(self):
+        """Return the image type from the leading bytes, or None."""
+        for signature, image_type in IMAGE_SIGNATURES.items():
+            if self.head.startswith(signature):
+                return image_type
+        return None
+
+    def move(self, path):
+        """Close the file and atomically rename it to path."""
+        self.file.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path, path)
+        self.path = None
+
+    def close(self):
+        """Close the file, deleting it unless it was moved into place."""
+        self.file.close()
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+            self.path = None
+
+
+class Request(flask.Request):
+    """Flask request that streams file uploads straight to UPLOAD_FOLDER.
+
+    Werkzeug would otherwise spool each upload to its own temporary file,
+    which save_upload() then copies again.
+    """
+
+    def _get_file_stream(self, *args, **kwargs):
+        """Return an UploadFile to receive an uploaded file."""
+        # Werkzeug's length and type hints come from the client.  UploadFile
+        # checks the actual bytes instead.
+        del args, kwargs
+        return UploadFile()
+
+
+insta485.app.request_class = Request
+
+
+def save_upload(connection, fileobj):
+    """Validate and save an uploaded file and return its filename.
+
+    Files are named by the SHA-256 of their content, computed while the
+    upload streamed to disk, so uploading the same image twice stores it
+    once.  The extension must be in ALLOWED_EXTENSIONS and match the image
+    type in the file's leading bytes.  The caller must store the filename in
+    exactly one users or posts row.
+    """
+    upload = fileobj.stream
+    if not isinstance(upload, UploadFile):
+        upload = UploadFile()
+        shutil.copyfileobj(fileobj.stream, upload, CHUNK_SIZE)
+    try:
+        extension = pathlib.Path(fileobj.filename).suffix.lower()[1:]
+        if (extension not in insta485.app.config['ALLOWED_EXTENSIONS'] or
+                EXTENSION_TYPES.get(extension) != upload.image_type()):
+            flask.abort(400)
+        filename = f"{upload.digest.hexdigest()}.{extension}"
+
+        # Count the reference first.  This takes the database write lock, so
+        # a concurrent release_upload() can't unlink the file after it's
+        # moved into place.
+        connection.execute(
+            "INSERT INTO upload_refs(filename, refcount) "
+            "VALUES (?, 1) "
+            "ON CONFLICT(filename) DO UPDATE SET refcount = refcount + 1",
+            (filename, )
+        )
+        upload.move(insta485.app.config['UPLOAD_FOLDER']/shard(filename))
+    finally:
+        upload.close()
+    return filename
+
+
+def release_upload(connection, filename):
+    """Drop one reference to an upload.
+
+    Dropping the last one queues the file for deletion after commit.
+    """
+    cur = connection.execute(
+        "UPDATE upload_refs SET refcount = refcount - 1 "
+        "WHERE filename == ? "
+        "RETURNING refcount",
+        (filename, )
+    )
+    row = cur.fetchone()
+    if row is not None and row["refcount"] > 0:
+        return
+    connection.execute(
+        "DELETE FROM upload_refs WHERE filename == ?",
+        (filename, )
+    )
+    insta485.deletions.queue_deletion(connection, filename)
+
+
+def upload_etag(filename, width=None):
+    """Return a strong ETag for a content-addressed upload.
+
+    Returns True, meaning let Flask derive one from the file's mtime and
+    size, for uploads named before content addressing.
+    """
+    stem, _, _ = filename.partition(".")
+    if not re.fullmatch("[0-9a-f]{64}", stem):
+        return True
+    if width is None:
+        return stem
+    return f"{stem}-{width}"
+
+
+def delete_upload(filename):
+    """Delete an uploaded file and its cached derivatives."""
+    config = insta485.app.config
+    (config['UPLOAD_FOLDER']/shard(filename)).unlink(missing_ok=True)
+    (config['UPLOAD_FOLDER']/filename).unlink(missing_ok=True)
+    for width in config['UPLOAD_DERIVATIVE_WIDTHS']:
+        path = config['UPLOAD_DERIVATIVE_FOLDER']/str(width)/shard(filename)
+        path.unlink(missing_ok=True)
+
+
+@insta485.app.cli.command("shard-uploads")
+def shard_uploads():
+    """Move uploads from the flat UPLOAD_FOLDER layout into shards.
+
+    Safe to run while the server is up.  Each file is moved with a single
+    rename, and upload_folder() finds it on either side of the move.
+    """
+    root = insta485.app.config['UPLOAD_FOLDER']
+    moved = 0
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            path = root/shard(entry.name)
+            if path.parent == root:
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(entry.path, path)
+            moved += 1
+    click.echo(f"Moved {moved} files into shards")
+
+
+class SessionInterface(flask.sessions.SecureCookieSessionInterface):
+    """Cookie sessions, except for signed upload URLs.
+
+    A page with many images would otherwise decode the session cookie once
+    per image.  Signed upload requests get a null session instead.
+    """
+
+    def open_session(self, app, request):
+        """Skip decoding the session cookie for signed upload URLs."""
+        if (request.path.startswith("/uploads/") and
+                "signature" in request.args):
+            return self.make_null_session(app)
+        return super().open_session(app, request)
+
+
+insta485.app.session_interface = SessionInterface()
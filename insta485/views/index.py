@@ -4,8 +4,8 @@ Insta485 index (main) view.
 URLs include:
 /
 """
-import pathlib
 import hashlib
+import sqlite3
 import uuid
 import flask
 import arrow
@@ -24,56 +24,98 @@ def show_index():
     # Connect to database
     connection = insta485.model.get_db()
 
+    # Keyset pagination: ?before=<postid>&size=N
+    before = flask.request.args.get("before", type=int)
+    size = flask.request.args.get(
+        "size", default=insta485.app.config["FEED_PAGE_SIZE"], type=int
+    )
+    if size < 1:
+        flask.abort(400)
+    size = min(size, insta485.app.config["FEED_MAX_PAGE_SIZE"])
+
     # Query database
     context = {"logname": logname}
+    postids, next_before = insta485.entities.get_feed_page(
+        connection, logname, before, size
+    )
+    posts = insta485.entities.get_posts(connection, postids)
+    placeholders = ", ".join("?" * len(postids))
     cur = connection.execute(
-        "SELECT posts.postid, posts.owner, users.filename AS owner_img_url, "
-        "posts.filename AS img_url, posts.created AS timestamp "
-        "FROM posts JOIN users on posts.owner==users.username "
-        "WHERE posts.owner in "
-        "(SELECT username2 FROM following WHERE username1 == ?) "
-        "or posts.owner == ? "
-        "ORDER BY posts.postid DESC ",
-        (logname, logname, )
+        "SELECT postid FROM likes "
+        f"WHERE owner == ? and postid IN ({placeholders}) ",
+        (logname, *postids, )
     )
-    posts = cur.fetchall()
-    context["posts"] = posts
-
-    for idx in range(len(posts)):
-        time = arrow.get(context["posts"][idx]["timestamp"])
-        context["posts"][idx]["timestamp"] = time.humanize()
-        cur = connection.execute(
-            "SELECT owner "
-            "FROM likes "
-            "WHERE postid == ? ",
-            (context["posts"][idx]["postid"], )
-        )
-        likes = cur.fetchall()
-        context["posts"][idx]["likes"] = len(likes)
-        context["posts"][idx]["likes_list"] = [like["owner"] for like in likes]
-        cur = connection.execute(
-            "SELECT owner, text "
-            "FROM comments "
-            "WHERE postid == ? "
-            "ORDER BY commentid ASC ",
-            (context["posts"][idx]["postid"], )
+    liked = {row["postid"] for row in cur.fetchall()}
+    context["posts"] = []
+    for postid in postids:
+        post = posts[postid]
+        if post is None:
+            # Deleted since the cached page was read
+            continue
+        post = dict(post)
+        post["postid"] = postid
+        post["timestamp"] = arrow.get(post["timestamp"]).humanize()
+        post["liked"] = postid in liked
+        post["more_url"] = None
+        if post["more_comments"] is not None:
+            post["more_url"] = flask.url_for(
+                "show_comments", postid_url_slug=postid,
+                after=post["more_comments"]
+            )
+        context["posts"].append(post)
+    context["next_url"] = None
+    if next_before is not None:
+        context["next_url"] = flask.url_for(
+            "show_index", before=next_before, size=size
         )
-        comment = cur.fetchall()
-        context["posts"][idx]["comments"] = comment
 
     return flask.render_template("index.html", **context)
 
 
 @insta485.app.route('/uploads/<filename>')
 def download_file(filename):
-    """Download files."""
-    _, status = auth()
-    if status == 200:
-        return flask.send_from_directory(
-            insta485.app.config['UPLOAD_FOLDER'],
-            filename
+    """Download files.
+
+    Signed URLs from uploads.upload_url() are served without a login and may
+    be cached publicly until they expire.  Unsigned URLs require a login and
+    only serve files a user or post still references, so a file queued for
+    deletion is gone before it is unlinked.
+    ?width=N serves the derivative resized to N pixels wide.
+    """
+    max_age = None
+    if "signature" in flask.request.args:
+        max_age = insta485.uploads.verify_upload_url(
+            filename,
+            flask.request.args.get("expires", type=int),
+            flask.request.args["signature"],
         )
-    flask.abort(403)
+        if max_age is None:
+            flask.abort(403)
+    else:
+        _, status = auth()
+        if status != 200:
+            flask.abort(403)
+        connection = insta485.model.get_db()
+        cur = connection.execute(
+            "SELECT 1 FROM upload_refs WHERE filename == ?",
+            (filename, )
+        )
+        if cur.fetchone() is None:
+            flask.abort(404)
+
+    folder = insta485.uploads.upload_folder(filename)
+    width = flask.request.args.get("width", type=int)
+    if width is not None:
+        folder = insta485.uploads.derivative_folder(filename, width)
+    response = insta485.uploads.send_upload(
+        folder,
+        filename,
+        max_age=max_age,
+        etag=insta485.uploads.upload_etag(filename, width),
+    )
+    if max_age is not None:
+        response.cache_control.immutable = True
+    return response
 
 
 @insta485.app.route('/users/<user_url_slug>/')
@@ -90,49 +132,22 @@ def show_user_url(user_url_slug):
     connection = insta485.model.get_db()
 
     # Query database
-    context = {"logname": logname, "username": username}
-    cur = connection.execute(
-        "SELECT username1 "
-        "FROM following "
-        "WHERE username1 == ? and username2 == ? ",
-        (logname, username, )
+    user = insta485.entities.get_user(connection, username)
+    if user is None:
+        flask.abort(404)
+    context = {"logname": logname, "username": username, **user}
+    context["followers"] = insta485.followgraph.follower_count(
+        connection, username
     )
-    logname_follows_username = cur.fetchall()
-    context["logname_follows_username"] = len(logname_follows_username) != 0
-    cur = connection.execute(
-        "SELECT fullname "
-        "FROM users "
-        "WHERE username == ?",
-        (username, )
+    context["following"] = insta485.followgraph.following_count(
+        connection, username
     )
-    name = cur.fetchall()
-    context["fullname"] = name[0]["fullname"]
-    cur = connection.execute(
-        "SELECT COUNT(*) AS following "
-        "FROM following "
-        "WHERE username1 == ?",
-        (username, )
+    context["logname_follows_username"] = insta485.followgraph.is_following(
+        connection, logname, username
     )
-    name = cur.fetchall()
-    context["following"] = name[0]["following"]
-    cur = connection.execute(
-        "SELECT COUNT(*) AS followers "
-        "FROM following "
-        "WHERE username2 == ? ",
-        (username, )
-    )
-    name = cur.fetchall()
-    context["followers"] = name[0]["followers"]
-    cur = connection.execute(
-        "SELECT postid, filename AS img_url "
-        "FROM posts "
-        "WHERE owner == ? "
-        "ORDER BY postid ASC ",
-        (username, )
+    context["mutuals"] = insta485.followgraph.mutuals(
+        connection, logname, username
     )
-    posts = cur.fetchall()
-    context["total_posts"] = len(posts)
-    context["posts"] = posts
 
     return flask.render_template("user.html", **context)
 
@@ -149,31 +164,20 @@ def show_followers(user_url_slug):
 
     # Connect to database
     connection = insta485.model.get_db()
+    before, size = follow_page_args()
 
     # Query database
     context = {"logname": logname, "username": username}
-    cur = connection.execute(
-        "SELECT following.username1 AS username, "
-        "users.filename AS user_img_url "
-        "FROM following JOIN users on following.username1"
-        "==users.username "
-        "WHERE following.username2 == ?",
-        (username, )
+    followers, next_before = insta485.entities.get_followers(
+        connection, username, before, size
     )
-    followers = cur.fetchall()
-    context["followers"] = followers
-    cur = connection.execute(
-        "SELECT username2 "
-        "FROM following "
-        "WHERE username1 == ?",
-        (logname, )
-    )
-    logname_following = cur.fetchall()
-    logname_following = [following["username2"]
-                         for following in logname_following]
-    for follower in context["followers"]:
-        follower["logname_follows_username"] = (follower["username"]
-                                                in logname_following)
+    context["followers"] = follow_flags(connection, logname, followers)
+    context["next_url"] = None
+    if next_before is not None:
+        context["next_url"] = flask.url_for(
+            "show_followers", user_url_slug=username, before=next_before[0],
+            before_user=next_before[1], size=size
+        )
 
     return flask.render_template("followers.html", **context)
 
@@ -190,34 +194,62 @@ def show_following(user_url_slug):
 
     # Connect to database
     connection = insta485.model.get_db()
+    before, size = follow_page_args()
 
     # Query database
     context = {"logname": logname, "username": username}
-    cur = connection.execute(
-        "SELECT following.username2 AS username, "
-        "users.filename AS user_img_url "
-        "FROM following JOIN users on following.username2==users.username "
-        "WHERE following.username1 == ?",
-        (username, )
-    )
-    following = cur.fetchall()
-    context["following"] = following
-    cur = connection.execute(
-        "SELECT username2 "
-        "FROM following "
-        "WHERE username1 == ?",
-        (logname, )
+    following, next_before = insta485.entities.get_following(
+        connection, username, before, size
     )
-    logname_following = cur.fetchall()
-    logname_following = [following["username2"]
-                         for following in logname_following]
-    for follow in context["following"]:
-        follow["logname_follows_username"] = (follow["username"]
-                                              in logname_following)
+    context["following"] = follow_flags(connection, logname, following)
+    context["next_url"] = None
+    if next_before is not None:
+        context["next_url"] = flask.url_for(
+            "show_following", user_url_slug=username, before=next_before[0],
+            before_user=next_before[1], size=size
+        )
 
     return flask.render_template("following.html", **context)
 
 
+def follow_page_args():
+    """Return (before, size) from a follow list's query string.
+
+    Keyset pagination: ?before=<created>&before_user=<username>&size=N,
+    where the cursor is the follow time and username of the last user on
+    the previous page.
+    """
+    before = flask.request.args.get("before")
+    if before is not None:
+        before = (before, flask.request.args.get("before_user", ""))
+    size = flask.request.args.get(
+        "size", default=insta485.app.config["FOLLOW_PAGE_SIZE"], type=int
+    )
+    if size < 1:
+        flask.abort(400)
+    size = min(size, insta485.app.config["FOLLOW_MAX_PAGE_SIZE"])
+    return before, size
+
+
+def follow_flags(connection, logname, users):
+    """Return users with whether logname follows each of them.
+
+    One lookup in the following primary key covers the whole page.
+    """
+    usernames = [user["username"] for user in users]
+    placeholders = ", ".join("?" * len(usernames))
+    cur = connection.execute(
+        "SELECT username2 FROM following "
+        f"WHERE username1 == ? and username2 IN ({placeholders}) ",
+        (logname, *usernames, )
+    )
+    followed = {row["username2"] for row in cur.fetchall()}
+    return [
+        {**user, "logname_follows_username": user["username"] in followed}
+        for user in users
+    ]
+
+
 @insta485.app.route('/posts/<postid_url_slug>/')
 def show_post(postid_url_slug):
     """GET /posts/<postid_url_slug>/."""
@@ -231,44 +263,87 @@ def show_post(postid_url_slug):
     connection = insta485.model.get_db()
 
     # Query database
-    context = {"logname": logname, "postid": postid}
+    post = insta485.entities.get_posts(connection, [postid])[postid]
+    if post is None:
+        flask.abort(404)
+    context = {"logname": logname, **post, "postid": postid}
+    context["timestamp"] = arrow.get(post["timestamp"]).humanize()
     cur = connection.execute(
-        "SELECT posts.owner AS owner, users.filename AS owner_img_url, "
-        "posts.filename AS img_url, posts.created AS timestamp "
-        "FROM posts JOIN users on posts.owner==users.username "
-        "WHERE posts.postid == ?",
-        (postid, )
+        "SELECT EXISTS (SELECT 1 FROM likes "
+        "WHERE postid == ? and owner == ?) AS liked",
+        (postid, logname, )
     )
-    post = cur.fetchall()
-    context["owner"] = post[0]["owner"]
-    context["owner_img_url"] = post[0]["owner_img_url"]
-    context["img_url"] = post[0]["img_url"]
-    context["timestamp"] = arrow.get(post[0]["timestamp"]).humanize()
-    cur = connection.execute(
-        "SELECT owner "
-        "FROM likes "
-        "WHERE likes.postid == ?",
-        (postid, )
+    context["liked"] = bool(cur.fetchone()["liked"])
+    context["more_url"] = None
+    if post["more_comments"] is not None:
+        context["more_url"] = flask.url_for(
+            "show_comments", postid_url_slug=postid,
+            after=post["more_comments"]
+        )
+
+    return flask.render_template("post.html", **context)
+
+
+@insta485.app.route('/posts/<postid_url_slug>/comments/')
+def show_comments(postid_url_slug):
+    """GET /posts/<postid_url_slug>/comments/.
+
+    Comments that didn't fit on the post page, a page at a time.  Keyset
+    pagination: ?after=<commentid>&size=N.
+    """
+    postid = int(postid_url_slug)
+
+    if "username" in flask.session:
+        logname = flask.session["username"]
+    else:
+        return flask.redirect("/accounts/login/")
+    # Connect to database
+    connection = insta485.model.get_db()
+
+    after = flask.request.args.get("after", default=0, type=int)
+    size = flask.request.args.get(
+        "size", default=insta485.app.config["COMMENTS_PAGE_SIZE"], type=int
     )
-    likes = cur.fetchall()
-    context["likes"] = len(likes)
-    context["like_list"] = [like["owner"] for like in likes]
+    if size < 1:
+        flask.abort(400)
+    size = min(size, insta485.app.config["COMMENTS_MAX_PAGE_SIZE"])
+
+    # Query database
+    if insta485.entities.get_posts(connection, [postid])[postid] is None:
+        flask.abort(404)
     cur = connection.execute(
         "SELECT commentid, owner, text "
         "FROM comments "
-        "WHERE comments.postid == ? "
-        "ORDER BY commentid ASC ",
-        (postid, )
+        "WHERE postid == ? and commentid > ? "
+        "ORDER BY commentid ASC LIMIT ? ",
+        (postid, after, size + 1, )
     )
     comments = cur.fetchall()
+    context = {"logname": logname, "postid": postid, "next_url": None}
+    if len(comments) > size:
+        comments = comments[:size]
+        context["next_url"] = flask.url_for(
+            "show_comments", postid_url_slug=postid,
+            after=comments[-1]["commentid"], size=size
+        )
     context["comments"] = comments
 
-    return flask.render_template("post.html", **context)
+    return flask.render_template("comments.html", **context)
 
 
 @insta485.app.route('/explore/')
 def show_explore():
-    """GET /explore/."""
+    """GET /explore/.
+
+    The first page starts with logname's friends-of-friends suggestions (see
+    suggestions.py).  Then come accounts from the precomputed candidate pool
+    (see sql/explore.sql), a page at a time.  Accounts logname follows are
+    left out by NOT EXISTS anti-joins, each a lookup in the following primary
+    key, so a page reads at most the whole pool, however many users there
+    are.  Next page links name the pool generation they page through, which
+    a refresh keeps until the refresh after it.  A link to a generation that
+    is gone starts over on the current one.
+    """
     # Connect to database
     connection = insta485.model.get_db()
 
@@ -277,17 +352,68 @@ def show_explore():
     else:
         return flask.redirect("/accounts/login/")
 
+    # Keyset pagination: ?generation=G&after=<position>&size=N
+    after = flask.request.args.get("after", default=0, type=int)
+    generation = flask.request.args.get("generation", type=int)
+    size = flask.request.args.get(
+        "size", default=insta485.app.config["EXPLORE_PAGE_SIZE"], type=int
+    )
+    if size < 1:
+        flask.abort(400)
+    size = min(size, insta485.app.config["EXPLORE_MAX_PAGE_SIZE"])
+    cur = connection.execute(
+        "SELECT MAX(generation) AS generation FROM explore_candidates"
+    )
+    current = cur.fetchone()["generation"] or 0
+    if generation is None:
+        generation = current
+    elif generation < current - 1:
+        generation, after = current, 0
+
     # Query database
-    context = {"logname": logname}
+    context = {"logname": logname, "suggestions": []}
+    if after == 0:
+        cur = connection.execute(
+            "SELECT suggestions.candidate AS username, suggestions.score, "
+            "users.filename AS user_img_url "
+            "FROM suggestions JOIN users "
+            "on users.username == suggestions.candidate "
+            "WHERE suggestions.username == ? "
+            "and NOT EXISTS (SELECT 1 FROM following "
+            "WHERE following.username1 == ? "
+            "and following.username2 == suggestions.candidate) "
+            "ORDER BY suggestions.score DESC, suggestions.candidate "
+            "LIMIT ? ",
+            (logname, logname,
+             insta485.app.config["SUGGESTIONS_PER_USER"], )
+        )
+        context["suggestions"] = cur.fetchall()
+    # Suggested accounts are listed once, above the rest
     cur = connection.execute(
-        "SELECT username AS username, filename AS user_img_url "
-        "FROM users "
-        "WHERE username not in "
-        "(SELECT username2 FROM following WHERE username1 == ?) "
-        "and username != ?",
-        (logname, logname, )
+        "SELECT explore_candidates.position, users.username, "
+        "users.filename AS user_img_url "
+        "FROM explore_candidates JOIN users "
+        "on users.username == explore_candidates.username "
+        "WHERE explore_candidates.generation == ? "
+        "and explore_candidates.position > ? "
+        "and explore_candidates.username != ? "
+        "and NOT EXISTS (SELECT 1 FROM following "
+        "WHERE following.username1 == ? "
+        "and following.username2 == explore_candidates.username) "
+        "and NOT EXISTS (SELECT 1 FROM suggestions "
+        "WHERE suggestions.username == ? "
+        "and suggestions.candidate == explore_candidates.username) "
+        "ORDER BY explore_candidates.position LIMIT ? ",
+        (generation, after, logname, logname, logname, size + 1, )
     )
     not_following = cur.fetchall()
+    context["next_url"] = None
+    if len(not_following) > size:
+        not_following = not_following[:size]
+        context["next_url"] = flask.url_for(
+            "show_explore", generation=generation,
+            after=not_following[-1]["position"], size=size
+        )
     context["not_following"] = not_following
 
     return flask.render_template("explore.html", **context)
@@ -380,6 +506,8 @@ def update_likes():
         )
         if cur.rowcount == 0:
             flask.abort(409)
+        insta485.counters.change_likes(connection, postid, -1)
+        insta485.entities.post_changed(postid)
     else:
         cur = connection.execute(
             "SELECT * "
@@ -397,6 +525,8 @@ def update_likes():
                 "(?, ?);",
                 (logname, postid)
             )
+            insta485.counters.change_likes(connection, postid, 1)
+            insta485.entities.post_changed(postid)
 
     return flask.redirect(url) if url else flask.redirect("/")
 
@@ -429,10 +559,12 @@ def update_comments():
                 "(?, ?, ?);",
                 (logname, postid, text, )
             )
+            insta485.counters.change_comments(connection, postid, 1)
+            insta485.entities.post_changed(postid)
     else:
         commentid = int(flask.request.form["commentid"])
         cur = connection.execute(
-            "SELECT owner "
+            "SELECT owner, postid "
             "FROM comments "
             "WHERE commentid = ?",
             (commentid, )
@@ -448,6 +580,8 @@ def update_comments():
         )
         if cur.rowcount == 0:
             flask.abort(403)
+        insta485.counters.change_comments(connection, name[0]["postid"], -1)
+        insta485.entities.post_changed(name[0]["postid"])
 
     return flask.redirect(url) if url else flask.redirect("/")
 
@@ -473,20 +607,17 @@ def update_post():
         if not fileobj:
             flask.abort(400)
         else:
-            filename = fileobj.filename
-            stem = uuid.uuid4().hex
-            suffix = pathlib.Path(filename).suffix.lower()
-            uuid_basename = f"{stem}{suffix}"
-
             # Save to disk
-            path = insta485.app.config["UPLOAD_FOLDER"]/uuid_basename
-            fileobj.save(path)
+            filename = insta485.uploads.save_upload(connection, fileobj)
             cur = connection.execute(
                 "INSERT INTO posts(filename, owner) "
                 "VALUES "
                 "(?, ?);",
-                (uuid_basename, logname, )
+                (filename, logname, )
             )
+            insta485.counters.add_post(connection, logname, cur.lastrowid)
+            insta485.timeline.add_post(connection, logname, cur.lastrowid)
+            insta485.entities.post_added(connection, logname, cur.lastrowid)
     else:
         postid = int(flask.request.form["postid"])
         cur = connection.execute(
@@ -495,11 +626,10 @@ def update_post():
             (postid, )
         )
         post = cur.fetchall()
+        if not post or post[0]["owner"] != logname:
+            flask.abort(403)
         filename = post[0]["filename"]
         owner = post[0]["owner"]
-        if owner != logname:
-            flask.abort(403)
-        (insta485.app.config["UPLOAD_FOLDER"]/filename).unlink()
         cur = connection.execute(
             "DELETE FROM posts "
             "WHERE postid == ?",
@@ -507,6 +637,10 @@ def update_post():
         )
         if cur.rowcount == 0:
             flask.abort(403)
+        # Only drop the reference once the post is known to be gone
+        insta485.uploads.release_upload(connection, filename)
+        insta485.counters.remove_post(connection, owner)
+        insta485.entities.post_removed(connection, owner, postid)
 
     if url:
         return flask.redirect(url)
@@ -528,42 +662,41 @@ def update_following():
     # Connect to database
     connection = insta485.model.get_db()
 
-    # Query database
+    # Query database.  The following primary key rejects duplicate follows,
+    # so conflicts are decided by the database rather than the follow graph.
+    username = flask.request.form["username"]
     if operation == "follow":
-        username = flask.request.form["username"]
-        cur = connection.execute(
-            "SELECT * "
-            "FROM following "
-            "WHERE username1 == ? and username2 == ? ",
-            (logname, username, )
-        )
-        data = cur.fetchall()
-        if len(data) > 0:
-            flask.abort(409)
-        else:
-            cur = connection.execute(
+        try:
+            connection.execute(
                 "INSERT INTO following(username1, username2) "
                 "VALUES "
                 "(?, ?)",
                 (logname, username, )
             )
+        except sqlite3.IntegrityError:
+            flask.abort(409)
+        insta485.counters.change_following(connection, logname, username, 1)
+        insta485.timeline.update_fanout(connection, username)
+        insta485.timeline.follow(connection, logname, username)
+        insta485.entities.follow_changed(logname, username)
+        insta485.followgraph.record(
+            connection, "follow", logname, username
+        )
     else:
-        username = flask.request.form["username"]
         cur = connection.execute(
-            "SELECT * "
-            "FROM following "
+            "DELETE FROM following "
             "WHERE username1 == ? and username2 == ? ",
             (logname, username, )
         )
-        data = cur.fetchall()
-        if len(data) == 0:
+        if cur.rowcount == 0:
             flask.abort(409)
-        else:
-            cur = connection.execute(
-                "DELETE FROM following "
-                "WHERE username1 == ? and username2 == ? ",
-                (logname, username, )
-            )
+        insta485.counters.change_following(connection, logname, username, -1)
+        insta485.timeline.unfollow(connection, logname, username)
+        insta485.timeline.update_fanout(connection, username)
+        insta485.entities.follow_changed(logname, username)
+        insta485.followgraph.record(
+            connection, "unfollow", logname, username
+        )
 
     return flask.redirect(url) if url else flask.redirect("/")
 
@@ -625,13 +758,8 @@ def create_account(info, url):
     if len(data) > 0:
         flask.abort(409)
 
-    filename = info["fileobj"].filename
-    stem = uuid.uuid4().hex
-    suffix = pathlib.Path(filename).suffix.lower()
-    filename = f"{stem}{suffix}"
-
     # Save to disk
-    info["fileobj"].save(insta485.app.config["UPLOAD_FOLDER"]/filename)
+    filename = insta485.uploads.save_upload(connection, info["fileobj"])
 
     salt = uuid.uuid4().hex
     password = salt + info["password"]
@@ -645,6 +773,21 @@ def create_account(info, url):
         (info["username"], info["fullname"], info["email"],
          filename, password, )
     )
+    insta485.counters.add_user(connection, info["username"])
+    insta485.entities.account_added(info["username"])
+    insta485.followgraph.record(connection, "add_user", info["username"])
+
+    # List the account on /explore/ without waiting for the next refresh
+    cur = connection.execute(
+        "SELECT MAX(generation) AS generation FROM explore_candidates"
+    )
+    generation = cur.fetchone()["generation"]
+    if generation is not None:
+        connection.execute(
+            "INSERT INTO explore_candidates(generation, username) "
+            "VALUES (?, ?)",
+            (generation, info["username"], )
+        )
 
     flask.session["username"] = info["username"]
     return flask.redirect(url)
@@ -665,22 +808,27 @@ def delete_account(url):
         (logname, )
     )
     file = cur.fetchall()
-    filename = file[0]["filename"]
-    (insta485.app.config["UPLOAD_FOLDER"]/filename).unlink()
+    if not file:
+        flask.abort(403)
+    filenames = [file[0]["filename"]]
     cur = connection.execute(
         "SELECT filename "
         "FROM posts "
         "WHERE owner == ?",
         (logname, )
     )
-    filenames = cur.fetchall()
-    for file in filenames:
-        (insta485.app.config["UPLOAD_FOLDER"]/file["filename"]).unlink()
+    filenames += [file["filename"] for file in cur.fetchall()]
+    insta485.counters.remove_user(connection, logname)
+    insta485.entities.account_removed(connection, logname)
+    insta485.followgraph.record(connection, "remove_user", logname)
     cur = connection.execute(
         "DELETE FROM users "
         "WHERE username == ?",
         (logname, )
     )
+    # Drop the references only once the rows holding them are gone
+    for filename in filenames:
+        insta485.uploads.release_upload(connection, filename)
     flask.session.pop("username", None)
     return flask.redirect(url)
 
@@ -698,6 +846,7 @@ def edit_account(logname, fullname, email, fileobj, url):
             "WHERE username == ?",
             (fullname, email, logname, )
         )
+        insta485.entities.account_changed(connection, logname, False)
     else:
         cur = connection.execute(
             "SELECT filename "
@@ -707,21 +856,19 @@ def edit_account(logname, fullname, email, fileobj, url):
         )
         file = cur.fetchall()
         filename_old = file[0]["filename"]
-        (insta485.app.config["UPLOAD_FOLDER"]/filename_old).unlink()
 
-        filename = fileobj.filename
-        stem = uuid.uuid4().hex
-        suffix = pathlib.Path(filename).suffix.lower()
-        uuid_basename = f"{stem}{suffix}"
-
-        # Save to disk
-        path = insta485.app.config["UPLOAD_FOLDER"]/uuid_basename
-        fileobj.save(path)
+        # Save the new avatar before releasing the old one, in case they are
+        # the same file
+        filename = insta485.uploads.save_upload(connection, fileobj)
+        insta485.uploads.release_upload(connection, filename_old)
         cur = connection.execute(
             "UPDATE users "
             "SET fullname = ?, email = ?, filename = ? "
             "WHERE username == ?",
-            (fullname, email, uuid_basename, logname, )
+            (fullname, email, filename, logname, )
+        )
+        insta485.entities.account_changed(
+            connection, logname, filename != filename_old
         )
 
     return flask.redirect(url)
@@ -817,3 +964,13 @@ def auth():
     if "username" in flask.session:
         return "", 200
     flask.abort(403)
+
+
+@insta485.app.route('/stats/')
+def show_stats():
+    """GET /stats/, the cache and connection pool metrics of this process."""
+    auth()
+    return flask.jsonify(
+        cache=insta485.cache.cache_stats(),
+        pool=insta485.model.pool_stats(),
+    )
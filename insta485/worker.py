@@ -0,0 +1,59 @@
+"""Insta485 background worker threads."""
+import threading
+
+
+class Worker:
+    """Background thread that calls work() each time it is woken.
+
+    The thread starts on the first wake() and then sleeps until the next.
+    A wake() while work() runs makes it run once more afterwards.
+    """
+
+    # Name of the thread, shown in tracebacks and debuggers
+    name = "insta485-worker"
+
+    def __init__(self):
+        """Create a stopped worker."""
+        self.lock = threading.Condition()
+        self.thread = None
+        self.pending = False
+        self.busy = False
+
+    def wake(self):
+        """Ask the worker to run, starting its thread if needed."""
+        with self.lock:
+            self.pending = True
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name=self.name, daemon=True
+                )
+                self.thread.start()
+            self.lock.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until every wake() so far has been handled.
+
+        Return False on timeout.
+        """
+        with self.lock:
+            return self.lock.wait_for(
+                lambda: not self.pending and not self.busy, timeout
+            )
+
+    def run(self):
+        """Call work() each time the worker is woken."""
+        while True:
+            with self.lock:
+                self.lock.wait_for(lambda: self.pending)
+                self.pending = False
+                self.busy = True
+            try:
+                self.work()
+            finally:
+                with self.lock:
+                    self.busy = False
+                    self.lock.notify_all()
+
+    def work(self):
+        """Do whatever the worker was woken for."""
+        raise NotImplementedError
@@ -0,0 +1,40 @@
+-- Refresh the explore page's candidate pool.  The pool holds the 500 most
+-- followed accounts followed by a random sample of 500 others, so a page of
+-- /explore/ never reads more than 1000 candidates however many users there
+-- are.  Run periodically, e.g., from cron, to rotate the sample and pick up
+-- new accounts.
+--
+-- Each refresh writes a new generation.  Pages of /explore/ carry their
+-- generation in the cursor, so the previous generation is kept for anyone
+-- still paging through it.  Older ones are dropped.
+PRAGMA foreign_keys = ON;
+
+BEGIN;
+
+DELETE FROM explore_candidates
+WHERE generation < (SELECT MAX(generation) FROM explore_candidates);
+
+CREATE TEMP TABLE explore_generation AS
+SELECT COALESCE(MAX(generation), 0) + 1 AS generation
+FROM explore_candidates;
+
+-- Rows get positions in insertion order: most followed first
+INSERT INTO explore_candidates(generation, username)
+SELECT explore_generation.generation, user_stats.username
+FROM user_stats, temp.explore_generation
+ORDER BY user_stats.follower_count DESC, user_stats.username
+LIMIT 500;
+
+INSERT INTO explore_candidates(generation, username)
+SELECT explore_generation.generation, users.username
+FROM users, temp.explore_generation
+WHERE users.username NOT IN (
+  SELECT username FROM explore_candidates
+  WHERE generation == explore_generation.generation
+)
+ORDER BY random()
+LIMIT 500;
+
+DROP TABLE temp.explore_generation;
+
+COMMIT;
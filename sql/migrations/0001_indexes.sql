@@ -0,0 +1,7 @@
+-- Secondary indexes for every foreign key lookup path
+CREATE INDEX IF NOT EXISTS posts_owner_idx ON posts(owner);
+CREATE INDEX IF NOT EXISTS following_username2_idx ON following(username2);
+CREATE INDEX IF NOT EXISTS comments_postid_idx ON comments(postid);
+CREATE INDEX IF NOT EXISTS comments_owner_idx ON comments(owner);
+CREATE INDEX IF NOT EXISTS likes_postid_owner_idx ON likes(postid, owner);
+CREATE INDEX IF NOT EXISTS likes_owner_idx ON likes(owner);
@@ -0,0 +1,32 @@
+-- Denormalized per-user and per-post counters
+CREATE TABLE user_stats(
+  username VARCHAR(20) NOT NULL,
+  post_count INTEGER NOT NULL DEFAULT 0,
+  follower_count INTEGER NOT NULL DEFAULT 0,
+  following_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY(username),
+  FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE
+);
+
+CREATE TABLE post_stats(
+  postid INTEGER NOT NULL,
+  like_count INTEGER NOT NULL DEFAULT 0,
+  comment_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY(postid),
+  FOREIGN KEY(postid) REFERENCES posts(postid) ON DELETE CASCADE
+);
+
+INSERT INTO user_stats(username, post_count, follower_count, following_count)
+SELECT
+  username,
+  (SELECT COUNT(*) FROM posts WHERE posts.owner = users.username),
+  (SELECT COUNT(*) FROM following WHERE following.username2 = users.username),
+  (SELECT COUNT(*) FROM following WHERE following.username1 = users.username)
+FROM users;
+
+INSERT INTO post_stats(postid, like_count, comment_count)
+SELECT
+  postid,
+  (SELECT COUNT(*) FROM likes WHERE likes.postid = posts.postid),
+  (SELECT COUNT(*) FROM comments WHERE comments.postid = posts.postid)
+FROM posts;
@@ -0,0 +1,11 @@
+-- Reference counts for content-addressed uploads
+CREATE TABLE upload_refs(
+  filename VARCHAR(64) NOT NULL,
+  refcount INTEGER NOT NULL,
+  PRIMARY KEY(filename)
+);
+
+INSERT INTO upload_refs(filename, refcount)
+SELECT filename, COUNT(*)
+FROM (SELECT filename FROM users UNION ALL SELECT filename FROM posts)
+GROUP BY filename;
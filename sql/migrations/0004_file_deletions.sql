@@ -0,0 +1,6 @@
+-- Durable queue of files to unlink after commit
+CREATE TABLE file_deletions(
+  deletionid INTEGER PRIMARY KEY AUTOINCREMENT,
+  filename VARCHAR(64) NOT NULL,
+  created DATETIME DEFAULT CURRENT_TIMESTAMP
+);
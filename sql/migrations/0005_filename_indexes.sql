@@ -0,0 +1,3 @@
+-- Let insta485db gc walk referenced filenames in sorted order
+CREATE INDEX IF NOT EXISTS users_filename_idx ON users(filename);
+CREATE INDEX IF NOT EXISTS posts_filename_idx ON posts(filename);
@@ -0,0 +1,16 @@
+-- Materialized home feeds, see sql/timeline.sql
+CREATE TABLE timeline(
+  username VARCHAR(20) NOT NULL,
+  postid INTEGER NOT NULL,
+  PRIMARY KEY(username, postid),
+  FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE,
+  FOREIGN KEY(postid) REFERENCES posts(postid) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX timeline_postid_idx ON timeline(postid);
+
+INSERT OR IGNORE INTO timeline(username, postid)
+SELECT owner, postid FROM posts
+UNION
+SELECT following.username1, posts.postid
+FROM following JOIN posts ON posts.owner = following.username2;
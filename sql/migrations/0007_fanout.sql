@@ -0,0 +1,2 @@
+-- Per-user switch between fan-out on write and merge on read
+ALTER TABLE user_stats ADD COLUMN fanout INTEGER NOT NULL DEFAULT 1;
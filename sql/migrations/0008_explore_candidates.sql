@@ -0,0 +1,17 @@
+-- Precomputed candidates for the explore page, refreshed by sql/explore.sql
+CREATE TABLE explore_candidates(
+  position INTEGER PRIMARY KEY,
+  username VARCHAR(20) NOT NULL UNIQUE,
+  FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE
+);
+
+INSERT INTO explore_candidates(username)
+SELECT username FROM user_stats
+ORDER BY follower_count DESC, username
+LIMIT 500;
+
+INSERT INTO explore_candidates(username)
+SELECT username FROM users
+WHERE username NOT IN (SELECT username FROM explore_candidates)
+ORDER BY random()
+LIMIT 500;
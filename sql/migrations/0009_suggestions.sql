@@ -0,0 +1,13 @@
+-- Friends-of-friends suggestions, filled by insta485db suggest
+CREATE TABLE suggestions(
+  username VARCHAR(20) NOT NULL,
+  candidate VARCHAR(20) NOT NULL,
+  score INTEGER NOT NULL,
+  PRIMARY KEY(username, candidate),
+  FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE,
+  FOREIGN KEY(candidate) REFERENCES users(username) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX suggestions_score_idx
+  ON suggestions(username, score DESC, candidate);
+CREATE INDEX suggestions_candidate_idx ON suggestions(candidate);
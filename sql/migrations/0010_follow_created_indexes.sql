@@ -0,0 +1,7 @@
+-- Let the followers and following pages walk follows in created order.
+-- The username2 index is a prefix of the new followers index.
+DROP INDEX IF EXISTS following_username2_idx;
+CREATE INDEX IF NOT EXISTS following_username1_created_idx
+  ON following(username1, created, username2);
+CREATE INDEX IF NOT EXISTS following_username2_created_idx
+  ON following(username2, created, username1);
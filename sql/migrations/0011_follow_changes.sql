@@ -0,0 +1,8 @@
+-- Follow graph changes, read by each server process to keep its in-memory
+-- graph current
+CREATE TABLE follow_changes(
+  changeid INTEGER PRIMARY KEY AUTOINCREMENT,
+  operation VARCHAR(16) NOT NULL,
+  username1 VARCHAR(20) NOT NULL,
+  username2 VARCHAR(20)
+);
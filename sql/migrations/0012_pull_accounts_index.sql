@@ -0,0 +1,4 @@
+-- Accounts that don't fan out on write, which the home feed merges in at
+-- read time.  Only those rows are indexed.
+CREATE INDEX IF NOT EXISTS user_stats_pull_idx
+  ON user_stats(fanout, username) WHERE fanout == 0;
@@ -0,0 +1,18 @@
+-- Keep explore candidates in generations with positions that are never
+-- reused, so a refresh doesn't shift /explore/ cursors
+CREATE TABLE explore_candidates_new(
+  position INTEGER PRIMARY KEY AUTOINCREMENT,
+  generation INTEGER NOT NULL,
+  username VARCHAR(20) NOT NULL,
+  UNIQUE(username, generation),
+  FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE
+);
+
+INSERT INTO explore_candidates_new(position, generation, username)
+SELECT position, 1, username FROM explore_candidates
+ORDER BY position;
+
+DROP TABLE explore_candidates;
+ALTER TABLE explore_candidates_new RENAME TO explore_candidates;
+CREATE INDEX explore_candidates_generation_idx
+  ON explore_candidates(generation);
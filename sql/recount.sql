@@ -0,0 +1,34 @@
+-- Rebuild the denormalized counters in user_stats, post_stats and
+-- upload_refs from the rows they count
+PRAGMA foreign_keys = ON;
+
+BEGIN;
+
+-- Upsert rather than delete and insert, which would reset user_stats.fanout
+INSERT INTO user_stats(username, post_count, follower_count, following_count)
+SELECT
+  username,
+  (SELECT COUNT(*) FROM posts WHERE posts.owner = users.username),
+  (SELECT COUNT(*) FROM following WHERE following.username2 = users.username),
+  (SELECT COUNT(*) FROM following WHERE following.username1 = users.username)
+FROM users WHERE true
+ON CONFLICT(username) DO UPDATE SET
+  post_count = excluded.post_count,
+  follower_count = excluded.follower_count,
+  following_count = excluded.following_count;
+
+DELETE FROM post_stats;
+INSERT INTO post_stats(postid, like_count, comment_count)
+SELECT
+  postid,
+  (SELECT COUNT(*) FROM likes WHERE likes.postid = posts.postid),
+  (SELECT COUNT(*) FROM comments WHERE comments.postid = posts.postid)
+FROM posts;
+
+DELETE FROM upload_refs;
+INSERT INTO upload_refs(filename, refcount)
+SELECT filename, COUNT(*)
+FROM (SELECT filename FROM users UNION ALL SELECT filename FROM posts)
+GROUP BY filename;
+
+COMMIT;
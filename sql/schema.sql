@@ -46,3 +46,110 @@ CREATE TABLE likes(
   FOREIGN KEY(postid) REFERENCES posts(postid) ON DELETE CASCADE
 );
 
+-- Denormalized counters, maintained by insta485/counters.py and rebuilt by
+-- sql/recount.sql
+CREATE TABLE user_stats(
+  username VARCHAR(20) NOT NULL,
+  post_count INTEGER NOT NULL DEFAULT 0,
+  follower_count INTEGER NOT NULL DEFAULT 0,
+  following_count INTEGER NOT NULL DEFAULT 0,
+  -- 0 if this user's posts are merged into feeds at read time instead of
+  -- being copied into followers' timelines, see insta485/timeline.py
+  fanout INTEGER NOT NULL DEFAULT 1,
+  PRIMARY KEY(username),
+  FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE
+);
+
+CREATE TABLE post_stats(
+  postid INTEGER NOT NULL,
+  like_count INTEGER NOT NULL DEFAULT 0,
+  comment_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY(postid),
+  FOREIGN KEY(postid) REFERENCES posts(postid) ON DELETE CASCADE
+);
+
+-- Number of users and posts referencing each upload.  Uploads are stored by
+-- content hash, so one file may be shared.  Maintained by
+-- insta485/uploads.py and rebuilt by sql/recount.sql.
+CREATE TABLE upload_refs(
+  filename VARCHAR(64) NOT NULL,
+  refcount INTEGER NOT NULL,
+  PRIMARY KEY(filename)
+);
+
+-- Materialized home feeds.  One row for every post a user sees: their own
+-- posts and the posts of everyone they follow, except accounts with
+-- user_stats.fanout = 0.  Maintained on write by insta485/timeline.py and
+-- rebuilt by sql/timeline.sql.
+CREATE TABLE timeline(
+  username VARCHAR(20) NOT NULL,
+  postid INTEGER NOT NULL,
+  PRIMARY KEY(username, postid),
+  FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE,
+  FOREIGN KEY(postid) REFERENCES posts(postid) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Files whose last reference is gone, queued in the same transaction and
+-- unlinked after commit by insta485/deletions.py
+CREATE TABLE file_deletions(
+  deletionid INTEGER PRIMARY KEY AUTOINCREMENT,
+  filename VARCHAR(64) NOT NULL,
+  created DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Candidates for the explore page, most followed first and then a random
+-- sample of other accounts.  Each refresh by sql/explore.sql adds a
+-- generation and keeps the one before it, so /explore/ cursors stay valid.
+-- Positions are never reused.
+CREATE TABLE explore_candidates(
+  position INTEGER PRIMARY KEY AUTOINCREMENT,
+  generation INTEGER NOT NULL,
+  username VARCHAR(20) NOT NULL,
+  UNIQUE(username, generation),
+  FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE
+);
+
+-- Friends-of-friends suggestions: candidate is followed by score of the
+-- accounts username follows.  Written by insta485db suggest.
+CREATE TABLE suggestions(
+  username VARCHAR(20) NOT NULL,
+  candidate VARCHAR(20) NOT NULL,
+  score INTEGER NOT NULL,
+  PRIMARY KEY(username, candidate),
+  FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE,
+  FOREIGN KEY(candidate) REFERENCES users(username) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Follow graph changes, read by each server process to keep its in-memory
+-- graph current (see insta485/followgraph.py).  username2 is NULL for
+-- add_user and remove_user.  No foreign keys, so removals can be logged.
+CREATE TABLE follow_changes(
+  changeid INTEGER PRIMARY KEY AUTOINCREMENT,
+  operation VARCHAR(16) NOT NULL,
+  username1 VARCHAR(20) NOT NULL,
+  username2 VARCHAR(20)
+);
+
+-- Secondary indexes for every foreign key lookup path.  Keep in sync with
+-- sql/migrations/, which applies the same changes to existing databases.
+CREATE INDEX posts_owner_idx ON posts(owner);
+CREATE INDEX following_username1_created_idx
+  ON following(username1, created, username2);
+CREATE INDEX following_username2_created_idx
+  ON following(username2, created, username1);
+CREATE INDEX comments_postid_idx ON comments(postid);
+CREATE INDEX comments_owner_idx ON comments(owner);
+CREATE INDEX likes_postid_owner_idx ON likes(postid, owner);
+CREATE INDEX likes_owner_idx ON likes(owner);
+CREATE INDEX users_filename_idx ON users(filename);
+CREATE INDEX posts_filename_idx ON posts(filename);
+CREATE INDEX timeline_postid_idx ON timeline(postid);
+CREATE INDEX user_stats_pull_idx
+  ON user_stats(fanout, username) WHERE fanout == 0;
+CREATE INDEX suggestions_score_idx
+  ON suggestions(username, score DESC, candidate);
+CREATE INDEX suggestions_candidate_idx ON suggestions(candidate);
+CREATE INDEX explore_candidates_generation_idx
+  ON explore_candidates(generation);
+
+PRAGMA user_version = 13;
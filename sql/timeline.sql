@@ -0,0 +1,16 @@
+-- Rebuild the materialized timeline table from posts and following.  Posts
+-- by accounts with user_stats.fanout = 0 are merged in at read time instead.
+PRAGMA foreign_keys = ON;
+
+BEGIN;
+
+DELETE FROM timeline;
+INSERT INTO timeline(username, postid)
+SELECT owner, postid FROM posts
+UNION
+SELECT following.username1, posts.postid
+FROM following JOIN posts ON posts.owner = following.username2
+JOIN user_stats ON user_stats.username = following.username2
+WHERE user_stats.fanout = 1;
+
+COMMIT;
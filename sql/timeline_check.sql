@@ -0,0 +1,30 @@
+-- List differences between the timeline table and posts and following.
+-- No output means the timeline is consistent.  Posts by accounts with
+-- user_stats.fanout = 0 are not required, but rows copied before the account
+-- switched are allowed.
+WITH required(username, postid) AS (
+  SELECT owner, postid FROM posts
+  UNION
+  SELECT following.username1, posts.postid
+  FROM following JOIN posts ON posts.owner = following.username2
+  JOIN user_stats ON user_stats.username = following.username2
+  WHERE user_stats.fanout = 1
+),
+allowed(username, postid) AS (
+  SELECT owner, postid FROM posts
+  UNION
+  SELECT following.username1, posts.postid
+  FROM following JOIN posts ON posts.owner = following.username2
+)
+SELECT 'missing', username, postid FROM (
+  SELECT username, postid FROM required
+  EXCEPT
+  SELECT username, postid FROM timeline
+)
+UNION ALL
+SELECT 'extra', username, postid FROM (
+  SELECT username, postid FROM timeline
+  EXCEPT
+  SELECT username, postid FROM allowed
+)
+ORDER BY 2, 3;
@@ -56,7 +56,9 @@ def client_setup_teardown():
         yield client
 
     # Reset the database. After running any test any of the changes made
-    # to the database should be undone.
+    # to the database should be undone.  Let queued file deletions finish
+    # first, so they can't remove files from the fresh copy.
+    insta485.deletions.WORKER.wait()
     subprocess.run(["bin/insta485db", "reset"], check=True)
 
 
@@ -5,6 +5,7 @@ EECS 485 Project 2
 
 Andrew DeOrio <awdeorio@umich.edu>
 """
+import hashlib
 import uuid
 import sqlite3
 from urllib.parse import urlparse, urlencode
@@ -93,6 +94,10 @@ def test_accounts_edit(client, mocker):
         return_value=uuid.UUID("00000000000000000000000000000000"),
     )
 
+    # Uploads are named by the SHA-256 of their content
+    avatar_path = utils.TEST_DIR/"testdata/fox.jpg"
+    avatar_hash = hashlib.sha256(avatar_path.read_bytes()).hexdigest()
+
     # Log in
     response = client.post(
         "/accounts/",
@@ -103,7 +108,6 @@ def test_accounts_edit(client, mocker):
     assert response.status_code == 302
 
     # Change name, email and photo
-    avatar_path = utils.TEST_DIR/"testdata/fox.jpg"
     with avatar_path.open('rb') as avatar:
         query_string = urlencode({"target": "/accounts/edit/"})
         response = client.post(
@@ -152,7 +156,7 @@ def test_accounts_edit(client, mocker):
         "awdeorio",
         "New Name",
         "newemail@umich.edu",
-        "00000000000000000000000000000000.jpg",
+        f"{avatar_hash}.jpg",
     )]
 
 
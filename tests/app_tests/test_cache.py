@@ -0,0 +1,247 @@
+"""
+Check the entity cache in insta485/cache.py and insta485/entities.py.
+
+EECS 485 Project 2
+"""
+import threading
+import time
+import pytest
+import insta485
+import utils
+
+
+@pytest.fixture(name="shared")
+def shared_backend(client):
+    """Use the shared backend stand-in for the duration of a test."""
+    insta485.app.config["CACHE_BACKEND"] = "shared"
+    insta485.cache.CACHE.reset()
+    yield client
+    insta485.app.config["CACHE_BACKEND"] = "memory"
+    insta485.cache.CACHE.reset()
+
+
+def test_cache_hits(client):
+    """Verify repeated page views are served from the cache."""
+    utils.login(client)
+    for url in ["/", "/users/awdeorio/", "/users/awdeorio/followers/",
+                "/users/awdeorio/following/", "/posts/3/"]:
+        response = client.get(url)
+        assert response.status_code == 200
+        before = insta485.cache.cache_stats()
+        response = client.get(url)
+        assert response.status_code == 200
+        after = insta485.cache.cache_stats()
+        assert after["misses"] == before["misses"], url
+        assert after["hits"] > before["hits"], url
+
+    stats = insta485.cache.cache_stats()
+    assert stats["backend"] == "memory"
+    assert stats["kinds"]["post"]["hits"] > 0
+    assert 0 < stats["hit_rate"] < 1
+
+
+def test_likes_comments_invalidate(client):
+    """Verify likes and comments show up on a cached post."""
+    utils.login(client, "jflinn", "password")
+    response = client.get("/posts/3/")
+    assert b"1 like<" not in response.data
+
+    response = client.post(
+        "/likes/", data={"operation": "like", "postid": "3"}
+    )
+    assert response.status_code == 302
+    response = client.post(
+        "/comments/",
+        data={"operation": "create", "postid": "3", "text": "cached?"},
+    )
+    assert response.status_code == 302
+    response = client.get("/posts/3/")
+    assert b"cached?" in response.data
+    assert b"unlike" in response.data
+    response = client.get("/")
+    assert b"cached?" in response.data
+
+
+def test_posts_follows_invalidate(client):
+    """Verify new posts, follows and account edits reach cached pages."""
+    utils.login(client)
+    client.get("/")
+    client.get("/users/jag/")
+    client.get("/users/jag/followers/")
+
+    response = client.post(
+        "/following/", data={"operation": "follow", "username": "jag"}
+    )
+    assert response.status_code == 302
+    response = client.get("/users/jag/")
+    assert b"2 followers" in response.data
+    response = client.get("/users/jag/followers/")
+    assert b"/users/awdeorio/" in response.data
+    response = client.get("/")
+    assert b"/posts/4/" in response.data
+
+    # jag's new post appears in awdeorio's cached feed
+    utils.login(client, "jag", "password")
+    with open("tests/app_tests/testdata/fox.jpg", "rb") as fileobj:
+        response = client.post(
+            "/posts/", data={"operation": "create", "file": fileobj}
+        )
+    assert response.status_code == 302
+    utils.login(client)
+    response = client.get("/")
+    assert b"/posts/5/" in response.data
+
+    response = client.post(
+        "/accounts/",
+        data={"operation": "edit_account", "fullname": "New Name",
+              "email": "awdeorio@umich.edu", "file": (b"", "")},
+    )
+    assert response.status_code == 302
+    response = client.get("/users/awdeorio/")
+    assert b"New Name" in response.data
+
+
+def test_stale_fill_skipped(client):
+    """Verify a value read before an invalidation is not stored after it."""
+    assert client
+    cache = insta485.cache.CACHE
+    identity = ("dev", "ino")
+    with insta485.app.app_context():
+        epoch = cache.epoch()
+        _, lead, _ = cache.begin(identity, ["post:1"], epoch)
+        cache.invalidate(identity, ["post:1"])
+        cache.finish(identity, lead, {"post:1": "old"}, epoch)
+        found, lead, _ = cache.begin(identity, ["post:1"], cache.epoch())
+        assert not found
+        cache.finish(identity, lead, {"post:1": "new"}, cache.epoch())
+        found, _, _ = cache.begin(identity, ["post:1"], cache.epoch())
+        assert found == {"post:1": "new"}
+
+
+def test_single_flight(client):
+    """Verify concurrent misses for one key run a single load."""
+    assert client
+    loads = []
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def load(keys):
+        loads.append(keys)
+        started.set()
+        release.wait(5)
+        return {"user:jag": "profile"}
+
+    def request():
+        with insta485.app.test_request_context():
+            connection = insta485.model.get_db()
+            results.append(
+                insta485.cache.cached_many(connection, ["user:jag"], load)
+            )
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Let the other requests reach the flight before the load finishes
+    while insta485.cache.cache_stats()["coalesced"] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert loads == [["user:jag"]]
+    assert results == [{"user:jag": "profile"}] * 4
+
+
+def test_stale_while_revalidate(client):
+    """Verify an expired entry is served while another request refreshes it.
+
+    Tombstones left by invalidations are never served.
+    """
+    assert client
+    cache = insta485.cache.CACHE
+    identity = ("dev", "ino")
+    ttl = insta485.app.config["CACHE_TTL"]
+    with insta485.app.app_context():
+        insta485.app.config["CACHE_TTL"] = -1
+        try:
+            epoch = cache.epoch()
+            _, lead, _ = cache.begin(identity, ["post:1"], epoch)
+            cache.finish(identity, lead, {"post:1": "old"}, epoch)
+        finally:
+            insta485.app.config["CACHE_TTL"] = ttl
+
+        # The first request refreshes, the second is served the old value
+        found, lead, _ = cache.begin(identity, ["post:1"], epoch)
+        assert not found and list(lead) == ["post:1"]
+        found, _, follow = cache.begin(identity, ["post:1"], epoch)
+        assert found == {"post:1": "old"} and not follow
+        cache.finish(identity, lead, {"post:1": "new"}, epoch)
+        found, _, _ = cache.begin(identity, ["post:1"], epoch)
+        assert found == {"post:1": "new"}
+
+        cache.invalidate(identity, ["post:1"])
+        _, lead, _ = cache.begin(identity, ["post:1"], cache.epoch())
+        found, _, follow = cache.begin(identity, ["post:1"], cache.epoch())
+        assert not found and list(follow) == ["post:1"]
+        cache.finish(identity, lead, None, cache.epoch())
+        assert not follow["post:1"].wait(0)
+
+
+def test_shared_backend(shared):
+    """Verify pages work and hit the cache with the shared backend."""
+    utils.login(shared)
+    response = shared.get("/posts/3/")
+    assert response.status_code == 200
+    response = shared.get("/posts/3/")
+    assert response.status_code == 200
+    stats = insta485.cache.cache_stats()
+    assert stats["backend"] == "shared"
+    assert stats["kinds"]["post"]["hits"] == 1
+    assert stats["kinds"]["post"]["misses"] == 1
+
+    response = shared.post(
+        "/likes/", data={"operation": "unlike", "postid": "3"}
+    )
+    assert response.status_code == 302
+    response = shared.get("/posts/3/")
+    assert b"0 likes" in response.data
+
+
+def test_shared_counter_evicted(shared):
+    """Verify an evicted epoch restarts above every epoch handed out."""
+    utils.login(shared)
+    response = shared.post(
+        "/likes/", data={"operation": "unlike", "postid": "3"}
+    )
+    assert response.status_code == 302
+    cache = insta485.cache.CACHE
+    client = cache.store.client
+    before = cache.epoch()
+    assert before > 0
+
+    # A real memcached client returns None from incr() on a missing key
+    del client.values[insta485.cache.EPOCH_KEY]
+    assert client.incr(insta485.cache.EPOCH_KEY, 1) is None
+    response = shared.post(
+        "/likes/", data={"operation": "like", "postid": "3"}
+    )
+    assert response.status_code == 302
+    assert cache.epoch() > before
+    response = shared.get("/posts/3/")
+    assert b'value="unlike"' in response.data
+
+
+def test_stats(client):
+    """Verify /stats/ reports cache and pool metrics to logged in users."""
+    response = client.get("/stats/")
+    assert response.status_code == 403
+    utils.login(client)
+    client.get("/")
+    response = client.get("/stats/")
+    assert response.status_code == 200
+    assert response.json["cache"]["backend"] == "memory"
+    assert response.json["cache"]["misses"] > 0
+    assert response.json["pool"]["acquired"] > 0
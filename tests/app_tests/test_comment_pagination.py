@@ -0,0 +1,74 @@
+"""
+Check the bounded comments on the post page and their load more pages.
+
+EECS 485 Project 2
+"""
+import bs4
+import insta485
+import utils
+
+
+def page_comments(response):
+    """Return the comment texts on a page and its more comments link."""
+    assert response.status_code == 200
+    soup = bs4.BeautifulSoup(response.data, "html.parser")
+    texts = [x.parent.next_sibling.strip() for x in soup.find_all("b")]
+    more_links = [x.get("href") for x in soup.find_all("a")
+                  if x.text.strip() in ("more comments", "next page")]
+    return texts, more_links
+
+
+def test_load_more(client, monkeypatch):
+    """Verify the post page and load more pages show every comment once.
+
+    Post 3 starts with three comments.
+    """
+    monkeypatch.setitem(insta485.app.config, "COMMENTS_PAGE_SIZE", 2)
+    utils.login(client)
+    for text in ["fourth", "fifth"]:
+        response = client.post(
+            "/comments/",
+            data={"operation": "create", "postid": "3", "text": text},
+        )
+        assert response.status_code == 302
+
+    texts, more_links = page_comments(client.get("/posts/3/"))
+    assert texts == ["#chickensofinstagram", "I <3 chickens"]
+    assert more_links == ["/posts/3/comments/?after=2"]
+
+    seen = list(texts)
+    url = more_links[0] + "&size=2"
+    while url:
+        texts, more_links = page_comments(client.get(url))
+        assert len(texts) <= 2
+        seen += texts
+        url = more_links[0] if more_links else None
+    assert seen == ["#chickensofinstagram", "I <3 chickens",
+                    "Cute overload!", "fourth", "fifth"]
+
+    # The feed shows the same first page
+    response = client.get("/")
+    assert b"/posts/3/comments/?after=2" in response.data
+
+
+def test_liked(client):
+    """Verify the post page shows whether the viewer liked the post."""
+    utils.login(client)
+    response = client.get("/posts/2/")
+    assert b'value="unlike"' in response.data
+    soup = bs4.BeautifulSoup(response.data, "html.parser")
+    assert "2 likes" in soup.get_text(" ", strip=True)
+
+    utils.login(client, "jag", "password")
+    response = client.get("/posts/2/")
+    assert b'value="like"' in response.data
+    assert b"/posts/2/comments/" not in response.data
+
+
+def test_missing_post(client):
+    """Verify comments of a missing post are 404 and bad sizes are 400."""
+    utils.login(client)
+    response = client.get("/posts/99/comments/")
+    assert response.status_code == 404
+    response = client.get("/posts/3/comments/?size=0")
+    assert response.status_code == 400
@@ -0,0 +1,116 @@
+"""
+Check database connection reuse in insta485/model.py.
+
+EECS 485 Project 2
+"""
+import sqlite3
+import subprocess
+import pytest
+import insta485
+import utils
+
+
+def test_pool_reuses_connections(client):
+    """Verify sequential requests share one open connection."""
+    utils.login(client)
+    before = insta485.model.pool_stats()
+    for _ in range(5):
+        response = client.get("/")
+        assert response.status_code == 200
+    after = insta485.model.pool_stats()
+
+    assert after["acquired"] == before["acquired"] + 5
+    assert after["opened"] - before["opened"] <= 1
+    assert after["in_use"] == 0
+    assert after["open"] <= after["size"]
+    assert after["wait_seconds_total"] >= 0
+
+
+def test_pool_replaced_database(client):
+    """Verify pooled connections to a replaced database file are dropped."""
+    utils.login(client)
+    response = client.post(
+        "/following/", data={"operation": "follow", "username": "jag"}
+    )
+    assert response.status_code == 302
+    response = client.get("/users/jag/")
+    assert b"2 followers" in response.data
+
+    # Replace the database file while a connection to it is pooled
+    subprocess.run(["bin/insta485db", "reset"], check=True)
+    before = insta485.model.pool_stats()
+    response = client.get("/users/jag/")
+    after = insta485.model.pool_stats()
+    assert b"1 follower<" in response.data
+    assert after["discarded"] > before["discarded"]
+
+
+def test_pool_resets_state(client):
+    """Verify a connection comes back from the pool without a transaction."""
+    utils.login(client)
+    connection = insta485.model.POOL.acquire()
+    connection.execute(
+        "UPDATE users SET fullname = 'Uncommitted' "
+        "WHERE username = 'awdeorio'"
+    )
+    insta485.model.POOL.release(connection)
+
+    response = client.get("/users/awdeorio/")
+    assert b"Uncommitted" not in response.data
+
+
+def test_pool_pragmas(client):
+    """Verify new connections get the configured PRAGMA profile."""
+    assert client
+    connection = insta485.model.POOL.acquire()
+    try:
+        pragmas = insta485.app.config["DATABASE_PRAGMAS"]
+        cur = connection.execute("PRAGMA journal_mode")
+        assert cur.fetchone()["journal_mode"] == "wal"
+        cur = connection.execute("PRAGMA busy_timeout")
+        assert cur.fetchone()["timeout"] == pragmas["busy_timeout"]
+        cur = connection.execute("PRAGMA cache_size")
+        assert cur.fetchone()["cache_size"] == pragmas["cache_size"]
+        cur = connection.execute("PRAGMA foreign_keys")
+        assert cur.fetchone()["foreign_keys"]
+    finally:
+        insta485.model.POOL.release(connection)
+
+
+def test_get_requests_read_only(client):
+    """Verify GET requests can't write and POST requests can."""
+    assert client
+    with insta485.app.test_request_context("/", method="GET"):
+        connection = insta485.model.get_db()
+        assert connection.in_transaction
+        with pytest.raises(sqlite3.OperationalError):
+            connection.execute(
+                "UPDATE users SET fullname = 'Read Only' "
+                "WHERE username = 'awdeorio'"
+            )
+
+    with insta485.app.test_request_context("/", method="POST"):
+        connection = insta485.model.get_db()
+        connection.execute(
+            "UPDATE users SET fullname = 'Read Write' "
+            "WHERE username = 'awdeorio'"
+        )
+
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute(
+        "SELECT fullname FROM users WHERE username = 'awdeorio'"
+    )
+    assert cur.fetchone()[0] == "Read Write"
+    connection.close()
+
+
+def test_post_requests_lock(client):
+    """Verify POST requests hold the write lock from their first query."""
+    assert client
+    with insta485.app.test_request_context("/", method="POST"):
+        connection = insta485.model.get_db()
+        assert connection.in_transaction
+        other = sqlite3.connect("var/insta485.sqlite3", timeout=0)
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            other.execute("BEGIN IMMEDIATE")
+        other.close()
@@ -0,0 +1,122 @@
+"""
+Check denormalized counters in user_stats and post_stats.
+
+EECS 485 Project 2
+"""
+import sqlite3
+import subprocess
+import utils
+
+
+def assert_counters_match():
+    """Verify every counter equals a fresh count of the rows it counts."""
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    connection.execute("PRAGMA foreign_keys = ON")
+    cur = connection.execute(
+        "SELECT username, post_count, follower_count, following_count "
+        "FROM user_stats ORDER BY username"
+    )
+    user_stats = cur.fetchall()
+    cur = connection.execute(
+        "SELECT username, "
+        "(SELECT COUNT(*) FROM posts WHERE owner = username), "
+        "(SELECT COUNT(*) FROM following WHERE username2 = username), "
+        "(SELECT COUNT(*) FROM following WHERE username1 = username) "
+        "FROM users ORDER BY username"
+    )
+    assert user_stats == cur.fetchall()
+
+    cur = connection.execute(
+        "SELECT postid, like_count, comment_count "
+        "FROM post_stats ORDER BY postid"
+    )
+    post_stats = cur.fetchall()
+    cur = connection.execute(
+        "SELECT postid, "
+        "(SELECT COUNT(*) FROM likes WHERE likes.postid = posts.postid), "
+        "(SELECT COUNT(*) FROM comments WHERE comments.postid = posts.postid) "
+        "FROM posts ORDER BY postid"
+    )
+    assert post_stats == cur.fetchall()
+    connection.close()
+
+
+def test_counters_initial(client):
+    """Verify insta485db reset populates counters for the default data."""
+    assert client
+    assert_counters_match()
+
+
+def test_counters_writes(client):
+    """Verify counters stay exact through likes, comments, posts, follows."""
+    utils.login(client)
+
+    # Like, unlike and comment
+    response = client.post(
+        "/likes/", data={"operation": "like", "postid": "4"}
+    )
+    assert response.status_code == 302
+    response = client.post(
+        "/likes/", data={"operation": "unlike", "postid": "1"}
+    )
+    assert response.status_code == 302
+    response = client.post(
+        "/comments/",
+        data={"operation": "create", "postid": "4", "text": "Nice"},
+    )
+    assert response.status_code == 302
+    response = client.post(
+        "/comments/", data={"operation": "delete", "commentid": "1"}
+    )
+    assert response.status_code == 302
+
+    # Follow and unfollow
+    response = client.post(
+        "/following/", data={"operation": "follow", "username": "jag"}
+    )
+    assert response.status_code == 302
+    response = client.post(
+        "/following/", data={"operation": "unfollow", "username": "jflinn"}
+    )
+    assert response.status_code == 302
+
+    # Create a post and delete another
+    with (utils.TEST_DIR/"testdata/fox.jpg").open("rb") as pic:
+        response = client.post(
+            "/posts/", data={"file": pic, "operation": "create"}
+        )
+    assert response.status_code == 302
+    response = client.post(
+        "/posts/", data={"operation": "delete", "postid": "3"}
+    )
+    assert response.status_code == 302
+
+    # Dummy request to close the last request and commit
+    response = client.get("/")
+    assert response.status_code == 200
+    assert_counters_match()
+
+
+def test_counters_delete_account(client):
+    """Verify deleting an account fixes counters on surviving rows."""
+    utils.login(client)
+    response = client.post("/accounts/", data={"operation": "delete"})
+    assert response.status_code == 302
+    response = client.get("/accounts/login/")
+    assert response.status_code == 200
+    assert_counters_match()
+
+
+def test_insta485db_recount(client):
+    """Verify insta485db recount repairs drifted counters."""
+    assert client
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    connection.execute(
+        "UPDATE user_stats SET follower_count = 99, post_count = -1"
+    )
+    connection.execute("UPDATE post_stats SET like_count = 42")
+    connection.commit()
+    connection.close()
+
+    subprocess.run(["bin/insta485db", "recount"], check=True)
+    assert_counters_match()
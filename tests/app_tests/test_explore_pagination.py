@@ -0,0 +1,89 @@
+"""
+Check the candidate pool and pagination of /explore/.
+
+EECS 485 Project 2
+"""
+import subprocess
+import bs4
+import utils
+
+
+def page_users(response):
+    """Return the users listed on an explore page and its next page link."""
+    assert response.status_code == 200
+    soup = bs4.BeautifulSoup(response.data, "html.parser")
+    users = [x.get("value") for x in soup.find_all("input")
+             if x.get("name") == "username"]
+    next_links = [x.get("href") for x in soup.find_all("a")
+                  if x.text.strip() == "next page"]
+    return users, next_links
+
+
+def test_walk_pages(client):
+    """Verify next page links visit every candidate exactly once.
+
+    jag follows only michjc.  Candidates are ordered most followed first.
+    """
+    utils.login(client, "jag", "password")
+    seen = []
+    url = "/explore/?size=1"
+    while url:
+        users, next_links = page_users(client.get(url))
+        assert len(users) == 1
+        seen += users
+        url = next_links[0] if next_links else None
+    assert seen == ["awdeorio", "jflinn"]
+
+    users, next_links = page_users(client.get("/explore/"))
+    assert users == ["awdeorio", "jflinn"]
+    assert not next_links
+
+
+def test_bad_size(client):
+    """Verify a page size below 1 is rejected."""
+    utils.login(client, "jag", "password")
+    response = client.get("/explore/?size=0")
+    assert response.status_code == 400
+
+
+def test_new_accounts(client):
+    """Verify new accounts become candidates without waiting for a refresh."""
+    with open("tests/app_tests/testdata/fox.jpg", "rb") as fileobj:
+        response = client.post(
+            "/accounts/?target=/",
+            data={
+                "username": "fox",
+                "password": "password",
+                "fullname": "Fox",
+                "email": "fox@umich.edu",
+                "file": fileobj,
+                "operation": "create",
+            },
+        )
+    assert response.status_code == 302
+    utils.login(client, "jag", "password")
+    users, _ = page_users(client.get("/explore/"))
+    assert users == ["awdeorio", "jflinn", "fox"]
+
+    subprocess.run(["bin/insta485db", "explore"], check=True)
+    users, _ = page_users(client.get("/explore/"))
+    assert users == ["awdeorio", "jflinn", "fox"]
+
+
+def test_refresh_keeps_cursors(client):
+    """Verify a next page link stays valid across a refresh.
+
+    A link to a generation two refreshes old starts over.
+    """
+    utils.login(client, "jag", "password")
+    users, next_links = page_users(client.get("/explore/?size=1"))
+    assert users == ["awdeorio"]
+
+    subprocess.run(["bin/insta485db", "explore"], check=True)
+    users, later_links = page_users(client.get(next_links[0]))
+    assert users == ["jflinn"]
+    assert not later_links
+
+    subprocess.run(["bin/insta485db", "explore"], check=True)
+    users, _ = page_users(client.get(next_links[0]))
+    assert users == ["awdeorio"]
@@ -0,0 +1,139 @@
+"""
+Check the deferred file deletion queue.
+
+EECS 485 Project 2
+"""
+import sqlite3
+import pytest
+import insta485
+import utils
+
+
+def test_delete_account_queues_files(client):
+    """Verify account deletion unlinks its files after the commit."""
+    utils.login(client)
+    response = client.post("/accounts/", data={"operation": "delete"})
+    assert response.status_code == 302
+    response = client.get("/accounts/login/")
+    assert response.status_code == 200
+    insta485.deletions.WORKER.wait()
+
+    for filename in ["e1a7c5c32973862ee15173b0259e3efdb6a391af.jpg",
+                     "122a7d27ca1d7420a1072f695d9290fad4501a41.jpg",
+                     "9887e06812ef434d291e4936417d125cd594b38a.jpg"]:
+        folder = insta485.uploads.upload_folder(filename)
+        assert not (folder/filename).exists()
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute("SELECT COUNT(*) FROM file_deletions")
+    assert cur.fetchone()[0] == 0
+    connection.close()
+
+
+def test_drain_keeps_referenced_files(client):
+    """Verify a queued file that was uploaded again is not unlinked."""
+    assert client
+    referenced = "122a7d27ca1d7420a1072f695d9290fad4501a41.jpg"
+    orphan = "9887e06812ef434d291e4936417d125cd594b38a.jpg"
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    connection.row_factory = insta485.model.row_factory
+    connection.execute(
+        "DELETE FROM upload_refs WHERE filename = ?", (orphan, )
+    )
+    connection.executemany(
+        "INSERT INTO file_deletions(filename) VALUES (?)",
+        [(referenced, ), (orphan, )],
+    )
+    connection.commit()
+
+    after = insta485.deletions.drain(connection)
+    assert after is not None
+    assert insta485.deletions.drain(connection, after) is None
+    cur = connection.execute("SELECT COUNT(*) AS count FROM file_deletions")
+    assert cur.fetchone()["count"] == 0
+    connection.close()
+    root = insta485.app.config["UPLOAD_FOLDER"]
+    assert (root/referenced).exists()
+    assert not (root/orphan).exists()
+
+
+def test_failed_unlink_skipped(client, monkeypatch):
+    """Verify a file that can't be unlinked doesn't hold up newer ones."""
+    assert client
+    stuck = "122a7d27ca1d7420a1072f695d9290fad4501a41.jpg"
+    orphan = "9887e06812ef434d291e4936417d125cd594b38a.jpg"
+    delete_upload = insta485.uploads.delete_upload
+
+    def failing_delete(filename):
+        if filename == stuck:
+            raise PermissionError(filename)
+        delete_upload(filename)
+    monkeypatch.setattr(insta485.uploads, "delete_upload", failing_delete)
+
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    connection.row_factory = insta485.model.row_factory
+    connection.execute("DELETE FROM upload_refs")
+    connection.executemany(
+        "INSERT INTO file_deletions(filename) VALUES (?)",
+        [(stuck, ), (orphan, )],
+    )
+    connection.commit()
+
+    after = insta485.deletions.drain(connection, limit=1)
+    after = insta485.deletions.drain(connection, after, limit=1)
+    assert insta485.deletions.drain(connection, after, limit=1) is None
+    cur = connection.execute("SELECT filename FROM file_deletions")
+    assert [row["filename"] for row in cur] == [stuck]
+    connection.close()
+    root = insta485.app.config["UPLOAD_FOLDER"]
+    assert (root/stuck).exists()
+    assert not (root/orphan).exists()
+
+
+def test_recover_on_first_request(client, monkeypatch):
+    """Verify files queued by a previous process are drained at startup."""
+    orphan = "9887e06812ef434d291e4936417d125cd594b38a.jpg"
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    connection.execute(
+        "DELETE FROM upload_refs WHERE filename = ?", (orphan, )
+    )
+    connection.execute(
+        "INSERT INTO file_deletions(filename) VALUES (?)", (orphan, )
+    )
+    connection.commit()
+    connection.close()
+
+    # A worker that has never run, as in a freshly started process
+    worker = insta485.deletions.DeletionWorker()
+    monkeypatch.setattr(insta485.deletions, "WORKER", worker)
+    response = client.get("/accounts/login/")
+    assert response.status_code == 200
+    assert worker.wait(timeout=10)
+    root = insta485.app.config["UPLOAD_FOLDER"]
+    assert not (root/orphan).exists()
+
+
+def test_failed_delete_rolls_back(client, monkeypatch):
+    """Verify a request that fails partway keeps its rows and files."""
+    utils.login(client)
+    avatar = "e1a7c5c32973862ee15173b0259e3efdb6a391af.jpg"
+
+    def remove_user(_connection, _username):
+        raise RuntimeError("failed partway through")
+    monkeypatch.setattr(insta485.counters, "remove_user", remove_user)
+    with pytest.raises(RuntimeError):
+        client.post("/accounts/", data={"operation": "delete"})
+    insta485.deletions.WORKER.wait()
+
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute(
+        "SELECT COUNT(*) FROM users WHERE username == 'awdeorio'"
+    )
+    assert cur.fetchone()[0] == 1
+    cur = connection.execute(
+        "SELECT refcount FROM upload_refs WHERE filename == ?", (avatar, )
+    )
+    assert cur.fetchone()[0] == 1
+    cur = connection.execute("SELECT COUNT(*) FROM file_deletions")
+    assert cur.fetchone()[0] == 0
+    connection.close()
+    assert (insta485.uploads.upload_folder(avatar)/avatar).exists()
@@ -0,0 +1,227 @@
+"""
+Check the in-memory follow graph in insta485/followgraph.py.
+
+EECS 485 Project 2
+"""
+import sqlite3
+import subprocess
+import threading
+import pytest
+import insta485
+import utils
+
+
+def load_graph(client):
+    """Make sure the follow graph is loaded from the current database."""
+    response = client.get("/users/jag/")
+    assert response.status_code == 200
+    assert insta485.followgraph.GRAPH.wait(timeout=10)
+
+
+def trace_queries(monkeypatch):
+    """Record every statement run on pooled connections."""
+    statements = []
+    acquire = insta485.model.POOL.acquire
+
+    def traced(read_only=False):
+        connection = acquire(read_only)
+        connection.set_trace_callback(statements.append)
+        return connection
+    monkeypatch.setattr(insta485.model.POOL, "acquire", traced)
+    return statements
+
+
+def test_graph():
+    """Verify follows, mutuals and removal on a small graph."""
+    graph = insta485.followgraph.Graph()
+    for username1, username2 in [("a", "b"), ("a", "c"), ("b", "d"),
+                                 ("c", "d"), ("d", "a"), ("a", "b")]:
+        graph.follow(username1, username2)
+    assert graph.is_following("a", "b")
+    assert not graph.is_following("b", "a")
+    assert not graph.is_following("a", "nobody")
+    assert graph.mutuals("a", "d") == 2
+    assert graph.following_count("a") == 2
+    assert graph.follower_count("d") == 2
+    assert graph.follower_count("nobody") == 0
+
+    graph.unfollow("c", "d")
+    assert graph.mutuals("a", "d") == 1
+    graph.remove_user("b")
+    assert graph.mutuals("a", "d") == 0
+    assert graph.following_count("a") == 1
+    assert graph.follower_count("d") == 0
+    assert graph.is_following("d", "a")
+    graph.add_user("b")
+    assert not graph.is_following("a", "b")
+
+
+def test_follow_unfollow(client):
+    """Verify the profile page follows changes through the graph."""
+    utils.login(client)
+    load_graph(client)
+    response = client.get("/users/jag/")
+    assert b"1 follower<" in response.data
+    assert b"followed by 1 person you follow" in response.data
+
+    response = client.post(
+        "/following/", data={"operation": "follow", "username": "jag"}
+    )
+    assert response.status_code == 302
+    response = client.post(
+        "/following/", data={"operation": "follow", "username": "jag"}
+    )
+    assert response.status_code == 409
+    response = client.get("/users/jag/")
+    assert b"2 followers" in response.data
+    assert b"unfollow" in response.data
+
+    response = client.post(
+        "/following/", data={"operation": "unfollow", "username": "jag"}
+    )
+    assert response.status_code == 302
+    response = client.get("/users/jag/")
+    assert b"1 follower<" in response.data
+    assert b'value="follow"' in response.data
+
+
+def test_no_queries(client, monkeypatch):
+    """Verify a loaded graph answers without reading the following table."""
+    utils.login(client)
+    load_graph(client)
+    statements = trace_queries(monkeypatch)
+    response = client.get("/users/jag/")
+    assert b"followed by 1 person you follow" in response.data
+    assert b"1 follower<" in response.data
+    assert not [x for x in statements
+                if "following" in x or "user_stats" in x]
+
+
+def test_other_process(client, monkeypatch):
+    """Verify follows committed by another process show up at once."""
+    utils.login(client)
+    load_graph(client)
+
+    def load(_connection):
+        pytest.fail("follow graph reloaded")
+    monkeypatch.setattr(insta485.followgraph.Graph, "load", load)
+
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    connection.execute(
+        "INSERT INTO following(username1, username2) "
+        "VALUES ('awdeorio', 'jag')"
+    )
+    insta485.followgraph.record(connection, "follow", "awdeorio", "jag")
+    connection.commit()
+    connection.close()
+
+    response = client.get("/users/jag/")
+    assert b'value="unfollow"' in response.data
+
+
+def test_pruned_changes(client, monkeypatch):
+    """Verify a graph that missed pruned changes is reloaded."""
+    monkeypatch.setitem(insta485.app.config, "FOLLOW_CHANGES_KEPT", 1)
+    utils.login(client)
+    load_graph(client)
+
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    for username in ["jag", "michjc"]:
+        insta485.followgraph.record(connection, "add_user", username)
+    connection.execute(
+        "INSERT INTO following(username1, username2) "
+        "VALUES ('awdeorio', 'jag')"
+    )
+    insta485.followgraph.record(connection, "follow", "awdeorio", "jag")
+    connection.commit()
+    connection.close()
+
+    # Answered from the following table until the reload finishes
+    response = client.get("/users/jag/")
+    assert b'value="unfollow"' in response.data
+    assert insta485.followgraph.GRAPH.wait(timeout=10)
+    response = client.get("/users/jag/")
+    assert b'value="unfollow"' in response.data
+    assert insta485.followgraph.GRAPH.graph is not None
+
+
+def test_database_replaced(client):
+    """Verify the graph reloads when the database file is replaced."""
+    utils.login(client)
+    load_graph(client)
+    response = client.post(
+        "/following/", data={"operation": "follow", "username": "jag"}
+    )
+    assert response.status_code == 302
+    response = client.get("/users/jag/")
+    assert b'value="unfollow"' in response.data
+
+    subprocess.run(["bin/insta485db", "reset"], check=True)
+    response = client.get("/users/jag/")
+    assert b'value="follow"' in response.data
+    assert insta485.followgraph.GRAPH.wait(timeout=10)
+    response = client.get("/users/jag/")
+    assert b'value="follow"' in response.data
+
+
+def test_concurrent_first_loads(client, monkeypatch):
+    """Verify requests never wait on a load or take an extra connection."""
+    assert client
+    monkeypatch.setitem(insta485.app.config, "DATABASE_POOL_SIZE", 1)
+    monkeypatch.setitem(insta485.app.config, "DATABASE_POOL_TIMEOUT", 1)
+    loads = []
+    load = insta485.followgraph.Graph.load
+
+    def counted(connection):
+        loads.append(connection)
+        return load(connection)
+    monkeypatch.setattr(insta485.followgraph.Graph, "load", counted)
+
+    statuses = []
+
+    def visit():
+        with insta485.app.test_client() as other:
+            utils.login(other)
+            statuses.append(other.get("/users/jag/").status_code)
+    threads = [threading.Thread(target=visit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * 8
+    assert insta485.followgraph.GRAPH.wait(timeout=10)
+    assert len(loads) == 1
+
+
+def test_accounts(client):
+    """Verify new and deleted accounts reach the graph."""
+    utils.login(client)
+    load_graph(client)
+    with open("tests/app_tests/testdata/fox.jpg", "rb") as fileobj:
+        response = client.post(
+            "/accounts/?target=/",
+            data={
+                "username": "fox",
+                "password": "password",
+                "fullname": "Fox",
+                "email": "fox@umich.edu",
+                "file": fileobj,
+                "operation": "create",
+            },
+        )
+    assert response.status_code == 302
+    response = client.post(
+        "/following/", data={"operation": "follow", "username": "jag"}
+    )
+    assert response.status_code == 302
+    response = client.get("/users/fox/")
+    assert response.status_code == 200
+    graph = insta485.followgraph.GRAPH.graph
+    assert graph.is_following("fox", "jag")
+
+    response = client.post("/accounts/?target=/", data={"operation": "delete"})
+    assert response.status_code == 302
+    utils.login(client)
+    response = client.get("/users/jag/")
+    assert b"1 follower<" in response.data
+    assert not graph.is_following("fox", "jag")
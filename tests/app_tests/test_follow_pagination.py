@@ -0,0 +1,94 @@
+"""
+Check pagination of the followers and following pages.
+
+EECS 485 Project 2
+"""
+import sqlite3
+import bs4
+import utils
+
+
+def page_users(response):
+    """Return the users on a follow list page and its next page link.
+
+    Each user is a (username, follow button) pair.  The button is None for
+    the logged in user.
+    """
+    assert response.status_code == 200
+    soup = bs4.BeautifulSoup(response.data, "html.parser")
+    buttons = {
+        form.find("input", {"name": "username"}).get("value"):
+        form.find("input", {"name": "operation"}).get("value")
+        for form in soup.find_all("form")
+    }
+    users = [(x.text, buttons.get(x.text)) for x in soup.find_all("a")
+             if x.get("href") == f"/users/{x.text}/"
+             and not x.find_parent("div", class_="topright")]
+    next_links = [x.get("href") for x in soup.find_all("a")
+                  if x.text.strip() == "next page"]
+    return users, next_links
+
+
+def set_follow_times(times):
+    """Set the created time of (username1, username2) follows."""
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    connection.executemany(
+        "UPDATE following SET created = ? "
+        "WHERE username1 == ? and username2 == ?",
+        [(created, username1, username2)
+         for (username1, username2), created in times.items()],
+    )
+    connection.commit()
+    connection.close()
+
+
+def walk(client, url):
+    """Return the users on url and every page after it."""
+    seen = []
+    while url:
+        users, next_links = page_users(client.get(url))
+        assert len(users) == 1
+        seen += users
+        url = next_links[0] if next_links else None
+    return seen
+
+
+def test_followers_pages(client):
+    """Verify followers are paged most recent follow first.
+
+    jflinn and jag followed michjc at the same time, so the later username
+    comes first.  awdeorio follows jflinn but not jag.
+    """
+    set_follow_times({
+        ("awdeorio", "michjc"): "2020-01-01 00:00:00",
+        ("jflinn", "michjc"): "2021-01-01 00:00:00",
+        ("jag", "michjc"): "2021-01-01 00:00:00",
+    })
+    utils.login(client)
+    expected = [
+        ("jflinn", "unfollow"), ("jag", "follow"), ("awdeorio", None),
+    ]
+    assert walk(client, "/users/michjc/followers/?size=1") == expected
+
+    users, next_links = page_users(client.get("/users/michjc/followers/"))
+    assert users == expected
+    assert not next_links
+
+
+def test_following_pages(client):
+    """Verify followees are paged most recent follow first."""
+    set_follow_times({
+        ("michjc", "awdeorio"): "2022-01-01 00:00:00",
+        ("michjc", "jag"): "2020-01-01 00:00:00",
+    })
+    utils.login(client, "jflinn", "password")
+    assert walk(client, "/users/michjc/following/?size=1") == [
+        ("awdeorio", "unfollow"), ("jag", "follow"),
+    ]
+
+
+def test_bad_size(client):
+    """Verify a page size below 1 is rejected."""
+    utils.login(client)
+    response = client.get("/users/michjc/followers/?size=0")
+    assert response.status_code == 400
@@ -6,6 +6,7 @@ EECS 485 Project 2
 Andrew DeOrio <awdeorio@umich.edu>
 """
 import re
+from urllib.parse import urlparse
 
 import bs4
 
@@ -32,7 +33,7 @@ def test_awdeorio_followers(client, noauth):
     text = soup.get_text()
     text = re.sub(r"\s+", " ", text)
     links = [x.get("href") for x in soup.find_all("a")]
-    srcs = [x.get("src") for x in soup.find_all('img')]
+    srcs = [urlparse(x.get("src")).path for x in soup.find_all('img')]
     buttons = [submit.get("name") for button in soup.find_all('form')
                for submit in button.find_all("input") if submit]
 
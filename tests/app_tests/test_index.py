@@ -6,6 +6,7 @@ EECS 485 Project 2
 Andrew DeOrio <awdeorio@umich.edu>
 """
 import re
+from urllib.parse import urlparse
 import bs4
 
 
@@ -33,7 +34,7 @@ def test_images(client, noauth):
     response = client.get("/")
     assert response.status_code == 200
     soup = bs4.BeautifulSoup(response.data, "html.parser")
-    srcs = [x.get("src") for x in soup.find_all('img')]
+    srcs = [urlparse(x.get("src")).path for x in soup.find_all('img')]
 
     # Verify images present of Flinn, DeOrio, postid 1, postid 2, postid 3
     assert "/uploads/505083b8b56c97429a728b68f31b0b2a089e5113.jpg" in srcs
@@ -0,0 +1,54 @@
+"""
+Check keyset pagination of the index page at / URL.
+
+EECS 485 Project 2
+"""
+import bs4
+import utils
+
+
+def page_postids(response):
+    """Return the postids linked from a feed page and its next page link."""
+    assert response.status_code == 200
+    soup = bs4.BeautifulSoup(response.data, "html.parser")
+    links = [x.get("href") for x in soup.find_all("a", href=True)]
+    postids = [link for link in links if link.startswith("/posts/")]
+    next_links = [x.get("href") for x in soup.find_all("a")
+                  if x.text.strip() == "next page"]
+    return postids, next_links
+
+
+def test_default_page(client):
+    """Verify a small feed fits on one page without a next page link."""
+    utils.login(client)
+    postids, next_links = page_postids(client.get("/"))
+    assert postids == ["/posts/3/", "/posts/2/", "/posts/1/"]
+    assert not next_links
+
+
+def test_walk_pages(client):
+    """Verify following next page links visits every post exactly once."""
+    utils.login(client)
+    seen = []
+    url = "/?size=1"
+    while url:
+        postids, next_links = page_postids(client.get(url))
+        assert len(postids) == 1
+        seen += postids
+        url = next_links[0] if next_links else None
+    assert seen == ["/posts/3/", "/posts/2/", "/posts/1/"]
+
+
+def test_before_cursor(client):
+    """Verify ?before= only returns posts older than the cursor."""
+    utils.login(client)
+    postids, next_links = page_postids(client.get("/?before=3&size=10"))
+    assert postids == ["/posts/2/", "/posts/1/"]
+    assert not next_links
+
+
+def test_bad_size(client):
+    """Verify a non-positive page size is rejected."""
+    utils.login(client)
+    response = client.get("/?size=0")
+    assert response.status_code == 400
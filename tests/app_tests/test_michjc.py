@@ -53,7 +53,7 @@ def test_index(client):
     response = client.get("/")
     assert response.status_code == 200
     soup = bs4.BeautifulSoup(response.data, "html.parser")
-    srcs = [x.get("src") for x in soup.find_all('img')]
+    srcs = [urlparse(x.get("src")).path for x in soup.find_all('img')]
 
     # Verify images present of Jag, DeOrio, postid 4, postid 3, postid 1
     assert "/uploads/73ab33bd357c3fd42292487b825880958c595655.jpg" in srcs
@@ -82,7 +82,7 @@ def test_postid_4(client):
     assert response.status_code == 200
     soup = bs4.BeautifulSoup(response.data, "html.parser")
     links = [x.get("href") for x in soup.find_all("a")]
-    srcs = [x.get("src") for x in soup.find_all('img')]
+    srcs = [urlparse(x.get("src")).path for x in soup.find_all('img')]
     text = soup.get_text()
     text = re.sub(r"\s+", " ", text)
     buttons = [submit.get("name") for button in soup.find_all('form')
@@ -205,7 +205,7 @@ def test_explore(client):
     response = client.get("/explore/")
     assert response.status_code == 200
     soup = bs4.BeautifulSoup(response.data, "html.parser")
-    srcs = [x.get("src") for x in soup.find_all('img')]
+    srcs = [urlparse(x.get("src")).path for x in soup.find_all('img')]
     links = [x.get("href") for x in soup.find_all("a")]
     buttons = [submit.get("name") for button in soup.find_all('form')
                for submit in button.find_all("input") if submit]
@@ -255,7 +255,7 @@ def test_followers(client):
     text = soup.get_text()
     text = re.sub(r"\s+", " ", text)
     links = [x.get("href") for x in soup.find_all("a")]
-    srcs = [x.get("src") for x in soup.find_all('img')]
+    srcs = [urlparse(x.get("src")).path for x in soup.find_all('img')]
     buttons = [submit.get("name") for button in soup.find_all('form')
                for submit in button.find_all("input") if submit]
 
@@ -393,7 +393,7 @@ def test_following(client):
     text = soup.get_text()
     text = re.sub(r"\s+", " ", text)
     links = [x.get("href") for x in soup.find_all("a")]
-    srcs = [x.get("src") for x in soup.find_all('img')]
+    srcs = [urlparse(x.get("src")).path for x in soup.find_all('img')]
 
     # Verify text
     assert text.lower().count("following") == 3
@@ -0,0 +1,69 @@
+"""
+Check the orphaned upload collector, insta485db gc.
+
+EECS 485 Project 2
+"""
+import os
+import subprocess
+import time
+import insta485
+
+
+def make_file(path, age):
+    """Create a small file at path last modified age seconds ago."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"orphan")
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_insta485db_gc(client):
+    """Verify old orphans are reported, then removed, and nothing else."""
+    assert client
+    root = insta485.app.config["UPLOAD_FOLDER"]
+    derivatives = insta485.app.config["UPLOAD_DERIVATIVE_FOLDER"]
+    referenced = [x for x in root.iterdir() if x.is_file()]
+    assert referenced
+    old_flat = root/"0000orphan.jpg"
+    old_sharded = root/insta485.uploads.shard("abcdef0123.jpg")
+    old_derivative = derivatives/"160"/insta485.uploads.shard("abcdef.jpg")
+    recent = root/"ffffrecent.jpg"
+    make_file(old_flat, 7200)
+    make_file(old_sharded, 7200)
+    make_file(old_derivative, 7200)
+    make_file(recent, 0)
+
+    # Dry run reports without removing
+    output = subprocess.run(
+        ["bin/insta485db", "gc", "--dry-run", "--rate", "0"],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    for path in [old_flat, old_sharded, old_derivative]:
+        assert f"orphan {path}" in output
+        assert path.exists()
+    assert str(recent) not in output
+
+    subprocess.run(["bin/insta485db", "gc", "--rate", "0"], check=True)
+    assert not old_flat.exists()
+    assert not old_sharded.exists()
+    assert not old_derivative.exists()
+    assert recent.exists()
+    assert all(path.exists() for path in referenced)
+
+
+def test_walk_sorted(client):
+    """Verify flat and sharded files are walked together in name order."""
+    assert client
+    root = insta485.app.config["UPLOAD_FOLDER"]
+    names = ["ffff.jpg", "0000.jpg", "abcd.jpg", "abce.jpg"]
+    make_file(root/"ffff.jpg", 0)
+    make_file(root/"0000.jpg", 0)
+    make_file(root/insta485.uploads.shard("abcd.jpg"), 0)
+    make_file(root/insta485.uploads.shard("abce.jpg"), 0)
+
+    walked = [name for name, _ in insta485.orphans.walk(root)]
+    assert walked == sorted(walked)
+    assert set(names) <= set(walked)
+    for name, path in insta485.orphans.walk(root):
+        assert path.name == name
+        assert path.exists()
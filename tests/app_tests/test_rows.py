@@ -0,0 +1,82 @@
+"""
+Check the Row objects insta485.model.row_factory returns.
+
+EECS 485 Project 2
+"""
+import sqlite3
+import threading
+import insta485
+
+
+def connect():
+    """Return an in-memory connection with the Row factory."""
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    connection.row_factory = insta485.model.row_factory
+    return connection
+
+
+def test_mapping():
+    """Verify a Row reads like a dictionary keyed on column name."""
+    connection = connect()
+    row = connection.execute("SELECT 1 AS one, 'b' AS two").fetchone()
+    assert row["one"] == 1
+    assert row["two"] == "b"
+    assert "one" in row
+    assert "three" not in row
+    assert row.get("three", 3) == 3
+    assert list(row) == ["one", "two"]
+    assert len(row) == 2
+    assert row.items() == [("one", 1), ("two", "b")]
+    assert dict(row) == {"one": 1, "two": "b"}
+    assert row == {"one": 1, "two": "b"}
+    assert row != {"one": 1}
+    assert repr(row) == "Row({'one': 1, 'two': 'b'})"
+
+
+def test_extra():
+    """Verify assigned fields override or add to the columns of one row."""
+    connection = connect()
+    rows = connection.execute(
+        "SELECT 1 AS one UNION ALL SELECT 2"
+    ).fetchall()
+    rows[0]["one"] = "overridden"
+    rows[0]["extra"] = True
+    assert rows[0]["one"] == "overridden"
+    assert rows[0].keys() == ["one", "extra"]
+    assert dict(rows[0]) == {"one": "overridden", "extra": True}
+    assert rows[1] == {"one": 2}
+
+
+def test_interleaved_cursors():
+    """Verify cursors read in turns each keep reusing one column mapping."""
+    connection = connect()
+    first = connection.execute(
+        "SELECT value AS a FROM json_each('[1, 2, 3]')"
+    )
+    second = connection.execute(
+        "SELECT value AS b, value * 2 AS c FROM json_each('[4, 5, 6]')"
+    )
+    rows = [row for pair in zip(first, second) for row in pair]
+    assert [dict(row) for row in rows[:2]] == [{"a": 1}, {"b": 4, "c": 8}]
+    assert len({id(row.columns) for row in rows[0::2]}) == 1
+    assert len({id(row.columns) for row in rows[1::2]}) == 1
+
+
+def test_threads():
+    """Verify threads querying at once each get the right columns."""
+    errors = []
+
+    def query(column):
+        connection = connect()
+        for _ in range(200):
+            cur = connection.execute(f"SELECT 1 AS {column}, 2 AS other")
+            if list(cur.fetchone()) != [column, "other"]:
+                errors.append(column)
+        connection.close()
+    threads = [threading.Thread(target=query, args=(f"col{i}", ))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
@@ -0,0 +1,78 @@
+"""
+Check friends-of-friends suggestions from insta485db suggest.
+
+EECS 485 Project 2
+"""
+import random
+import sqlite3
+import subprocess
+import bs4
+import pytest
+import insta485
+
+numpy = pytest.importorskip("numpy")
+scipy_sparse = pytest.importorskip("scipy.sparse")
+
+
+def test_score_block():
+    """Verify block scores match a brute force count of mutual follows."""
+    rng = random.Random(485)
+    size = 60
+    edges = {(rng.randrange(size), rng.randrange(size)) for _ in range(600)}
+    edges = {(u, c) for u, c in edges if u != c}
+    following = {u: {c for v, c in edges if v == u} for u in range(size)}
+    rows, cols = zip(*edges)
+    adjacency = scipy_sparse.csr_matrix(
+        (numpy.ones(len(edges), dtype=numpy.int32), (rows, cols)),
+        shape=(size, size),
+    )
+
+    expected = []
+    for user in range(10, 30):
+        scores = {}
+        for followee in following[user]:
+            for candidate in following[followee]:
+                if candidate != user and candidate not in following[user]:
+                    scores[candidate] = scores.get(candidate, 0) + 1
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        expected += [(user, c, score) for c, score in ranked[:5]]
+
+    users, candidates, scores = insta485.suggestions.score_block(
+        adjacency, 10, 30, 5
+    )
+    assert list(zip(users.tolist(), candidates.tolist(),
+                    scores.tolist())) == expected
+
+
+def test_suggest(client):
+    """Verify insta485db suggest fills the table and /explore/ shows it."""
+    subprocess.run(["bin/insta485db", "suggest"], check=True)
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute(
+        "SELECT username, candidate, score FROM suggestions "
+        "ORDER BY username"
+    )
+    assert cur.fetchall() == [
+        ("awdeorio", "jag", 1),
+        ("jag", "awdeorio", 1),
+        ("jflinn", "jag", 1),
+        ("michjc", "jflinn", 1),
+    ]
+    connection.close()
+
+    response = client.post(
+        "/accounts/",
+        data={
+            "username": "awdeorio",
+            "password": "chickens",
+            "operation": "login"
+        },
+    )
+    assert response.status_code == 302
+    response = client.get("/explore/")
+    assert response.status_code == 200
+    assert b"followed by 1 person you follow" in response.data
+    soup = bs4.BeautifulSoup(response.data, "html.parser")
+    users = [x.get("value") for x in soup.find_all("input")
+             if x.get("name") == "username"]
+    assert users == ["jag"]
@@ -0,0 +1,225 @@
+"""
+Check the materialized timeline table behind the home feed.
+
+EECS 485 Project 2
+"""
+import sqlite3
+import subprocess
+import bs4
+import utils
+import insta485
+
+
+def check():
+    """Return the exit status and output of insta485db check."""
+    completed = subprocess.run(
+        ["bin/insta485db", "check"],
+        check=False, capture_output=True, text=True,
+    )
+    return completed.returncode, completed.stdout
+
+
+def timeline(username):
+    """Return the postids on username's timeline, newest first."""
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute(
+        "SELECT postid FROM timeline WHERE username = ? "
+        "ORDER BY postid DESC",
+        (username, )
+    )
+    postids = [row[0] for row in cur.fetchall()]
+    connection.close()
+    return postids
+
+
+def fanout(username):
+    """Return user_stats.fanout for username."""
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute(
+        "SELECT fanout FROM user_stats WHERE username = ?", (username, )
+    )
+    value = cur.fetchone()[0]
+    connection.close()
+    return value
+
+
+def test_timeline_maintained(client):
+    """Verify writes keep the timeline consistent."""
+    assert check()[0] == 0
+    utils.login(client)
+    assert timeline("awdeorio") == [3, 2, 1]
+
+    # Follow adds posts, unfollow removes them
+    response = client.post(
+        "/following/", data={"operation": "follow", "username": "jag"}
+    )
+    assert response.status_code == 302
+    assert timeline("awdeorio") == [4, 3, 2, 1]
+    response = client.post(
+        "/following/", data={"operation": "unfollow", "username": "jflinn"}
+    )
+    assert response.status_code == 302
+    assert timeline("awdeorio") == [4, 3, 1]
+
+    # A new post fans out to its owner and followers
+    with (utils.TEST_DIR/"testdata/fox.jpg").open("rb") as pic:
+        response = client.post(
+            "/posts/", data={"file": pic, "operation": "create"}
+        )
+    assert response.status_code == 302
+    response = client.get("/")
+    assert response.status_code == 200
+    assert timeline("awdeorio") == [5, 4, 3, 1]
+    assert 5 in timeline("jflinn")
+    assert 5 not in timeline("jag")
+
+    # Deleting it removes it everywhere
+    response = client.post(
+        "/posts/", data={"operation": "delete", "postid": "5"}
+    )
+    assert response.status_code == 302
+    response = client.get("/")
+    assert response.status_code == 200
+    assert 5 not in timeline("jflinn")
+
+    response = client.post("/accounts/", data={"operation": "delete"})
+    assert response.status_code == 302
+    response = client.get("/accounts/login/")
+    assert response.status_code == 200
+    assert check() == (0, "Timeline is consistent\n")
+
+
+def test_insta485db_check_backfill(client):
+    """Verify insta485db check reports drift and backfill repairs it."""
+    assert client
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    connection.execute(
+        "DELETE FROM timeline WHERE username = 'awdeorio' and postid = 2"
+    )
+    connection.execute(
+        "INSERT INTO timeline(username, postid) VALUES ('jag', 1)"
+    )
+    connection.commit()
+    connection.close()
+
+    status, output = check()
+    assert status == 1
+    assert "missing|awdeorio|2" in output
+    assert "extra|jag|1" in output
+
+    subprocess.run(["bin/insta485db", "backfill"], check=True)
+    assert check()[0] == 0
+    assert timeline("awdeorio") == [3, 2, 1]
+
+
+def fan_out_on_read(username):
+    """Return username's feed postids from posts and following directly."""
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute(
+        "SELECT postid FROM posts "
+        "WHERE owner IN "
+        "(SELECT username2 FROM following WHERE username1 = ?) "
+        "OR owner = ? "
+        "ORDER BY postid DESC",
+        (username, username, )
+    )
+    postids = [row[0] for row in cur.fetchall()]
+    connection.close()
+    return postids
+
+
+def feed(client, size):
+    """Return the postids on every page of the logged in user's feed."""
+    postids = []
+    url = f"/?size={size}"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        soup = bs4.BeautifulSoup(response.data, "html.parser")
+        postids += [
+            int(x["href"].split("/")[2])
+            for x in soup.find_all("a", href=True)
+            if x["href"].startswith("/posts/")
+        ]
+        url = next((
+            x["href"] for x in soup.find_all("a", href=True)
+            if x.text.strip() == "next page"
+        ), None)
+    return postids
+
+
+def test_hybrid_fanout(client, monkeypatch):
+    """Verify accounts over the threshold are merged in at read time."""
+    monkeypatch.setitem(insta485.app.config, "FEED_FANOUT_THRESHOLD", 2)
+
+    # awdeorio gets a third follower and stops fanning out
+    utils.login(client, "jag", "password")
+    response = client.post(
+        "/following/", data={"operation": "follow", "username": "awdeorio"}
+    )
+    assert response.status_code == 302
+    assert fanout("awdeorio") == 0
+    assert fanout("michjc") == 1
+
+    # New posts by awdeorio aren't copied to followers' timelines
+    utils.login(client)
+    for _ in range(3):
+        with (utils.TEST_DIR/"testdata/fox.jpg").open("rb") as pic:
+            response = client.post(
+                "/posts/", data={"file": pic, "operation": "create"}
+            )
+        assert response.status_code == 302
+    response = client.get("/")
+    assert response.status_code == 200
+    assert 7 in timeline("awdeorio")
+    assert 7 not in timeline("jflinn")
+    assert check()[0] == 0
+
+    # Feeds are identical to fan-out on read, page by page
+    for username, password in [("jflinn", "password"), ("jag", "password"),
+                               ("michjc", "password")]:
+        utils.login(client, username, password)
+        for size in [1, 2, 10]:
+            assert feed(client, size) == fan_out_on_read(username)
+
+    # Dropping to half the threshold switches back and copies old posts
+    for username in ["jflinn", "michjc"]:
+        utils.login(client, username, "password")
+        response = client.post(
+            "/following/",
+            data={"operation": "unfollow", "username": "awdeorio"},
+        )
+        assert response.status_code == 302
+    assert fanout("awdeorio") == 1
+    assert 7 in timeline("jag")
+    assert check()[0] == 0
+
+
+def test_pull_accounts_indexed(client, monkeypatch):
+    """Verify the feed starts from accounts that don't fan out.
+
+    Walking logname's followees would cost a lookup per followee on every
+    page.
+    """
+    statements = []
+    acquire = insta485.model.POOL.acquire
+
+    def traced(read_only=False):
+        connection = acquire(read_only)
+        connection.set_trace_callback(statements.append)
+        return connection
+    monkeypatch.setattr(insta485.model.POOL, "acquire", traced)
+    utils.login(client)
+    response = client.get("/?size=1")
+    assert response.status_code == 200
+
+    query = next(x for x in statements if "fanout == 0" in x)
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    plan = [row[3] for row in connection.execute(
+        f"EXPLAIN QUERY PLAN {query}"
+    )]
+    connection.close()
+    assert plan[0].startswith(
+        "SEARCH user_stats USING COVERING INDEX user_stats_pull_idx"
+    )
+    assert "SEARCH following" in plan[-1]
@@ -0,0 +1,85 @@
+"""
+Check resized upload derivatives and srcset.
+
+EECS 485 Project 2
+"""
+import io
+from urllib.parse import urlparse, parse_qs
+import bs4
+import PIL.Image
+import insta485
+import utils
+
+
+def test_srcset(client):
+    """Verify feed images list derivatives up to the original's width."""
+    utils.login(client)
+    response = client.get("/")
+    assert response.status_code == 200
+    soup = bs4.BeautifulSoup(response.data, "html.parser")
+    images = soup.find_all("img")
+    assert images
+    widths = insta485.app.config["UPLOAD_DERIVATIVE_WIDTHS"]
+    for image in images:
+        assert image.get("sizes")
+        filename = urlparse(image["src"]).path.split("/")[-1]
+        with PIL.Image.open(insta485.app.config["UPLOAD_FOLDER"] /
+                            filename) as original:
+            original_width = original.width
+        candidates = [x.split() for x in image["srcset"].split(", ")]
+        assert [x[1] for x in candidates] == [
+            *(f"{w}w" for w in widths if w < original_width),
+            f"{original_width}w",
+        ]
+        for url, descriptor in candidates[:-1]:
+            query = parse_qs(urlparse(url).query)
+            assert query["width"] == [descriptor[:-1]]
+            assert "signature" in query
+            assert urlparse(url).path == urlparse(image["src"]).path
+        query = parse_qs(urlparse(candidates[-1][0]).query)
+        assert "width" not in query
+        assert "signature" in query
+
+    # The 150 pixel wide avatar has no smaller derivative
+    with insta485.app.test_request_context("/"):
+        srcset = insta485.uploads.upload_srcset(
+            "e1a7c5c32973862ee15173b0259e3efdb6a391af.jpg"
+        )
+    assert srcset.endswith(" 150w")
+    assert "," not in srcset
+
+
+def test_derivative(client):
+    """Verify a derivative is resized, cached on disk and never upscaled."""
+    utils.login(client)
+    filename = "122a7d27ca1d7420a1072f695d9290fad4501a41.jpg"
+    cached = (insta485.app.config["UPLOAD_DERIVATIVE_FOLDER"] /
+              "160" / insta485.uploads.shard(filename))
+    cached.unlink(missing_ok=True)
+
+    response = client.get(f"/uploads/{filename}?width=160")
+    assert response.status_code == 200
+    with PIL.Image.open(io.BytesIO(response.data)) as image:
+        assert image.width == 160
+        assert image.format == "JPEG"
+    assert cached.exists()
+    original = insta485.app.config["UPLOAD_FOLDER"] / filename
+    assert cached.stat().st_size < original.stat().st_size
+
+    # Wider than the original serves the original size
+    response = client.get(f"/uploads/{filename}?width=1280")
+    assert response.status_code == 200
+    with PIL.Image.open(io.BytesIO(response.data)) as image, \
+            PIL.Image.open(original) as full:
+        assert image.size == full.size
+
+    # Only configured widths are served
+    response = client.get(f"/uploads/{filename}?width=161")
+    assert response.status_code == 404
+
+
+def test_derivative_requires_login(client):
+    """Verify unsigned derivative URLs still require a login."""
+    filename = "122a7d27ca1d7420a1072f695d9290fad4501a41.jpg"
+    response = client.get(f"/uploads/{filename}?width=160")
+    assert response.status_code == 403
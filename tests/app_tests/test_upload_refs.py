@@ -0,0 +1,119 @@
+"""
+Check content-addressed uploads and their reference counts.
+
+EECS 485 Project 2
+"""
+import hashlib
+import sqlite3
+import utils
+import insta485
+
+
+def create_post(client, path):
+    """Upload path as a new post and return its postid."""
+    with path.open("rb") as pic:
+        response = client.post(
+            "/posts/", data={"file": pic, "operation": "create"}
+        )
+    assert response.status_code == 302
+    response = client.get("/")
+    assert response.status_code == 200
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute("SELECT MAX(postid) FROM posts")
+    postid = cur.fetchone()[0]
+    connection.close()
+    return postid
+
+
+def refcount(filename):
+    """Return the reference count of filename, or None without a row."""
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute(
+        "SELECT refcount FROM upload_refs WHERE filename = ?", (filename, )
+    )
+    row = cur.fetchone()
+    connection.close()
+    return row[0] if row else None
+
+
+def test_duplicate_uploads(client):
+    """Verify one image posted twice is stored once and deleted once."""
+    utils.login(client)
+    path = utils.TEST_DIR/"testdata/fox.jpg"
+    filename = hashlib.sha256(path.read_bytes()).hexdigest() + ".jpg"
+    upload = (insta485.app.config["UPLOAD_FOLDER"] /
+              insta485.uploads.shard(filename))
+
+    postid1 = create_post(client, path)
+    postid2 = create_post(client, path)
+    assert upload.exists()
+    assert refcount(filename) == 2
+
+    # The hash doubles as a strong ETag
+    response = client.get(f"/uploads/{filename}")
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{filename[:-4]}"'
+
+    # Deleting one post keeps the file for the other
+    response = client.post(
+        "/posts/", data={"operation": "delete", "postid": postid1}
+    )
+    assert response.status_code == 302
+    response = client.get(f"/posts/{postid2}/")
+    assert response.status_code == 200
+    assert upload.exists()
+    assert refcount(filename) == 1
+
+    # Deleting the last reference removes it
+    response = client.post(
+        "/posts/", data={"operation": "delete", "postid": postid2}
+    )
+    assert response.status_code == 302
+    response = client.get("/")
+    assert response.status_code == 200
+    assert refcount(filename) is None
+    insta485.deletions.WORKER.wait()
+    assert not upload.exists()
+
+
+def test_double_delete(client):
+    """Verify deleting a post twice drops its upload's reference once."""
+    utils.login(client)
+    path = utils.TEST_DIR/"testdata/fox.jpg"
+    filename = hashlib.sha256(path.read_bytes()).hexdigest() + ".jpg"
+    postid = create_post(client, path)
+    create_post(client, path)
+    assert refcount(filename) == 2
+
+    for status_code in [302, 403]:
+        response = client.post(
+            "/posts/", data={"operation": "delete", "postid": postid}
+        )
+        assert response.status_code == status_code
+    assert refcount(filename) == 1
+
+
+def test_refcounts_match(client):
+    """Verify every referenced upload is counted once per reference."""
+    utils.login(client)
+    create_post(client, utils.TEST_DIR/"testdata/fox.jpg")
+    response = client.post("/accounts/", data={"operation": "delete"})
+    assert response.status_code == 302
+    response = client.get("/accounts/login/")
+    assert response.status_code == 200
+
+    connection = sqlite3.connect("var/insta485.sqlite3")
+    cur = connection.execute(
+        "SELECT filename, COUNT(*) FROM "
+        "(SELECT filename FROM users UNION ALL SELECT filename FROM posts) "
+        "GROUP BY filename ORDER BY filename"
+    )
+    expected = cur.fetchall()
+    cur = connection.execute(
+        "SELECT filename, refcount FROM upload_refs ORDER BY filename"
+    )
+    assert cur.fetchall() == expected
+    connection.close()
+    for filename, _ in expected:
+        folder = insta485.uploads.upload_folder(filename)
+        assert (folder/filename).exists()
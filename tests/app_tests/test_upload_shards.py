@@ -0,0 +1,49 @@
+"""
+Check the hash-prefix sharded upload layout.
+
+EECS 485 Project 2
+"""
+import subprocess
+import insta485
+
+
+def test_shard_paths(client):
+    """Verify hex filenames are sharded and others are not."""
+    assert client
+    assert str(insta485.uploads.shard("abcdef0123.jpg")) == \
+        "ab/cd/abcdef0123.jpg"
+    assert str(insta485.uploads.shard("fox.jpg")) == "fox.jpg"
+    assert str(insta485.uploads.shard("abcd")) == "abcd"
+
+
+def test_insta485db_shard(client):
+    """Verify insta485db shard moves flat uploads and they still serve."""
+    response = client.post(
+        "/accounts/",
+        data={
+            "username": "awdeorio",
+            "password": "chickens",
+            "operation": "login"
+        },
+    )
+    assert response.status_code == 302
+    root = insta485.app.config["UPLOAD_FOLDER"]
+    filename = "122a7d27ca1d7420a1072f695d9290fad4501a41.jpg"
+    assert (root/filename).exists()
+
+    # Flat files are served before the move
+    response = client.get(f"/uploads/{filename}")
+    assert response.status_code == 200
+    original = response.data
+
+    subprocess.run(["bin/insta485db", "shard"], check=True)
+    assert not (root/filename).exists()
+    assert (root/"12"/"2a"/filename).exists()
+    assert not [x for x in root.iterdir() if x.is_file()]
+
+    # And from their shard afterwards
+    response = client.get(f"/uploads/{filename}")
+    assert response.status_code == 200
+    assert response.data == original
+    response = client.get(f"/uploads/{filename}?width=160")
+    assert response.status_code == 200
@@ -0,0 +1,79 @@
+"""
+Check streamed, validated file uploads.
+
+EECS 485 Project 2
+"""
+import io
+import flask
+import pytest
+import werkzeug.exceptions
+import utils
+import insta485
+
+
+def temp_files():
+    """Return leftover temporary upload files."""
+    return list(insta485.app.config["UPLOAD_FOLDER"].glob(".*.tmp"))
+
+
+def test_upload_streamed_to_disk(client):
+    """Verify uploads are hashed while the request body is parsed."""
+    assert client
+    data = (utils.TEST_DIR/"testdata/fox.jpg").read_bytes()
+    with insta485.app.test_request_context(
+        "/posts/",
+        method="POST",
+        data={"file": (io.BytesIO(data), "fox.jpg")},
+    ):
+        upload = flask.request.files["file"].stream
+        assert isinstance(upload, insta485.uploads.UploadFile)
+        assert upload.size == len(data)
+        assert upload.image_type() == "jpeg"
+        assert upload.path.parent == insta485.app.config["UPLOAD_FOLDER"]
+    assert not temp_files()
+
+
+def test_upload_validation(client):
+    """Verify bad extensions and contents are rejected with 400."""
+    utils.login(client)
+    jpeg = (utils.TEST_DIR/"testdata/fox.jpg").read_bytes()
+    for content, name in [
+        (jpeg, "fox.txt"),
+        (jpeg, "fox"),
+        (jpeg, "fox.png"),
+        (b"<html>not an image</html>", "fox.jpg"),
+    ]:
+        response = client.post(
+            "/posts/",
+            data={"file": (io.BytesIO(content), name), "operation": "create"},
+        )
+        assert response.status_code == 400, name
+    assert not temp_files()
+
+    # Extensions are case insensitive
+    response = client.post(
+        "/posts/",
+        data={"file": (io.BytesIO(jpeg), "FOX.JPG"), "operation": "create"},
+    )
+    assert response.status_code == 302
+
+
+def test_upload_too_large(client, monkeypatch):
+    """Verify an upload over MAX_CONTENT_LENGTH is rejected."""
+    utils.login(client)
+    limit = insta485.app.config["MAX_CONTENT_LENGTH"]
+    content = b"\xff\xd8\xff" + bytes(limit)
+    response = client.post(
+        "/posts/",
+        data={"file": (io.BytesIO(content), "big.jpg"), "operation": "create"},
+    )
+    assert response.status_code == 413
+    assert not temp_files()
+
+    # Checked on the bytes written too, for bodies without a Content-Length
+    monkeypatch.setitem(insta485.app.config, "MAX_CONTENT_LENGTH", 1024)
+    upload = insta485.uploads.UploadFile()
+    upload.write(bytes(1024))
+    with pytest.raises(werkzeug.exceptions.RequestEntityTooLarge):
+        upload.write(b"x")
+    assert not temp_files()
@@ -0,0 +1,75 @@
+"""
+Check conditional, ranged and offloaded /uploads/ responses.
+
+EECS 485 Project 2
+"""
+import insta485
+import utils
+
+FILENAME = "122a7d27ca1d7420a1072f695d9290fad4501a41.jpg"
+
+
+def test_range_and_conditional(client):
+    """Verify Range gets 206 and revalidation gets 304."""
+    utils.login(client)
+    full = client.get(f"/uploads/{FILENAME}")
+    assert full.status_code == 200
+    assert full.headers["Accept-Ranges"] == "bytes"
+
+    response = client.get(
+        f"/uploads/{FILENAME}", headers={"Range": "bytes=0-99"}
+    )
+    assert response.status_code == 206
+    assert response.data == full.data[:100]
+    assert response.headers["Content-Range"] == \
+        f"bytes 0-99/{len(full.data)}"
+
+    response = client.get(
+        f"/uploads/{FILENAME}",
+        headers={"If-None-Match": full.headers["ETag"]},
+    )
+    assert response.status_code == 304
+    response = client.get(
+        f"/uploads/{FILENAME}",
+        headers={"If-Modified-Since": full.headers["Last-Modified"]},
+    )
+    assert response.status_code == 304
+
+
+def test_x_sendfile(client, monkeypatch):
+    """Verify X-Sendfile mode sends the path instead of the bytes."""
+    utils.login(client)
+    monkeypatch.setitem(insta485.app.config, "UPLOAD_OFFLOAD", "X-Sendfile")
+    response = client.get(f"/uploads/{FILENAME}")
+    assert response.status_code == 200
+    assert response.data == b""
+    assert response.headers["X-Sendfile"] == \
+        str(insta485.app.config["UPLOAD_FOLDER"]/FILENAME)
+    assert response.headers["Content-Type"] == "image/jpeg"
+
+    # Revalidation is still answered here, without the header
+    response = client.get(
+        f"/uploads/{FILENAME}",
+        headers={"If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == 304
+    assert "X-Sendfile" not in response.headers
+
+
+def test_x_accel_redirect(client, monkeypatch):
+    """Verify X-Accel-Redirect mode sends an internal nginx URI."""
+    utils.login(client)
+    monkeypatch.setitem(
+        insta485.app.config, "UPLOAD_OFFLOAD", "X-Accel-Redirect"
+    )
+    response = client.get(f"/uploads/{FILENAME}")
+    assert response.status_code == 200
+    assert response.data == b""
+    assert response.headers["X-Accel-Redirect"] == \
+        f"/internal/uploads/{FILENAME}"
+    assert "X-Sendfile" not in response.headers
+
+    response = client.get(f"/uploads/{FILENAME}?width=160")
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Redirect"] == \
+        f"/internal/derivatives/160/12/2a/{FILENAME}"
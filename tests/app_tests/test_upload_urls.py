@@ -0,0 +1,83 @@
+"""
+Check signed, cacheable /uploads/ URLs.
+
+EECS 485 Project 2
+"""
+import time
+from urllib.parse import urlencode
+import bs4
+import insta485
+
+
+def signed_srcs(client):
+    """Log in, collect signed image URLs from / and log out again."""
+    response = client.post(
+        "/accounts/",
+        data={
+            "username": "awdeorio",
+            "password": "chickens",
+            "operation": "login"
+        },
+    )
+    assert response.status_code == 302
+    response = client.get("/")
+    assert response.status_code == 200
+    soup = bs4.BeautifulSoup(response.data, "html.parser")
+    srcs = [x.get("src") for x in soup.find_all("img")]
+    response = client.post("/accounts/logout/")
+    assert response.status_code == 302
+    return srcs
+
+
+def test_signed_url_without_login(client):
+    """Verify a signed URL is served without a session and is cacheable."""
+    srcs = signed_srcs(client)
+    assert srcs
+    assert all("signature=" in src and "expires=" in src for src in srcs)
+
+    response = client.get(srcs[0])
+    assert response.status_code == 200
+    assert response.cache_control.public
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age > 0
+    assert response.headers.get("ETag")
+    assert "Cookie" not in response.headers.get("Vary", "")
+    assert "Set-Cookie" not in response.headers
+
+    # Revalidation with the ETag is answered with 304 Not Modified
+    response = client.get(
+        srcs[0], headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+
+
+def test_signed_url_stable(client):
+    """Verify the same file gets the same URL across renders."""
+    assert signed_srcs(client) == signed_srcs(client)
+
+
+def test_bad_signature(client):
+    """Verify tampered and expired URLs are rejected."""
+    assert client
+    filename = "122a7d27ca1d7420a1072f695d9290fad4501a41.jpg"
+    expires = int(time.time()) + 3600
+    query_string = urlencode({"expires": expires, "signature": "0" * 64})
+    response = client.get(f"/uploads/{filename}?{query_string}")
+    assert response.status_code == 403
+
+    # Signature for another file
+    query_string = urlencode({
+        "expires": expires,
+        "signature": insta485.uploads.upload_signature("other.jpg", expires),
+    })
+    response = client.get(f"/uploads/{filename}?{query_string}")
+    assert response.status_code == 403
+
+    # Valid signature, but expired
+    expires = int(time.time()) - 1
+    query_string = urlencode({
+        "expires": expires,
+        "signature": insta485.uploads.upload_signature(filename, expires),
+    })
+    response = client.get(f"/uploads/{filename}?{query_string}")
+    assert response.status_code == 403
@@ -34,7 +34,7 @@ def test_awdeorio(client, noauth):
     soup = bs4.BeautifulSoup(response.data, "html.parser")
     text = soup.get_text()
     text = re.sub(r"\s+", " ", text)
-    srcs = [x.get("src") for x in soup.find_all('img')]
+    srcs = [urlparse(x.get("src")).path for x in soup.find_all('img')]
     links = [x.get("href") for x in soup.find_all("a")]
     buttons = [submit.get("name") for button in soup.find_all('form')
                for submit in button.find_all("input") if submit]
@@ -102,7 +102,7 @@ def test_upload(client, noauth):
     response = client.get("/users/awdeorio/")
     assert response.status_code == 200
     soup = bs4.BeautifulSoup(response.data, "html.parser")
-    srcs_before = [x.get("src") for x in soup.find_all('img')]
+    srcs_before = [urlparse(x.get("src")).path for x in soup.find_all('img')]
 
     # Upload a new post
     pic_path = utils.TEST_DIR/'testdata/fox.jpg'
@@ -120,7 +120,7 @@ def test_upload(client, noauth):
     response = client.get("/users/awdeorio/")
     assert response.status_code == 200
     soup = bs4.BeautifulSoup(response.data, "html.parser")
-    srcs_after = [x.get("src") for x in soup.find_all('img')]
+    srcs_after = [urlparse(x.get("src")).path for x in soup.find_all('img')]
 
     # Number of image sources after should be greater
     assert len(srcs_after) == len(srcs_before) + 1
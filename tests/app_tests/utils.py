@@ -4,3 +4,16 @@ import pathlib
 
 # Directory containing unit tests
 TEST_DIR = pathlib.Path(__file__).parent
+
+
+def login(client, username="awdeorio", password="chickens"):
+    """Log in as username."""
+    response = client.post(
+        "/accounts/",
+        data={
+            "username": username,
+            "password": password,
+            "operation": "login"
+        },
+    )
+    assert response.status_code == 302
@@ -0,0 +1,125 @@
+"""
+Verify every query issued while serving a request is backed by an index.
+
+EECS 485 Project 2
+"""
+import ast
+import pathlib
+import re
+
+# Modules whose queries run on the request path
+QUERY_MODULES = [
+    "insta485/views/index.py",
+    "insta485/feed.py",
+    "insta485/entities.py",
+    "insta485/counters.py",
+    "insta485/timeline.py",
+    "insta485/uploads.py",
+]
+
+
+def find_queries(path):
+    """Return every SQL string passed to an execute() call in path.
+
+    f-string fragments such as IN ({placeholders}) are replaced with a single
+    "?" placeholder.
+    """
+    tree = ast.parse(pathlib.Path(path).read_text(encoding='utf-8'))
+    queries = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr == "execute"
+                and node.args):
+            continue
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            queries.append(arg.value)
+        elif isinstance(arg, ast.JoinedStr):
+            queries.append("".join(
+                part.value if isinstance(part, ast.Constant) else "?"
+                for part in arg.values
+            ))
+    return queries
+
+
+def test_find_queries():
+    """Sanity check that queries are found in every module."""
+    for path in QUERY_MODULES:
+        assert find_queries(path), f"No queries found in {path}"
+
+
+def plan_problems(connection, query):
+    """Return the steps of query's plan that read more rows than they need.
+
+    Those are full table scans, and range-only searches such as
+    SEARCH posts USING INTEGER PRIMARY KEY (rowid<?) on any table but the
+    one that drives the query.  The driving table is read once, so a
+    keyset range there is bounded by the query's LIMIT.  Anywhere else the
+    range is read again for every outer row, which costs as much as a scan.
+    """
+    cur = connection.execute(
+        f"EXPLAIN QUERY PLAN {query}",
+        [None] * query.count("?"),
+    )
+    problems = []
+    driving = None
+    for step in cur.fetchall():
+        detail = step["detail"]
+        if detail == "SCAN CONSTANT ROW":
+            continue
+        if not re.match(r"(SCAN|SEARCH) ", detail):
+            continue
+        if driving is None and step["parent"] == 0:
+            driving = step["id"]
+            if detail.startswith("SEARCH"):
+                continue
+        if detail.startswith("SCAN"):
+            problems.append(detail)
+            continue
+        terms = re.search(r"\((.*)\)$", detail).group(1).split(" AND ")
+        if not any(re.search(r"[^<>]=", term) for term in terms):
+            problems.append(detail)
+    return problems
+
+
+def test_plan_problems(db_connection):
+    """Sanity check that unbounded range searches are caught."""
+    schema_sql = pathlib.Path("sql/schema.sql").read_text(encoding='utf-8')
+    db_connection.executescript(schema_sql)
+    assert plan_problems(
+        db_connection,
+        "SELECT posts.postid FROM users JOIN posts "
+        "on posts.postid < users.rowid WHERE users.username == ?"
+    ) == ["SEARCH posts USING INTEGER PRIMARY KEY (rowid<?)"]
+    assert not plan_problems(
+        db_connection,
+        "SELECT postid FROM posts WHERE postid < ? "
+        "ORDER BY postid DESC LIMIT ?"
+    )
+    assert plan_problems(db_connection, "SELECT * FROM posts") == [
+        "SCAN posts"
+    ]
+
+
+def test_no_full_scans(db_connection):
+    """Run EXPLAIN QUERY PLAN on every query and fail on unbounded reads.
+
+    Note: 'db_connection' is a fixture fuction that provides an empty,
+    in-memory sqlite3 database.  It is implemented in conftest.py and reused by
+    many tests.  Docs: https://docs.pytest.org/en/latest/fixture.html
+    """
+    schema_sql = pathlib.Path("sql/schema.sql").read_text(encoding='utf-8')
+    db_connection.executescript(schema_sql)
+    db_connection.commit()
+
+    scans = []
+    for path in QUERY_MODULES:
+        for query in find_queries(path):
+            if not query.lstrip().upper().startswith(
+                    ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+                continue
+            for detail in plan_problems(db_connection, query):
+                scans.append(f"{path}: {detail}\n    {query}")
+
+    assert not scans, "Unbounded reads:\n" + "\n".join(scans)